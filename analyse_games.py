@@ -0,0 +1,231 @@
+# This script annotates positions and game records in bulk. Records are read
+# as JSON lines from files or stdin, analysed on a pool of processes, and the
+# results written as JSON lines. With a checkpoint file an interrupted run
+# carries on where it stopped.
+#
+# Each input line is a bare position string, or a JSON object with an optional
+# "id" and either a "position" string or a list of "moves", e.g.
+#   {"id": "game-1", "moves": ["d3", "c5", "f6"]}
+#
+# Usage: python analyse_games.py games.jsonl --depth 3 --output results.jsonl
+#        python analyse_games.py games.jsonl --time 2 --output results.jsonl \
+#            --checkpoint results.checkpoint --unordered
+#        cat positions.txt | python analyse_games.py - --workers 4
+
+import os
+
+# Cached search results from the web app's cache aren't wanted here
+os.environ.pop('OTHELLO_EVAL_CACHE', None)
+
+import sys
+import json
+import argparse
+import itertools
+import multiprocessing
+
+from src.square import SquareType
+from src.player import Player, PlayerType
+from src.analysis import PositionAnalyser
+from src.state_evaluation import StateEvaluator, AI_WEIGHTS
+from src.position import (
+    decode_position, game_from_position, format_move, parse_move
+)
+
+# Analyser of each worker process, keeping its cache between records
+_analyser = None
+
+
+def init_worker():
+    global _analyser
+    _analyser = PositionAnalyser(StateEvaluator(weights=AI_WEIGHTS))
+
+
+def read_records(paths):
+    """
+    Yield every record of the input files in order, '-' being stdin.
+    """
+
+    for path in paths:
+        file = sys.stdin if path == '-' else open(path, 'r')
+        try:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+
+def read_move(move):
+    if isinstance(move, str):
+        return parse_move(move)
+    row, col = move
+    return int(row), int(col)
+
+
+def serialize_moves(moves_with_values):
+    return [{'move': format_move(move), 'score': value}
+            for move, value in moves_with_values]
+
+
+def analyse_record(task):
+    """
+    Analyse one input record in a worker process.
+
+    Args:
+        task (Tuple[int, str, int, float]): The record's index and line, the
+            search depth and the time limit per position.
+
+    Returns:
+        dict: The analysis, or an error if the record is invalid.
+    """
+
+    index, line, depth, time_limit = task
+    record_id = index
+
+    try:
+        record = json.loads(line) if line.startswith('{') else {'position': line}
+        record_id = record.get('id', index)
+
+        if 'position' in record:
+            black, white, black_to_move = decode_position(record['position'])
+            game = game_from_position(
+                black, white, black_to_move,
+                Player(PlayerType.USER, SquareType.BLACK),
+                Player(PlayerType.USER, SquareType.WHITE)
+            )
+
+            if time_limit is not None:
+                searched_depth, moves_with_values = _analyser.analyse_within(
+                    game, time_limit, depth)
+            else:
+                searched_depth = depth
+                moves_with_values = _analyser.analyse(game, depth)
+
+            return {
+                'id': record_id,
+                'position': record['position'],
+                'color': game.active.disc_color.name,
+                'depth': searched_depth,
+                'best_move': format_move(moves_with_values[0][0]) if moves_with_values else None,
+                'moves': serialize_moves(moves_with_values)
+            }
+
+        moves = [read_move(move) for move in record['moves']]
+        analysis = _analyser.analyse_game(moves, depth, time_limit)
+
+        return {
+            'id': record_id,
+            'positions': [
+                {
+                    'color': entry['color'],
+                    'move': format_move(entry['move']),
+                    'score': entry['value'],
+                    'best_move': format_move(entry['best_move']),
+                    'best_score': entry['best_value'],
+                    'depth': entry['depth']
+                }
+                for entry in analysis
+            ]
+        }
+
+    except (KeyError, TypeError, ValueError) as error:
+        return {'id': record_id, 'error': f"Invalid record: {error}"}
+
+
+def load_checkpoint(path, inputs):
+    """
+    Read a checkpoint of an earlier run over the same inputs.
+
+    Returns:
+        dict: Records done and the size of the output at that point, or None
+            if there's no usable checkpoint.
+    """
+
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as file:
+        checkpoint = json.load(file)
+
+    if checkpoint['inputs'] != inputs:
+        raise SystemExit(f"Checkpoint {path} was made for other inputs.")
+    return checkpoint
+
+
+def save_checkpoint(path, inputs, records_done, output_bytes):
+    # Written under a temporary name and renamed, so it's never half written
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({'inputs': inputs, 'records_done': records_done,
+                   'output_bytes': output_bytes}, file)
+    os.replace(temp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk position and game analysis.")
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help="Input files of JSON lines, '-' for stdin.")
+    parser.add_argument('--output', default='-')
+    parser.add_argument('--depth', type=int, default=3,
+                        help="Search depth, or the deepest search with --time.")
+    parser.add_argument('--time', type=float, default=None,
+                        help="Seconds per position, deepening iteratively.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--unordered', action='store_true',
+                        help="Write results as they finish, not in input order.")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Records per checkpoint (default 16 per worker).")
+    parser.add_argument('--checkpoint', default=None)
+    args = parser.parse_args()
+
+    if args.checkpoint and args.output == '-':
+        parser.error("--checkpoint needs an --output file.")
+
+    inputs = [os.path.abspath(path) if path != '-' else path for path in args.inputs]
+    batch_size = args.batch_size or 16 * args.workers
+
+    # Carry on from the checkpoint, dropping results written after it
+    checkpoint = load_checkpoint(args.checkpoint, inputs)
+    records_done = 0
+    if args.output == '-':
+        output = sys.stdout
+    elif checkpoint:
+        records_done = checkpoint['records_done']
+        output = open(args.output, 'r+')
+        output.truncate(checkpoint['output_bytes'])
+        output.seek(checkpoint['output_bytes'])
+        print(f"Resuming after {records_done} records", file=sys.stderr)
+    else:
+        output = open(args.output, 'w')
+
+    records = itertools.islice(enumerate(read_records(args.inputs)), records_done, None)
+
+    with multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        imap = pool.imap_unordered if args.unordered else pool.imap
+
+        # Records are handed out a batch at a time, bounding memory, and a
+        # checkpoint is saved once a whole batch is written
+        while True:
+            batch = [(index, line, args.depth, args.time)
+                     for index, line in itertools.islice(records, batch_size)]
+            if not batch:
+                break
+
+            for result in imap(analyse_record, batch):
+                output.write(json.dumps(result) + '\n')
+            output.flush()
+
+            records_done += len(batch)
+            if args.checkpoint:
+                os.fsync(output.fileno())
+                save_checkpoint(args.checkpoint, inputs, records_done, output.tell())
+            print(f"{records_done} records analysed", file=sys.stderr)
+
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# This script measures the memory held by live games, as a server keeping
+# many games in memory would hold them. Games are played to random points
+# against OthelloAI, pickled as the web app stores them, and many copies are
+# loaded back while tracemalloc counts the memory they allocate.
+#
+# Usage: python benchmark_memory.py --games 10000
+
+import gc
+import pickle
+import random
+import argparse
+import tracemalloc
+
+from src.game import Game
+from src.square import SquareType
+from src.player import Player, PlayerType, DIFFICULTY_LEVELS
+from src.state_evaluation import StateEvaluator, AI_WEIGHTS
+
+
+def sample_game(rng):
+    """
+    Play random moves for both sides of a game against OthelloAI, as the
+    web app creates it, stopping at a random ply.
+    """
+
+    user = Player(PlayerType.USER, SquareType.BLACK)
+    ai_player = Player(PlayerType.MINIMAX, SquareType.WHITE,
+                       StateEvaluator(weights=AI_WEIGHTS), **DIFFICULTY_LEVELS['hard'])
+    game = Game(user, ai_player)
+
+    for _ in range(rng.randrange(60)):
+        moves = game.get_valid_moves()
+        if not moves:
+            break
+        game.next_move = rng.choice(moves)
+        game.make_move()
+        game.change_turn()
+        game.update_valid_moves()
+        game.update_scores()
+
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of live games.")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--samples', type=int, default=50,
+                        help="Distinct games, loaded repeatedly.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [pickle.dumps(sample_game(rng)) for _ in range(args.samples)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [pickle.loads(payloads[index % len(payloads)])
+             for index in range(args.games)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print(f"Live games: {len(games)}")
+    print(f"Bytes per game: {used / len(games):,.0f}")
+    print(f"Pickled bytes per game: {sum(map(len, payloads)) / len(payloads):,.0f}")
+
+
+if __name__ == '__main__':
+    main()
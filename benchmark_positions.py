@@ -0,0 +1,279 @@
+# This script runs the AI on a suite of positions with expected best moves, at
+# a fixed depth or with a fixed time per position, and reports how many it
+# solves, the nodes it searched and the time it took. Endgame positions have
+# exactly solved best moves; midgame positions are self-consistency checks
+# against a deeper search of the same evaluation. Results are compared against
+# a stored baseline, so a change making the AI slower or weaker shows up as a
+# regression.
+#
+# Usage: python benchmark_positions.py --depth 3
+#        python benchmark_positions.py --time 5 --filter endgame
+#        python benchmark_positions.py --depth 3 --save-baseline
+#        python benchmark_positions.py --engine lazy-smp --helpers 8 --time 5
+
+import os
+
+# Cached search results would hide the cost of searching
+os.environ.pop('OTHELLO_EVAL_CACHE', None)
+
+import sys
+import json
+import time
+import argparse
+
+from src.square import SquareType
+from src.player import Player, PlayerType, DIFFICULTY_LEVELS
+from src.state_evaluation import StateEvaluator, AI_WEIGHTS
+from src.position import (
+    decode_position, game_from_position, read_position_suite, format_move
+)
+from src.search_stats import collect_stats
+from src.lazy_smp import LazySMP
+
+# Confidence of the probcut engine, in standard deviations
+PROBCUT_CONFIDENCE = 1.5
+
+# Helper processes of the lazy-smp engine, started on first use
+SMP_HELPERS = os.cpu_count()
+_lazy_smp = None
+
+
+def minimax_engine(game, depth):
+    color = game.active.disc_color
+    player = Player(PlayerType.MINIMAX, color, StateEvaluator(AI_WEIGHTS), depth)
+    return player.minimax_move_steps(game)
+
+
+def probcut_engine(game, depth):
+    color = game.active.disc_color
+    player = Player(PlayerType.MINIMAX, color, StateEvaluator(AI_WEIGHTS), depth,
+                    probcut=PROBCUT_CONFIDENCE)
+    return player.minimax_move_steps(game)
+
+
+def lazy_smp_engine(game, depth):
+    global _lazy_smp
+    if _lazy_smp is None:
+        _lazy_smp = LazySMP(SMP_HELPERS)
+
+    color = game.active.disc_color
+    player = Player(PlayerType.MINIMAX, color, StateEvaluator(AI_WEIGHTS), depth)
+    return _lazy_smp.search_steps(game, player)
+
+
+def difficulty_engine(difficulty):
+    """
+    Engine playing at a difficulty level's node budget, up to the given depth.
+    Noise is left out so results are reproducible.
+    """
+
+    def engine(game, depth):
+        settings = dict(DIFFICULTY_LEVELS[difficulty], depth=depth, noise=0.0)
+        player = Player(PlayerType.MINIMAX, game.active.disc_color,
+                        StateEvaluator(AI_WEIGHTS), **settings)
+        return player.minimax_move_steps(game)
+
+    return engine
+
+
+# Engine name -> function(game, depth) returning the search for the move to
+# play, as a generator of steps, see Player.minimax_move_steps()
+ENGINES = {
+    'minimax': minimax_engine,
+    'probcut': probcut_engine,
+    'lazy-smp': lazy_smp_engine,
+    **{difficulty: difficulty_engine(difficulty) for difficulty in DIFFICULTY_LEVELS},
+}
+
+
+def run_position(engine, entry, depth=None, time_limit=None):
+    """
+    Search one position, either to a fixed depth, or deepening one ply at a
+    time until the time limit is used up. The clock is checked at every node,
+    and an iteration still running when time is up is abandoned; only the
+    first iteration always completes.
+
+    Returns:
+        dict: The move played, whether it is a best move, the depth of the 
+            deepest completed search, the nodes searched, the time taken and 
+            the time until the engine settled on a best move (None if it never
+            did).
+    """
+
+    black, white, black_to_move = decode_position(entry['position'])
+    game = game_from_position(
+        black, white, black_to_move,
+        Player(PlayerType.USER, SquareType.BLACK),
+        Player(PlayerType.USER, SquareType.WHITE)
+    )
+
+    depths = [depth] if depth else range(1, 61)
+    move = None
+    searched_depth = 0
+    solved_at = None
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit else None
+
+    with collect_stats() as stats:
+        for iteration_depth in depths:
+            search = engine(game, iteration_depth)
+            try:
+                while True:
+                    next(search)
+                    if (deadline and move is not None and
+                            time.perf_counter() > deadline):
+                        search.close()
+                        break
+            except StopIteration as stop:
+                move = stop.value
+                searched_depth = iteration_depth
+            else:
+                break
+
+            elapsed = time.perf_counter() - start
+            if move in entry['best_moves']:
+                solved_at = elapsed if solved_at is None else solved_at
+            else:
+                solved_at = None
+
+            if deadline and elapsed >= time_limit:
+                break
+
+    return {
+        'source': entry['source'],
+        'move': format_move(move) if move else None,
+        'solved': move in entry['best_moves'],
+        'depth': searched_depth,
+        'nodes': stats.nodes,
+        'seconds': time.perf_counter() - start,
+        'time_to_solution': solved_at
+    }
+
+
+def summarise(results):
+    return {
+        'solved': sum(result['solved'] for result in results.values()),
+        'positions': len(results),
+        'depth': (sum(result.get('depth', 0) for result in results.values())
+                  / max(1, len(results))),
+        'nodes': sum(result['nodes'] for result in results.values()),
+        'seconds': sum(result['seconds'] for result in results.values())
+    }
+
+
+def compare(results, baseline, node_tolerance, time_tolerance):
+    """
+    Compare results against a baseline run of the same configuration.
+
+    Returns:
+        List[str]: Descriptions of the regressions found.
+    """
+
+    regressions = []
+
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if previous['solved'] and not result['solved']:
+            regressions.append(f"{name}: no longer solved, played "
+                               f"{result['move']} instead of {previous['move']}")
+
+    summary = summarise(results)
+    previous = summarise({name: baseline['results'][name] for name in results
+                          if name in baseline['results']})
+
+    for key, tolerance in (('nodes', node_tolerance), ('seconds', time_tolerance)):
+        if previous[key] and summary[key] > previous[key] * (1 + tolerance):
+            change = summary[key] / previous[key] - 1
+            regressions.append(f"total {key} up {change:.1%} "
+                               f"({previous[key]:,.2f} -> {summary[key]:,.2f})")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search regression benchmark.")
+    parser.add_argument('--suite', default=os.path.join('data', 'benchmark_positions.txt'))
+    parser.add_argument('--baseline', default=os.path.join('data', 'benchmark_baseline.json'))
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='minimax')
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--depth', type=int, default=None)
+    limit.add_argument('--time', type=float, default=None,
+                       help="Seconds per position, deepening iteratively.")
+    parser.add_argument('--filter', default='',
+                        help="Only run positions whose name starts with this.")
+    parser.add_argument('--node-tolerance', type=float, default=0.05)
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--helpers', type=int, default=os.cpu_count(),
+                        help="Helper processes of the lazy-smp engine.")
+    args = parser.parse_args()
+
+    global SMP_HELPERS
+    SMP_HELPERS = args.helpers
+
+    if args.depth is None and args.time is None:
+        args.depth = 3
+
+    configuration = (f"{args.engine} depth={args.depth}" if args.depth
+                     else f"{args.engine} time={args.time:g}")
+    if args.engine == 'lazy-smp':
+        configuration += f" helpers={args.helpers}"
+    engine = ENGINES[args.engine]
+
+    suite = [entry for entry in read_position_suite(args.suite)
+             if entry['name'].startswith(args.filter)]
+
+    print(f"Running {len(suite)} positions with {configuration}")
+    results = {}
+    for entry in suite:
+        result = run_position(engine, entry, args.depth, args.time)
+        results[entry['name']] = result
+
+        expected = ','.join(format_move(move) for move in entry['best_moves'])
+        print(f"{entry['name']:<14} {'ok' if result['solved'] else 'FAIL':<5}"
+              f"played {str(result['move']):<5} best {expected:<12}"
+              f"depth {result['depth']:<3}"
+              f"{result['nodes']:>9,} nodes {result['seconds']:>8.2f}s")
+
+    summary = summarise(results)
+    print(f"Solved: {summary['solved']}/{summary['positions']}")
+    for source in sorted({result['source'] for result in results.values()}):
+        by_source = summarise({name: result for name, result in results.items()
+                               if result['source'] == source})
+        print(f"  {source}: {by_source['solved']}/{by_source['positions']}")
+    print(f"Average depth: {summary['depth']:.2f}")
+    print(f"Nodes: {summary['nodes']:,}")
+    print(f"Time: {summary['seconds']:.2f}s "
+          f"({summary['nodes'] / summary['seconds']:,.0f} nodes/second)")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baselines = json.load(file)
+
+    if args.save_baseline:
+        previous = baselines.get(configuration, {'results': {}})['results']
+        baselines[configuration] = {'results': {**previous, **results}}
+        with open(args.baseline, 'w') as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if configuration not in baselines:
+        print(f"No baseline for {configuration}")
+        return 0
+
+    regressions = compare(results, baselines[configuration],
+                          args.node_tolerance, args.time_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# This script measures cold start costs; the import time of each module and
+# the latency of the first requests served by a freshly created app. Each
+# measurement runs in a new interpreter, so nothing is already imported.
+#
+# Usage: python benchmark_startup.py --repeats 5
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    'src.bitboard',
+    'src.state_evaluation',
+    'src.player',
+    'src.game',
+    'src.analysis',
+    'website',
+    # What create_app() imports for its views, as every web worker does
+    'website.views',
+]
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start,
+                  'numpy': 'numpy' in sys.modules}}))
+"""
+
+REQUEST_SCRIPT = """
+import logging, time, json
+start = time.perf_counter()
+from website import create_app
+app = create_app()
+client = app.test_client()
+timings = {'create_app': time.perf_counter() - start}
+logging.disable(logging.CRITICAL)
+
+for name, method, url, kwargs in [
+    ('GET /', 'get', '/', {}),
+    ('POST /play_game', 'post', '/play_game', {'data': {'color': 'WHITE'}}),
+    ('POST /agent_move', 'post', '/agent_move', {}),
+    ('GET /get_game_state', 'get', '/get_game_state', {}),
+]:
+    start = time.perf_counter()
+    getattr(client, method)(url, **kwargs)
+    timings[name] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def run(script):
+    output = subprocess.run([sys.executable, '-c', script], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+parser = argparse.ArgumentParser(description="Measure cold start latency.")
+parser.add_argument('--repeats', type=int, default=5)
+args = parser.parse_args()
+
+print(f"{'Import':<28}{'median ms':>10}  imports NumPy")
+for module in MODULES:
+    results = [run(IMPORT_SCRIPT.format(module=module))
+               for _ in range(args.repeats)]
+    median = statistics.median(result['seconds'] for result in results)
+    print(f"{module:<28}{median * 1000:>10.1f}  {results[0]['numpy']}")
+
+print()
+print(f"{'First request':<28}{'median ms':>10}")
+results = [run(REQUEST_SCRIPT) for _ in range(args.repeats)]
+for name in results[0]:
+    median = statistics.median(result[name] for result in results)
+    print(f"{name:<28}{median * 1000:>10.1f}")
@@ -0,0 +1,47 @@
+# This script runs the engine service; a daemon answering OthelloAI's searches
+# for the web workers over a Unix socket, on a pool of search processes that
+# keep their caches and tables warm. Web workers use it when the
+# OTHELLO_ENGINE_SOCKET environment variable names its socket, and search in
+# process whenever it can't be reached. gunicorn starts it alongside the app
+# when the variable is set (gunicorn.conf.py).
+#
+# Usage: python engine_server.py --socket /tmp/othello-engine.sock --workers 4
+
+import os
+import signal
+import argparse
+
+from src.engine_service import EngineServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OthelloAI engine service.")
+    parser.add_argument('--socket', default=os.environ.get('OTHELLO_ENGINE_SOCKET'),
+                        help="Path of the Unix socket to listen on.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Search processes.")
+    args = parser.parse_args()
+
+    if not args.socket:
+        parser.error("Give --socket or set OTHELLO_ENGINE_SOCKET.")
+
+    server = EngineServer(args.socket, args.workers)
+
+    # Stop serving on SIGTERM as on Ctrl-C; a second one stops at once
+    def stop(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Engine service listening on {args.socket} "
+          f"with {args.workers} search processes")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
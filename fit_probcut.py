@@ -0,0 +1,173 @@
+# This script fits the parameters of ProbCut (src/probcut.py) from self-play
+# games. Positions are sampled from the games in the shards of self_play.py,
+# each is searched to both depths of every depth pair, and a line predicting
+# the deep value from the shallow one is fitted by least squares per depth
+# pair and game phase, together with the standard deviation of its errors.
+#
+# Usage: python fit_probcut.py selfplay --pairs 3:1 4:2 --positions 2000
+
+import os
+
+# Cached search results would mix values of different depths
+os.environ.pop('OTHELLO_EVAL_CACHE', None)
+
+import sys
+import json
+import random
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from src.game import Game
+from src.square import SquareType
+from src.player import Player, PlayerType
+from src.state_evaluation import StateEvaluator, AI_WEIGHTS
+from src.position import game_from_position, parse_move, position_key
+from src.bitboard import popcount
+from src.probcut import PROBCUT_PATH, game_phase, save_parameters
+
+
+def read_games(directory):
+    """
+    Read the moves of every game in the complete shards of a directory.
+    """
+
+    games = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('shard-') and name.endswith('.jsonl'):
+            with open(os.path.join(directory, name)) as file:
+                games.extend(json.loads(line)['moves'] for line in file if line.strip())
+    return games
+
+
+def sample_positions(games, count, rng):
+    """
+    Pick positions at random plies of random games, leaving out finished ones.
+
+    Returns:
+        List[Tuple[int, int, bool]]: The positions, as position_key().
+    """
+
+    positions = []
+    while len(positions) < count:
+        moves = rng.choice(games)
+        ply = rng.randrange(len(moves))
+
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        for move in moves[:ply]:
+            # Pass if the active player has no moves
+            if not game.get_valid_moves():
+                game.change_turn()
+            game = game.simulate_move(parse_move(move))
+
+        if not game.is_finished and game.get_valid_moves():
+            positions.append(position_key(game))
+
+    return positions
+
+
+def search_values(task):
+    """
+    Search a position to both depths of each depth pair, in a worker process.
+
+    Returns:
+        Tuple[int, List[Tuple[int, int, float, float]]]: The position's disc
+            count, and each pair's depths and deep and shallow values.
+    """
+
+    (black, white, black_to_move), pairs = task
+    state_eval = StateEvaluator(weights=AI_WEIGHTS)
+    player = Player(PlayerType.MINIMAX, SquareType.BLACK, state_eval)
+    game = game_from_position(black, white, black_to_move, player,
+                              Player(PlayerType.USER, SquareType.WHITE))
+
+    # Positions with White to move are maximizing nodes of the search
+    maximizing = not black_to_move
+    values = {}
+    for depth in sorted({depth for pair in pairs for depth in pair}):
+        values[depth] = player.minimax(game, depth, maximizing)
+
+    return popcount(black | white), [(deep, shallow, values[deep], values[shallow])
+                                     for deep, shallow in pairs]
+
+
+def fit(samples, min_samples=20):
+    """
+    Fit deep = a * shallow + b per depth pair and phase.
+
+    Args:
+        samples (List): Results of search_values().
+        min_samples (int, optional): Fewest values to fit a line to.
+
+    Returns:
+        List[dict]: The depths, phase, a, b, sigma and number of samples of
+            each fitted line.
+    """
+
+    grouped = {}
+    for discs, pair_values in samples:
+        for deep, shallow, deep_value, shallow_value in pair_values:
+            # Positions without moves deep in the search score infinitely
+            if np.isfinite(deep_value) and np.isfinite(shallow_value):
+                grouped.setdefault((deep, shallow, game_phase(discs)), []).append(
+                    (shallow_value, deep_value))
+
+    entries = []
+    for (deep, shallow, phase), values in sorted(grouped.items()):
+        if len(values) < min_samples:
+            continue
+        x, y = np.array(values).T
+        a, b = np.polyfit(x, y, 1)
+        sigma = float(np.std(y - (a * x + b)))
+        entries.append({'depth': deep, 'shallow': shallow, 'phase': phase,
+                        'a': float(a), 'b': float(b), 'sigma': sigma,
+                        'samples': len(values)})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit ProbCut parameters.")
+    parser.add_argument('directory', help="Directory of self-play shards.")
+    parser.add_argument('--pairs', nargs='+', default=['3:1', '4:2'],
+                        help="Deep and shallow depths, e.g. 4:2.")
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=PROBCUT_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        pairs = [tuple(int(depth) for depth in pair.split(':')) for pair in args.pairs]
+    except ValueError:
+        parser.error("Depth pairs must be given as <deep>:<shallow>.")
+    if any(len(pair) != 2 or not 0 < pair[1] < pair[0] for pair in pairs):
+        parser.error("Each pair needs a shallow depth below its deep depth.")
+
+    games = [moves for moves in read_games(args.directory) if moves]
+    if not games:
+        parser.error(f"No self-play games found in {args.directory}.")
+
+    rng = random.Random(args.seed)
+    positions = sample_positions(games, args.positions, rng)
+    print(f"Searching {len(positions)} positions from {len(games)} games",
+          file=sys.stderr)
+
+    with multiprocessing.Pool(args.workers) as pool:
+        samples = pool.map(search_values, [(position, pairs) for position in positions],
+                           chunksize=4)
+
+    fingerprint = StateEvaluator(weights=AI_WEIGHTS).fingerprint()
+    entries = [dict(entry, fingerprint=fingerprint) for entry in fit(samples)]
+    save_parameters(entries, args.output)
+
+    for entry in entries:
+        print(f"depth {entry['depth']} from {entry['shallow']}, phase {entry['phase']}: "
+              f"a={entry['a']:.3f} b={entry['b']:+.3f} sigma={entry['sigma']:.3f} "
+              f"({entry['samples']} positions)")
+    print(f"Saved {len(entries)} parameter sets to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
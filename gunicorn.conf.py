@@ -0,0 +1,31 @@
+# Gunicorn reads this file automatically when started from the project root.
+
+import os
+import sys
+import subprocess
+
+# Import the app once in the master process, so that recycled and newly 
+# spawned workers are forked with the modules already loaded, instead of each
+# importing NumPy, Flask and the game engine from scratch
+preload_app = True
+
+# Serve several requests per worker, so that searches queue inside the worker
+# where admission control (website/admission.py) sees them and degrades.
+# Keep this above OTHELLO_MAX_SEARCHES, or no search ever queues.
+threads = 4
+
+# Start the engine service (engine_server.py) alongside the app when workers
+# are configured to use one, and stop it with the app
+_engine = None
+
+
+def on_starting(server):
+    global _engine
+    if os.environ.get('OTHELLO_ENGINE_SOCKET'):
+        _engine = subprocess.Popen([sys.executable, 'engine_server.py'])
+
+
+def on_exit(server):
+    if _engine is not None:
+        _engine.terminate()
+        _engine.wait()
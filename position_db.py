@@ -0,0 +1,146 @@
+# This script maintains a database of the positions of archived games, e.g.
+# the shards of self_play.py, for looking up which games reached a position,
+# up to symmetry, and how they ended. Building again only reads games added
+# since the last build, so it can follow a growing archive.
+#
+# Usage: python position_db.py build selfplay --db positions.db
+#        python position_db.py query --db positions.db --moves f5 d6 c3
+#        python position_db.py query --db positions.db --position '---...X'
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from src.position import decode_position, format_move, parse_move
+from src.position_db import PositionDatabase, replay_hashes, INITIAL_BLACK, INITIAL_WHITE
+from src.bitboard import legal_moves, play, square_bit
+
+
+def source_files(paths):
+    """
+    List the game files of the given files and directories, leaving out
+    incomplete shards.
+    """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith('.jsonl'))
+        else:
+            files.append(path)
+    return [os.path.abspath(path) for path in files]
+
+
+def read_moves(record):
+    """
+    Read the moves of a game record, given in the console notation or as
+    [row, col] pairs.
+    """
+
+    return [move if isinstance(move, str) else format_move(move)
+            for move in json.loads(record)['moves']]
+
+
+def build(db, paths, batch_size):
+    added = skipped = 0
+    for path in source_files(paths):
+        done = db.indexed_lines(path)
+        batch = []
+        line_number = 0
+
+        with open(path) as file:
+            for line_number, line in enumerate(file, start=1):
+                if line_number <= done or not line.strip():
+                    continue
+                try:
+                    hashes, result = replay_hashes(read_moves(line))
+                except (KeyError, TypeError, ValueError):
+                    skipped += 1
+                    continue
+                batch.append((hashes, result, line_number))
+
+                if len(batch) >= batch_size:
+                    added += len(db.add_games(batch, path, line_number))
+                    batch = []
+
+        if batch or line_number > done:
+            added += len(db.add_games(batch, path, max(line_number, done)))
+
+    return added, skipped
+
+
+def position_after(moves):
+    """
+    Get the position after a sequence of moves, as decode_position().
+    """
+
+    own, opp = INITIAL_BLACK, INITIAL_WHITE
+    black_to_move = True
+    for move in moves:
+        if not legal_moves(own, opp):
+            own, opp = opp, own
+            black_to_move = not black_to_move
+        bit = square_bit(*parse_move(move))
+        if not legal_moves(own, opp) & bit:
+            raise ValueError(f"Illegal move '{move}'.")
+        opp, own = play(own, opp, bit)
+        black_to_move = not black_to_move
+
+    black, white = (own, opp) if black_to_move else (opp, own)
+    return black, white, black_to_move
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database of game positions.")
+    parser.add_argument('command', choices=['build', 'query', 'compact'])
+    parser.add_argument('paths', nargs='*', help="Game files or directories to add.")
+    parser.add_argument('--db', default='positions.db')
+    parser.add_argument('--batch', type=int, default=100_000,
+                        help="Games per segment written.")
+    parser.add_argument('--position', help="Position string to look up.")
+    parser.add_argument('--moves', nargs='*', help="Moves leading to the position.")
+    parser.add_argument('--games', type=int, default=10,
+                        help="Games listed for a position.")
+    args = parser.parse_args()
+
+    db = PositionDatabase(args.db)
+
+    if args.command == 'build':
+        if not args.paths:
+            parser.error("Give the game files or directories to add.")
+        start = time.perf_counter()
+        added, skipped = build(db, args.paths, args.batch)
+        print(f"Added {added} games ({skipped} unreadable) in "
+              f"{time.perf_counter() - start:.1f}s, {db.games} in total",
+              file=sys.stderr)
+        return
+
+    if args.command == 'compact':
+        db.compact()
+        return
+
+    try:
+        if args.position is not None:
+            position = decode_position(args.position)
+        else:
+            position = position_after(args.moves or [])
+    except ValueError as error:
+        parser.error(str(error))
+
+    start = time.perf_counter()
+    result = db.lookup(*position, max_games=args.games)
+    elapsed = time.perf_counter() - start
+
+    print(f"{result['games']} games: Black won {result['black_wins']}, "
+          f"drew {result['draws']}, White won {result['white_wins']} "
+          f"({elapsed * 1000:.2f} ms)")
+    for game_id in result['game_ids']:
+        source, line = db.game_source(game_id)
+        print(f"  game {game_id}: {source}:{line}")
+
+
+if __name__ == '__main__':
+    main()
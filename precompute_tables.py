@@ -0,0 +1,15 @@
+# This script builds every precomputed lookup table into the tables directory
+# (data/tables, or OTHELLO_TABLES_DIR), so that web workers and tools only 
+# memory-map them at startup. Run it as part of deployment.
+
+import time
+from src import tables
+
+# Modules registering tables, which must be imported for them to be built
+import src.stability
+
+for name in tables.registered_tables():
+    start = time.perf_counter()
+    path = tables.build_table(name)
+    elapsed = time.perf_counter() - start
+    print(f"Built {name} in {elapsed:.2f}s -> {path}")
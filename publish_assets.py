@@ -0,0 +1,66 @@
+# This script publishes a new version of OthelloAI's assets; its evaluation
+# weights, and optionally an opening book and lookup tables. Worker processes
+# and the engine service swap it in within OTHELLO_ASSETS_INTERVAL seconds,
+# without restarting, and new games are played with it.
+#
+# Usage: python publish_assets.py --weights weights.json
+#        python publish_assets.py --weights weights.json --book book.json \
+#            --table patterns.h.bin=build/patterns.bin
+#        python publish_assets.py --show
+
+import json
+import argparse
+
+from src.assets import (
+    ASSETS_DIR, KEEP_VERSIONS, publish_version, read_current, version_names
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish OthelloAI's assets.")
+    parser.add_argument('--dir', default=ASSETS_DIR, help="Assets directory.")
+    parser.add_argument('--weights', help="JSON file of weights by heuristic name.")
+    parser.add_argument('--book', help="JSON file of moves by position string.")
+    parser.add_argument('--table', action='append', default=[],
+                        metavar='NAME.TYPECODE.bin=PATH',
+                        help="Table file to include; may be repeated.")
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS,
+                        help="Versions kept, the new one included.")
+    parser.add_argument('--show', action='store_true',
+                        help="Show the published versions and exit.")
+    args = parser.parse_args()
+
+    if args.show:
+        current = read_current(args.dir)
+        for name in version_names(args.dir):
+            print(f"{name}{' (current)' if name == current else ''}")
+        return
+
+    if not args.weights:
+        parser.error("Give --weights, or --show.")
+
+    with open(args.weights) as file:
+        weights = json.load(file)
+
+    book = None
+    if args.book:
+        with open(args.book) as file:
+            book = json.load(file)
+
+    tables = {}
+    for table in args.table:
+        filename, _, path = table.partition('=')
+        if not path:
+            parser.error(f"Give tables as NAME.TYPECODE.bin=PATH, not {table}.")
+        tables[filename] = path
+
+    try:
+        name = publish_version(args.dir, weights, book, tables, keep=args.keep)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print(f"Published {name} to {args.dir}")
+
+
+if __name__ == '__main__':
+    main()
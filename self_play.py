@@ -0,0 +1,265 @@
+# This script generates self-play games as training data for evaluators.
+# Configured pairings of players play on a pool of processes, each game from
+# a few random opening moves, and finished games are written as JSON lines to
+# size-bounded shard files. Games repeating an earlier game, up to symmetry,
+# are dropped, and memory stays bounded however long it runs.
+#
+# Players are 'random', 'minimax:<depth>' or a difficulty level ('easy',
+# 'medium', 'hard'). A pairing is '<black>,<white>'; colors alternate between
+# games.
+#
+# Usage: python self_play.py --pairing minimax:2,minimax:2 --games 10000
+#        python self_play.py --pairing hard,easy --pairing minimax:1,random \
+#            --hours 8 --noise 0.05 --output-dir selfplay
+
+import os
+
+# Cached search results would make noisy players repeat themselves
+os.environ.pop('OTHELLO_EVAL_CACHE', None)
+
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import multiprocessing
+
+from src.game import Game
+from src.square import SquareType
+from src.player import Player, PlayerType, DIFFICULTY_LEVELS
+from src.state_evaluation import StateEvaluator, AI_WEIGHTS
+from src.bitboard import from_board, canonical, position_hash
+from src.bloom import BloomFilter
+from src.position import format_move
+
+
+def make_player(spec, color, noise):
+    """
+    Create a player from its description, e.g. 'minimax:2'.
+    """
+
+    if spec == 'random':
+        return Player(PlayerType.RANDOM, color)
+
+    state_eval = StateEvaluator(weights=AI_WEIGHTS)
+    if spec in DIFFICULTY_LEVELS:
+        settings = dict(DIFFICULTY_LEVELS[spec])
+        settings['noise'] = max(settings['noise'], noise)
+        return Player(PlayerType.MINIMAX, color, state_eval, **settings)
+
+    name, _, depth = spec.partition(':')
+    if name != 'minimax' or not depth.isdigit():
+        raise ValueError(f"Unknown player '{spec}'.")
+    return Player(PlayerType.MINIMAX, color, state_eval, int(depth), noise=noise)
+
+
+def play_game(task):
+    """
+    Play one self-play game in a worker process.
+
+    Args:
+        task (Tuple[int, str, str, int, float]): The game's seed, the black
+            and white player descriptions, the number of random opening moves
+            and the players' noise.
+
+    Returns:
+        dict: The game record, with hashes of its canonical positions.
+    """
+
+    seed, black_spec, white_spec, opening_moves, noise = task
+    random.seed(seed)
+
+    game = Game(make_player(black_spec, SquareType.BLACK, noise),
+                make_player(white_spec, SquareType.WHITE, noise))
+    game.update_valid_moves()
+
+    moves = []
+    hashes = []
+
+    while not game.is_finished:
+        black, white = from_board(game.board.state)
+        black, white, _ = canonical(black, white)
+        hashes.append(position_hash(black, white,
+                                    game.active.disc_color == SquareType.BLACK))
+
+        if len(moves) < opening_moves:
+            game.prev_move = game.next_move
+            game.next_move = game.active.get_random_move(game)
+        else:
+            game.get_player_move()
+
+        if game.next_move is not None:
+            moves.append(format_move(game.next_move))
+
+        game.make_move()
+        game.change_turn()
+        game.update_valid_moves()
+        game.update_scores()
+        game.check_finished()
+
+    return {
+        'seed': seed,
+        'black': black_spec,
+        'white': white_spec,
+        'opening_moves': opening_moves,
+        'moves': moves,
+        'black_score': int(game.black_score),
+        'white_score': int(game.white_score),
+        'hashes': hashes
+    }
+
+
+def game_hash(position_hashes):
+    """
+    Hash a game's sequence of canonical positions into 64 bits.
+    """
+
+    data = b''.join(value.to_bytes(8, 'little') for value in position_hashes)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class ShardWriter:
+    """
+    Writes JSON lines to numbered shard files of bounded size. A shard is
+    written under a '.partial' name and renamed once complete, so readers
+    only ever see complete shards.
+    """
+
+    def __init__(self, directory, max_bytes, on_complete=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_complete = on_complete
+        os.makedirs(directory, exist_ok=True)
+
+        # Carry on numbering after the shards of earlier runs
+        existing = [int(name[len('shard-'):-len('.jsonl')])
+                    for name in os.listdir(directory)
+                    if name.startswith('shard-') and name.endswith('.jsonl')]
+        self.index = max(existing, default=-1) + 1
+        self.file = None
+
+
+    def path(self, index):
+        return os.path.join(self.directory, f'shard-{index:05d}.jsonl')
+
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self.path(self.index) + '.partial', 'w')
+
+        self.file.write(json.dumps(record) + '\n')
+        if self.file.tell() >= self.max_bytes:
+            self.close()
+
+
+    def close(self):
+        if self.file is None:
+            return
+
+        self.file.close()
+        os.replace(self.path(self.index) + '.partial', self.path(self.index))
+        self.file = None
+        self.index += 1
+        if self.on_complete:
+            self.on_complete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play game generation.")
+    parser.add_argument('--pairing', action='append', default=None,
+                        help="Players as '<black>,<white>', repeatable.")
+    parser.add_argument('--games', type=int, default=None)
+    parser.add_argument('--hours', type=float, default=None)
+    parser.add_argument('--opening-moves', type=int, nargs=2, default=[2, 8],
+                        metavar=('MIN', 'MAX'),
+                        help="Range of random moves opening each game.")
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help="Noise added to minimax players' move values.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output-dir', default='selfplay')
+    parser.add_argument('--shard-mb', type=float, default=64)
+    parser.add_argument('--capacity', type=int, default=1_000_000,
+                        help="Games the duplicate filter is sized for.")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    pairings = [pairing.split(',') for pairing in args.pairing or ['minimax:2,minimax:2']]
+    for pairing in pairings:
+        if len(pairing) != 2:
+            parser.error(f"Invalid pairing '{','.join(pairing)}'.")
+        for spec in pairing:
+            try:
+                make_player(spec, SquareType.BLACK, 0.0)
+            except ValueError as error:
+                parser.error(str(error))
+
+    rng = random.Random(args.seed)
+    deadline = time.time() + args.hours * 3600 if args.hours else None
+
+    # Games and positions seen, kept with the shards to survive restarts
+    seen_games = BloomFilter(args.capacity)
+    seen_positions = BloomFilter(args.capacity * 20)
+    games_path = os.path.join(args.output_dir, 'seen-games.bloom')
+    positions_path = os.path.join(args.output_dir, 'seen-positions.bloom')
+    if os.path.exists(games_path) and os.path.exists(positions_path):
+        try:
+            seen_games.load(games_path)
+            seen_positions.load(positions_path)
+        except ValueError as error:
+            parser.error(f"Can't load the duplicate filters in {args.output_dir}: "
+                         f"{error} Rerun with the --capacity they were created "
+                         f"with, or delete the .bloom files to start afresh.")
+
+    def save_filters():
+        seen_games.save(games_path)
+        seen_positions.save(positions_path)
+
+    writer = ShardWriter(args.output_dir, int(args.shard_mb * 1024 * 1024), save_filters)
+
+    def tasks():
+        for number in itertools.count():
+            black, white = pairings[number % len(pairings)]
+            if (number // len(pairings)) % 2:
+                black, white = white, black
+            yield (rng.getrandbits(63), black, white,
+                   rng.randint(*args.opening_moves), args.noise)
+
+    played = written = 0
+    start = time.perf_counter()
+    task_stream = tasks()
+    batch_size = 4 * args.workers
+
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            while args.games is None or played < args.games:
+                if deadline and time.time() >= deadline:
+                    break
+
+                size = batch_size if args.games is None else min(batch_size, args.games - played)
+                batch = list(itertools.islice(task_stream, size))
+
+                for record in pool.imap_unordered(play_game, batch):
+                    played += 1
+                    hashes = record.pop('hashes')
+                    if not seen_games.add(game_hash(hashes)):
+                        continue
+
+                    record['new_positions'] = sum(seen_positions.add(value)
+                                                  for value in hashes)
+                    writer.write(record)
+                    written += 1
+
+                elapsed = time.perf_counter() - start
+                print(f"{played} games played, {written} written, "
+                      f"{seen_positions.count:,} unique positions, "
+                      f"{played / elapsed:.2f} games/second", file=sys.stderr)
+
+    finally:
+        writer.close()
+        save_filters()
+
+
+if __name__ == '__main__':
+    main()
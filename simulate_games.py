@@ -0,0 +1,42 @@
+# This script plays large numbers of random or greedy Othello games in lockstep
+# using the batched engine, and reports outcome statistics and throughput.
+#
+# Usage: python simulate_games.py --games 100000 --policy random --seed 0
+
+import argparse
+import time
+from src.batch import BatchGame
+
+parser = argparse.ArgumentParser(description="Batched Othello playouts.")
+parser.add_argument('--games', type=int, default=100000)
+parser.add_argument('--batch-size', type=int, default=100000)
+parser.add_argument('--policy', choices=['random', 'greedy'], default='random')
+parser.add_argument('--seed', type=int, default=None)
+args = parser.parse_args()
+
+black_wins = white_wins = draws = 0
+total_discs = 0
+played = 0
+
+start = time.perf_counter()
+while played < args.games:
+    n_games = min(args.batch_size, args.games - played)
+    seed = None if args.seed is None else args.seed + played
+    batch = BatchGame(n_games, seed=seed)
+    batch.run(args.policy)
+
+    black, white = batch.scores()
+    black_wins += int((black > white).sum())
+    white_wins += int((white > black).sum())
+    draws += int((black == white).sum())
+    total_discs += int((black + white).sum())
+    played += n_games
+
+elapsed = time.perf_counter() - start
+
+print(f"Games played: {played} ({args.policy} policy)")
+print(f"Black wins: {black_wins / played:.2%}")
+print(f"White wins: {white_wins / played:.2%}")
+print(f"Draws: {draws / played:.2%}")
+print(f"Average final disc count: {total_discs / played:.2f}")
+print(f"Throughput: {played / elapsed:,.0f} games/second")
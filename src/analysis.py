@@ -0,0 +1,189 @@
+import time
+import threading
+from collections import OrderedDict
+from .board import SquareType
+from .game import Game
+from .player import Player, PlayerType
+from .state_evaluation import StateEvaluator
+from .scheduler import run_steps
+from .bitboard import (
+    from_board, canonical, transform_square, inverse_transform_square
+)
+
+
+class PositionAnalyser:
+    """
+    Scores every legal move of a position using Minimax, caching results in an
+    LRU cache keyed by canonical position and search depth. An analyser can
+    be shared by threads.
+    """
+
+    def __init__(self, state_eval: StateEvaluator = None,
+                 max_entries: int = 4096):
+        """
+        Initialises the analyser.
+
+        Args:
+            state_eval (StateEvaluator, optional): Evaluator used for search.
+            max_entries (int, optional): Maximum number of cached positions.
+        """
+
+        self.state_eval = state_eval if state_eval else StateEvaluator()
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def analyse(self, game, depth, transpositions=None):
+        """
+        Evaluate all legal moves for the active player of a game.
+
+        Args:
+            game (Game): The position to analyse.
+            depth (int): Search depth, counted from the position.
+            transpositions (dict, optional): Search table shared between
+                positions, see Player.minimax().
+
+        Returns:
+            List[Tuple[Tuple[int, int], float]]: Moves and their minimax
+                values, best first for the active player.
+        """
+
+        return run_steps(self.analyse_steps(game, depth, transpositions))
+
+
+    def analyse_steps(self, game, depth, transpositions=None):
+        """
+        Generator form of analyse(), which a SearchScheduler can interleave
+        with other searches.
+        """
+
+        color = game.active.disc_color
+        black, white = from_board(game.board.state)
+        black, white, symmetry = canonical(black, white)
+        key = (black, white, color, depth)
+
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if cached is not None:
+            return [(inverse_transform_square(*move, symmetry), value)
+                    for move, value in cached]
+
+        player = Player(PlayerType.MINIMAX, color, self.state_eval, depth)
+        moves_with_values = yield from player.minimax_evaluate_moves_steps(
+            game, transpositions)
+
+        # Best move first; Black maximizes and White minimizes
+        moves_with_values.sort(key=lambda item: item[1],
+                               reverse=color == SquareType.BLACK)
+
+        with self.lock:
+            self.cache[key] = [(transform_square(*move, symmetry), value)
+                               for move, value in moves_with_values]
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+        return moves_with_values
+
+
+    def analyse_within(self, game, time_limit, max_depth, transpositions=None):
+        """
+        Analyse a position one ply deeper at a time, until the time limit is
+        used up or max_depth is reached. A started search always completes.
+
+        Returns:
+            Tuple[int, List[Tuple[Tuple[int, int], float]]]: The depth reached
+                and the moves with their values at that depth, as analyse().
+        """
+
+        return run_steps(self.analyse_within_steps(game, time_limit, max_depth,
+                                                   transpositions))
+
+
+    def analyse_within_steps(self, game, time_limit, max_depth, 
+                             transpositions=None):
+        """
+        Generator form of analyse_within().
+        """
+
+        start = time.perf_counter()
+        for depth in range(1, max_depth + 1):
+            moves_with_values = yield from self.analyse_steps(
+                game, depth, transpositions)
+            if time.perf_counter() - start >= time_limit:
+                break
+
+        return depth, moves_with_values
+
+
+    def analyse_game(self, moves, depth, time_limit=None):
+        """
+        Analyse every position of a game given by its sequence of moves,
+        sharing one search table across consecutive positions. A position's
+        search is ordered by the best moves found searching the one before.
+
+        Args:
+            moves (List[Tuple[int, int]]): The moves played, passes omitted.
+            depth (int): Search depth for each position, or the deepest search
+                if there is a time limit.
+            time_limit (float, optional): Seconds to spend on each position,
+                see analyse_within().
+
+        Returns:
+            List[dict]: For each move, the side to move, the move played and
+                its value, the scores of all legal moves and the depth 
+                searched.
+        """
+
+        return run_steps(self.analyse_game_steps(moves, depth, time_limit))
+
+
+    def analyse_game_steps(self, moves, depth, time_limit=None):
+        """
+        Generator form of analyse_game().
+        """
+
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        transpositions = {}
+        analysis = []
+
+        for move in moves:
+            move = tuple(move)
+
+            # Pass if the active player has no moves
+            if not game.get_valid_moves():
+                game.change_turn()
+
+            if time_limit is not None:
+                searched_depth, moves_with_values = yield from self.analyse_within_steps(
+                    game, time_limit, depth, transpositions)
+            else:
+                searched_depth = depth
+                moves_with_values = yield from self.analyse_steps(
+                    game, depth, transpositions)
+            scores = dict(moves_with_values)
+            if move not in scores:
+                raise ValueError(f"Illegal move {move} in game record.")
+
+            analysis.append({
+                'color': game.active.disc_color.name,
+                'move': move,
+                'value': scores[move],
+                'best_move': moves_with_values[0][0],
+                'best_value': moves_with_values[0][1],
+                'moves': moves_with_values,
+                'depth': searched_depth,
+            })
+
+            game = game.simulate_move(move)
+
+        return analysis
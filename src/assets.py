@@ -0,0 +1,297 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import logging
+import threading
+from array import typecodes
+
+from .state_evaluation import HeuristicType, StateEvaluator, AI_WEIGHTS, shared_evaluator
+
+# OthelloAI's assets; its evaluation weights, and any opening book and lookup
+# tables, are published as numbered versions in a directory, each version a
+# subdirectory written in full before a CURRENT file is atomically replaced to
+# name it. Worker processes check CURRENT every few seconds and swap in a new
+# version when it appears, memory-mapping its tables, so a better evaluator is
+# deployed without restarting them. Games keep the evaluator they started
+# with, and every cache is keyed by the evaluator's fingerprint, so only the
+# entries of retired evaluators go cold.
+#
+# A version directory holds weights.json, mapping HeuristicType names to
+# weights, optionally book.json, mapping position strings to moves, and any
+# number of tables named <name>.<array typecode>.bin.
+
+ASSETS_DIR = os.environ.get(
+    'OTHELLO_ASSETS_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data', 'assets')
+)
+
+# Seconds between checks of the directory for a new version
+CHECK_INTERVAL = float(os.environ.get('OTHELLO_ASSETS_INTERVAL', 5))
+
+CURRENT = 'CURRENT'
+WEIGHTS = 'weights.json'
+BOOK = 'book.json'
+TABLE_SUFFIX = '.bin'
+
+# Versions kept when publishing, so workers still using one can find it
+KEEP_VERSIONS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class AssetVersion:
+    """
+    One published version of the assets, loaded.
+    """
+
+    def __init__(self, directory, name):
+        """
+        Loads a version, memory-mapping its tables.
+
+        Args:
+            directory (str): The assets directory.
+            name (str): The version's name, e.g. 'v0003'.
+
+        Raises:
+            ValueError: If the version's weights are invalid.
+        """
+
+        self.name = name
+        path = os.path.join(directory, name)
+
+        with open(os.path.join(path, WEIGHTS)) as file:
+            self.weights = read_weights(json.load(file))
+        self.evaluator = shared_evaluator(self.weights)
+
+        self.book = {}
+        if os.path.exists(os.path.join(path, BOOK)):
+            with open(os.path.join(path, BOOK)) as file:
+                self.book = json.load(file)
+
+        self.tables = {}
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith(TABLE_SUFFIX):
+                continue
+            table, typecode = filename[:-len(TABLE_SUFFIX)].rsplit('.', 1)
+            with open(os.path.join(path, filename), 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[table] = memoryview(mapped).cast(typecode)
+
+
+def read_weights(data):
+    """
+    Read evaluation weights given by heuristic name, e.g. {"MOBILITY": 0.5}.
+
+    Returns:
+        dict: Weight of each heuristic.
+
+    Raises:
+        ValueError: If a heuristic is unknown or the weights don't sum to 1.
+    """
+
+    try:
+        weights = {HeuristicType[name]: float(weight) for name, weight in data.items()}
+    except KeyError as error:
+        raise ValueError(f"Unknown heuristic {error}.")
+
+    StateEvaluator(weights)
+    return weights
+
+
+def version_names(directory):
+    """
+    Names of the complete versions in an assets directory, oldest first.
+    """
+
+    if not os.path.isdir(directory):
+        return []
+    # By number, so that v10000 comes after v9999
+    return sorted((name for name in os.listdir(directory)
+                   if name.startswith('v') and name[1:].isdigit()),
+                  key=lambda name: int(name[1:]))
+
+
+def read_current(directory):
+    """
+    Name of the current version, or None if none has been published.
+    """
+
+    try:
+        with open(os.path.join(directory, CURRENT)) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_version(directory, weights, book=None, tables=None,
+                    keep=KEEP_VERSIONS):
+    """
+    Publish a new version of the assets and make it the current one. The
+    version is written under a temporary name and renamed, then CURRENT is
+    replaced, so workers never see a partial version. Versions older than the
+    last keep are removed.
+
+    Args:
+        directory (str): The assets directory.
+        weights (dict): Weight of each heuristic, by HeuristicType or name.
+        book (dict, optional): Moves of the opening book, by position string.
+        tables (dict, optional): Paths of table files to copy, by file name,
+            e.g. {'patterns.h.bin': 'build/patterns.bin'}.
+        keep (int, optional): Versions kept, the new one included.
+
+    Returns:
+        str: The new version's name.
+
+    Raises:
+        ValueError: If the weights are invalid, or a table file is misnamed.
+    """
+
+    weights = {getattr(heuristic, 'name', heuristic): weight
+               for heuristic, weight in weights.items()}
+    read_weights(weights)
+
+    tables = tables or {}
+    for filename in tables:
+        table, _, typecode = filename[:-len(TABLE_SUFFIX)].rpartition('.')
+        if (not filename.endswith(TABLE_SUFFIX) or not table or
+                len(typecode) != 1 or typecode not in typecodes):
+            raise ValueError(f"Table file {filename} isn't named "
+                             f"<name>.<typecode>{TABLE_SUFFIX}.")
+
+    names = version_names(directory)
+    name = f"v{int(names[-1][1:]) + 1 if names else 1:04d}"
+
+    path = os.path.join(directory, name)
+    temp_path = path + '.partial'
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+
+    with open(os.path.join(temp_path, WEIGHTS), 'w') as file:
+        json.dump(weights, file, indent=2)
+    if book is not None:
+        with open(os.path.join(temp_path, BOOK), 'w') as file:
+            json.dump(book, file)
+    for filename, source in tables.items():
+        shutil.copyfile(source, os.path.join(temp_path, filename))
+    os.replace(temp_path, path)
+
+    current_path = os.path.join(directory, CURRENT)
+    with open(f'{current_path}.{os.getpid()}.tmp', 'w') as file:
+        file.write(name + '\n')
+    os.replace(f'{current_path}.{os.getpid()}.tmp', current_path)
+
+    # Unmapped by workers once they drop them; mapped tables stay readable
+    for old_name in version_names(directory)[:-keep]:
+        shutil.rmtree(os.path.join(directory, old_name), ignore_errors=True)
+
+    return name
+
+
+class AssetStore:
+    """
+    A process's view of an assets directory, following its current version.
+    """
+
+    def __init__(self, directory=None, check_interval=None):
+        self.directory = directory or ASSETS_DIR
+        self.check_interval = (CHECK_INTERVAL if check_interval is None
+                               else check_interval)
+        self.version = None
+        self.checked = None
+        self.lock = threading.Lock()
+
+        # Evaluators of the versions seen, by fingerprint, for games started
+        # before a swap
+        self.evaluators = {}
+
+
+    def current(self):
+        """
+        Get the current version, swapping in a newly published one if it's
+        time to check for one.
+
+        Returns:
+            AssetVersion or None: The version, or None if none was published.
+        """
+
+        now = time.monotonic()
+        if self.checked is None or now - self.checked >= self.check_interval:
+            self.refresh()
+        return self.version
+
+
+    def refresh(self):
+        """
+        Swap in the current version if it has changed. A version failing to
+        load is logged and the loaded one kept.
+        """
+
+        with self.lock:
+            self.checked = time.monotonic()
+            name = read_current(self.directory)
+            if name is None or (self.version and self.version.name == name):
+                return
+
+            try:
+                version = AssetVersion(self.directory, name)
+            except (OSError, ValueError) as error:
+                logger.error(f"Keeping assets {getattr(self.version, 'name', None)}, "
+                             f"failed to load {name}: {error}")
+                return
+
+            self.evaluators[version.evaluator.fingerprint()] = version.evaluator
+            self.version = version
+            logger.info(f"Loaded assets {name}")
+
+
+    def evaluator(self, fingerprint):
+        """
+        Find the evaluator with a fingerprint among the current version and
+        the ones kept in the directory.
+
+        Returns:
+            StateEvaluator or None: The evaluator, or None if there's none.
+        """
+
+        self.current()
+        if fingerprint in self.evaluators:
+            return self.evaluators[fingerprint]
+
+        for name in version_names(self.directory):
+            try:
+                with open(os.path.join(self.directory, name, WEIGHTS)) as file:
+                    state_eval = shared_evaluator(read_weights(json.load(file)))
+            except (OSError, ValueError):
+                continue
+            self.evaluators.setdefault(state_eval.fingerprint(), state_eval)
+
+        return self.evaluators.get(fingerprint)
+
+
+_store = None
+
+
+def get_assets():
+    """
+    Get this process's view of the assets directory, OTHELLO_ASSETS_DIR.
+    """
+
+    global _store
+
+    if _store is None:
+        _store = AssetStore()
+    return _store
+
+
+def current_evaluator():
+    """
+    Get the evaluator of the current assets, or the built-in one, with
+    AI_WEIGHTS, if none were published.
+    """
+
+    version = get_assets().current()
+    return version.evaluator if version else shared_evaluator(AI_WEIGHTS)
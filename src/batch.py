@@ -0,0 +1,274 @@
+import numpy as np
+from .bitboard import DIRECTIONS
+
+def _to_numpy(amount, mask):
+    return np.uint64(abs(amount)), amount > 0, np.uint64(mask)
+
+
+# NumPy versions of the direction shifts, so every operation below acts on all
+# games at once, each also paired with the opposite direction
+_DIRECTIONS = [_to_numpy(amount, mask) for amount, mask in DIRECTIONS]
+_OPPOSITES = [_to_numpy(*next(other for other in DIRECTIONS
+                              if other[0] == -amount))
+              for amount, _ in DIRECTIONS]
+
+_INITIAL_BLACK = np.uint64((1 << 28) | (1 << 35))
+_INITIAL_WHITE = np.uint64((1 << 27) | (1 << 36))
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _shift(bits, amount, left, mask):
+    if left:
+        return (bits << amount) & mask
+    return (bits >> amount) & mask
+
+
+def popcount(bits):
+    """
+    Count set bits of every element of a uint64 array.
+    """
+
+    bits = bits - ((bits >> np.uint64(1)) & _M1)
+    bits = (bits & _M2) + ((bits >> np.uint64(2)) & _M2)
+    bits = (bits + (bits >> np.uint64(4))) & _M4
+    return ((bits * _H01) >> np.uint64(56)).astype(np.int64)
+
+
+def _add_to_planes(planes, bits, value):
+    """
+    Add `value` to the bit-sliced counter of every square set in `bits`.
+    """
+
+    for position in range(value.bit_length()):
+        if not value >> position & 1:
+            continue
+        carry = bits
+        for plane in range(position, len(planes)):
+            planes[plane], carry = planes[plane] ^ carry, planes[plane] & carry
+
+
+def legal_moves(own, opp):
+    """
+    Compute legal move bitboards for arrays of (own, opp) bitboards.
+    """
+
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+
+    for amount, left, mask in _DIRECTIONS:
+        run = _shift(own, amount, left, mask) & opp
+        for _ in range(5):
+            run |= _shift(run, amount, left, mask) & opp
+        moves |= _shift(run, amount, left, mask) & empty
+
+    return moves
+
+
+def flips(own, opp, move):
+    """
+    Compute flipped discs for arrays of single-bit moves. A zero move (a pass)
+    flips nothing.
+    """
+
+    zero = np.uint64(0)
+    flipped = np.zeros_like(own)
+
+    for amount, left, mask in _DIRECTIONS:
+        # The run of opponent discs next to the move; the run is bounded if
+        # the square just beyond it holds an own disc
+        run = _shift(move, amount, left, mask) & opp
+        for _ in range(5):
+            run |= _shift(run, amount, left, mask) & opp
+        bounded = (_shift(run, amount, left, mask) & own) != zero
+        flipped |= np.where(bounded, run, zero)
+
+    return flipped
+
+
+class BatchGame:
+    """
+    Holds N independent games as bitboard arrays and advances all of them in
+    lockstep, using vectorised operations rather than per-game Python loops.
+    """
+
+    def __init__(self, n_games, seed=None, black=None, white=None,
+                 black_to_move=None):
+        """
+        Initialises N games from the standard starting position, or from
+        given arrays of black and white bitboards.
+
+        Args:
+            n_games (int): The number of games to hold.
+            seed (int, optional): Seed for move sampling.
+            black, white (array-like, optional): Initial bitboards.
+            black_to_move (array-like, optional): Side to move per game.
+        """
+
+        self.n_games = n_games
+        self.rng = np.random.default_rng(seed)
+
+        # boards[:, 0] holds Black's discs and boards[:, 1] White's discs
+        self.boards = np.empty((n_games, 2), dtype=np.uint64)
+        self.boards[:, 0] = _INITIAL_BLACK if black is None else black
+        self.boards[:, 1] = _INITIAL_WHITE if white is None else white
+
+        if black_to_move is None:
+            self.black_to_move = np.ones(n_games, dtype=bool)
+        else:
+            self.black_to_move = np.asarray(black_to_move, dtype=bool).copy()
+
+        self.is_finished = np.zeros(n_games, dtype=bool)
+        self.plies = 0
+
+        self.update_finished()
+
+
+    def own_opp(self):
+        """
+        Get (own, opp) bitboard arrays from the side to move's perspective.
+        """
+
+        own = np.where(self.black_to_move, self.boards[:, 0], self.boards[:, 1])
+        opp = np.where(self.black_to_move, self.boards[:, 1], self.boards[:, 0])
+        return own, opp
+
+
+    def legal_moves(self):
+        """
+        Get legal move bitboards for the side to move, zero for finished games.
+        """
+
+        return self._legal.copy()
+
+
+    def update_finished(self):
+        """
+        Mark games where neither side has a legal move as finished, and cache
+        the legal moves of the side to move.
+        """
+
+        own, opp = self.own_opp()
+        self._legal = legal_moves(own, opp)
+
+        no_moves = self._legal == 0
+        if no_moves.any():
+            stuck = no_moves & (legal_moves(opp, own) == 0)
+            self.is_finished |= stuck
+
+        self._legal[self.is_finished] = 0
+
+
+    def step(self, moves):
+        """
+        Apply one single-bit move per game. Games given a zero move pass, and
+        finished games are left unchanged.
+        """
+
+        moves = np.where(self.is_finished, np.uint64(0), moves)
+        own, opp = self.own_opp()
+        flipped = flips(own, opp, moves)
+
+        own = own | moves | flipped
+        opp = opp & ~flipped
+
+        self.boards[:, 0] = np.where(self.black_to_move, own, opp)
+        self.boards[:, 1] = np.where(self.black_to_move, opp, own)
+
+        self.black_to_move = np.where(
+            self.is_finished, self.black_to_move, ~self.black_to_move
+        )
+        self.plies += 1
+
+        self.update_finished()
+
+
+    def sample_random_moves(self, legal):
+        """
+        Choose one legal move uniformly at random for every game.
+        """
+
+        counts = popcount(legal)
+        picks = (self.rng.random(self.n_games) * counts).astype(np.int64)
+
+        # Clear the lowest set bit until the picked move becomes the lowest
+        remaining = legal.copy()
+        for i in range(int(picks.max(initial=0))):
+            clear = picks > i
+            remaining = np.where(clear, remaining & (remaining - np.uint64(1)),
+                                 remaining)
+
+        return remaining & (~remaining + np.uint64(1))
+
+
+    def sample_greedy_moves(self, legal):
+        """
+        Choose the legal move flipping the most discs for every game, breaking
+        ties at random.
+
+        Flip counts for all 64 squares are accumulated at once in bit-sliced
+        counters, i.e. plane p holds bit p of every square's count.
+        """
+
+        own, opp = self.own_opp()
+        planes = [np.zeros_like(legal) for _ in range(5)]
+
+        for amount, left, mask in _OPPOSITES:
+            # Walk back from own discs; after k opponent discs, the next
+            # square flips k discs along this line
+            back = _shift(own, amount, left, mask)
+            for run_length in range(1, 7):
+                back = back & opp
+                if not back.any():
+                    break
+                back = _shift(back, amount, left, mask)
+                _add_to_planes(planes, back & legal, run_length)
+
+        # Narrow the legal moves down to those with the highest count
+        best = legal
+        for plane in reversed(planes):
+            narrowed = best & plane
+            best = np.where(narrowed != 0, narrowed, best)
+
+        return self.sample_random_moves(best)
+
+
+    def run(self, policy='random', max_plies=128):
+        """
+        Play every game to completion.
+
+        Args:
+            policy (str or callable): 'random', 'greedy', or a function taking
+                (batch, legal) and returning an array of moves.
+            max_plies (int, optional): Safety bound on the number of steps.
+        """
+
+        samplers = {
+            'random': self.sample_random_moves,
+            'greedy': self.sample_greedy_moves,
+        }
+
+        if callable(policy):
+            sample = lambda legal: policy(self, legal)
+        elif policy in samplers:
+            sample = samplers[policy]
+        else:
+            raise ValueError(f"Unknown policy {policy}.")
+
+        for _ in range(max_plies):
+            if self.is_finished.all():
+                break
+            legal = self.legal_moves()
+            self.step(sample(legal))
+
+
+    def scores(self):
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Black and White disc counts.
+        """
+
+        return popcount(self.boards[:, 0]), popcount(self.boards[:, 1])
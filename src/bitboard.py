@@ -0,0 +1,224 @@
+
+from .square import SquareType
+
+# Square (row, col) maps to bit index row * 8 + col, so column A is bit 0 of
+# each byte and row 1 is the lowest byte.
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F
+
+# Shift amount and wrap-around mask for each of the eight directions; right,
+# left, down, up and all diagonals
+DIRECTIONS = [(1, NOT_A_FILE), (-1, NOT_H_FILE), (8, FULL), (-8, FULL),
+              (9, NOT_A_FILE), (7, NOT_H_FILE), (-7, NOT_A_FILE), (-9, NOT_H_FILE)]
+
+CORNERS = 0x8100000000000081
+
+_K1 = 0x5555555555555555
+_K2 = 0x3333333333333333
+_K4 = 0x0F0F0F0F0F0F0F0F
+
+_SIDE_TO_MOVE_KEY = 0x9E3779B97F4A7C15
+
+
+def square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def bit_square(bit):
+    """
+    Convert a single-bit mask back to its (row, col) square.
+    """
+
+    index = bit.bit_length() - 1
+    return index // 8, index % 8
+
+
+def iter_squares(bits):
+    """
+    Yield the (row, col) of every set bit, in ascending square order.
+    """
+
+    while bits:
+        lowest = bits & -bits
+        yield bit_square(lowest)
+        bits ^= lowest
+
+
+def popcount(bits):
+    # int.bit_count() needs Python 3.10
+    return bin(bits).count('1')
+
+
+def shift(bits, amount, mask):
+    if amount > 0:
+        return (bits << amount) & mask & FULL
+    return (bits >> -amount) & mask
+
+
+# Binary digit of each square value, for Black's and White's bitboards
+BLACK_DIGITS = bytes.maketrans(bytes([SquareType.EMPTY, SquareType.BLACK,
+                                      SquareType.WHITE, SquareType.VALID]), b'0100')
+WHITE_DIGITS = bytes.maketrans(bytes([SquareType.EMPTY, SquareType.BLACK,
+                                      SquareType.WHITE, SquareType.VALID]), b'0010')
+
+
+def from_board(state):
+    """
+    Convert an 8x8 board state into (black, white) bitboards.
+    """
+
+    # Squares in row-major order are the bits from the lowest, so the board's
+    # bytes, as binary digits, are each bitboard's digits in reverse. Done
+    # without NumPy, which this module doesn't import, see benchmark_startup.py
+    cells = state.astype('int8', copy=False).tobytes()[::-1]
+    return int(cells.translate(BLACK_DIGITS), 2), int(cells.translate(WHITE_DIGITS), 2)
+
+
+def legal_moves(own, opp):
+    """
+    Compute the legal moves for the side owning `own`.
+
+    Returns:
+        int: A bitboard with one bit set per legal move.
+    """
+
+    empty = ~(own | opp) & FULL
+    moves = 0
+
+    for amount, mask in DIRECTIONS:
+        run = shift(own, amount, mask) & opp
+        # At most six opponent discs fit between a move and an own disc
+        for _ in range(5):
+            run |= shift(run, amount, mask) & opp
+        moves |= shift(run, amount, mask) & empty
+
+    return moves
+
+
+def flips(own, opp, move):
+    """
+    Compute the opponent discs flipped by placing a disc on `move`.
+
+    Returns:
+        int: A bitboard of flipped discs, empty if the move flips nothing.
+    """
+
+    flipped = 0
+
+    for amount, mask in DIRECTIONS:
+        run = 0
+        square = shift(move, amount, mask)
+        while square & opp:
+            run |= square
+            square = shift(square, amount, mask)
+        if square & own:
+            flipped |= run
+
+    return flipped
+
+
+def play(own, opp, move):
+    """
+    Apply a move for the side owning `own`.
+
+    Returns:
+        Tuple[int, int]: The updated (own, opp) bitboards.
+    """
+
+    flipped = flips(own, opp, move)
+    return own | move | flipped, opp & ~flipped
+
+
+def flip_vertical(bits):
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def mirror_horizontal(bits):
+    bits = ((bits >> 1) & _K1) | ((bits & _K1) << 1)
+    bits = ((bits >> 2) & _K2) | ((bits & _K2) << 2)
+    return ((bits >> 4) & _K4) | ((bits & _K4) << 4)
+
+
+def transpose(bits):
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+
+def transform_bits(bits, symmetry):
+    """
+    Apply one of the 8 board symmetries to a bitboard. Bit 0 of `symmetry`
+    flips rows, bit 1 mirrors columns and bit 2 swaps rows with columns.
+    """
+
+    if symmetry & 1:
+        bits = flip_vertical(bits)
+    if symmetry & 2:
+        bits = mirror_horizontal(bits)
+    if symmetry & 4:
+        bits = transpose(bits)
+    return bits
+
+
+def transform_square(row, col, symmetry):
+    if symmetry & 1:
+        row = 7 - row
+    if symmetry & 2:
+        col = 7 - col
+    if symmetry & 4:
+        row, col = col, row
+    return row, col
+
+
+def inverse_transform_square(row, col, symmetry):
+    if symmetry & 4:
+        row, col = col, row
+    if symmetry & 2:
+        col = 7 - col
+    if symmetry & 1:
+        row = 7 - row
+    return row, col
+
+
+def canonical(black, white):
+    """
+    Find the symmetry giving the smallest (black, white) pair, so that all 8
+    symmetric variants of a position share one representative.
+
+    Returns:
+        Tuple[int, int, int]: Canonical black and white bitboards, and the
+            symmetry mapping the original position onto them.
+    """
+
+    best = None
+    for symmetry in range(8):
+        candidate = (transform_bits(black, symmetry),
+                     transform_bits(white, symmetry), symmetry)
+        if best is None or candidate < best:
+            best = candidate
+
+    return best
+
+
+def _mix(bits):
+    """
+    SplitMix64 finaliser, spreading the bits of a 64-bit integer.
+    """
+
+    bits = (bits + 0x9E3779B97F4A7C15) & FULL
+    bits = ((bits ^ (bits >> 30)) * 0xBF58476D1CE4E5B9) & FULL
+    bits = ((bits ^ (bits >> 27)) * 0x94D049BB133111EB) & FULL
+    return bits ^ (bits >> 31)
+
+
+def position_hash(black, white, black_to_move):
+    """
+    Hash a position into 64 bits.
+    """
+
+    side = _SIDE_TO_MOVE_KEY if black_to_move else 0
+    return _mix(black ^ _mix(white ^ side))
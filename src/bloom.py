@@ -0,0 +1,92 @@
+import os
+import math
+
+
+class BloomFilter:
+    """
+    Remembers a set of 64-bit hashes in a fixed amount of memory. Membership
+    tests can give false positives, at the chosen rate once the filter holds
+    its capacity, but never false negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Sizes the filter.
+
+        Args:
+            capacity (int): Number of hashes the filter is sized for.
+            error_rate (float, optional): False positive rate at capacity.
+        """
+
+        self.capacity = capacity
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+        self.count = 0
+
+
+    def _indices(self, key):
+        # Double hashing; k indices from the two halves of the hash
+        low = key & 0xFFFFFFFF
+        high = (key >> 32) | 1
+        return [(low + i * high) % self.n_bits for i in range(self.n_hashes)]
+
+
+    def __contains__(self, key):
+        return all(self.bits[index >> 3] & (1 << (index & 7))
+                   for index in self._indices(key))
+
+
+    def add(self, key):
+        """
+        Add a hash to the filter.
+
+        Returns:
+            bool: True if the hash was not in the filter before.
+        """
+
+        added = False
+        for index in self._indices(key):
+            mask = 1 << (index & 7)
+            if not self.bits[index >> 3] & mask:
+                self.bits[index >> 3] |= mask
+                added = True
+
+        self.count += added
+        return added
+
+
+    def save(self, path):
+        """
+        Save the filter. It's written to a temporary file first and renamed
+        over the old one, so an interrupted save leaves the last complete one.
+        """
+
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(self.count.to_bytes(8, 'little'))
+            file.write(self.bits)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+
+    def load(self, path):
+        """
+        Load the contents of a filter saved with the same capacity and error
+        rate.
+
+        Raises:
+            ValueError: If the saved filter has a different size, e.g. it was
+                saved with another capacity or is truncated.
+        """
+
+        with open(path, 'rb') as file:
+            count = int.from_bytes(file.read(8), 'little')
+            bits = file.read()
+
+        if len(bits) != len(self.bits):
+            raise ValueError(f"Saved filter has {len(bits)} bytes of bits, "
+                             f"expected {len(self.bits)}.")
+        self.bits = bytearray(bits)
+        self.count = count
@@ -1,21 +1,18 @@
-
 import numpy as np
-from enum import Enum
-
-class SquareType(Enum):
-    EMPTY = ' '
-    BLACK = 'X'
-    WHITE = 'O'
-    VALID = '#'
+from .square import SquareType
+from .compact import Compact
 
 
-class Board:
+class Board(Compact):
     """
-    Represents the state of the game board.
+    Represents the state of the game board, as an 8x8 int8 array of 
+    SquareType values.
     """
 
+    __slots__ = ('_state',)
+
     def __init__(self):
-        self.state = np.full((8, 8), SquareType.EMPTY)
+        self.state = np.full((8, 8), SquareType.EMPTY, dtype=np.int8)
         self.state[3, 3] = SquareType.WHITE
         self.state[3, 4] = SquareType.BLACK
         self.state[4, 3] = SquareType.BLACK
@@ -27,14 +24,63 @@ class Board:
         self.state[5, 4] = SquareType.VALID
 
 
+    @property
+    def state(self):
+        return self._state
+
+
+    @state.setter
+    def state(self, state):
+        # Boards built from SquareType members are stored compactly too
+        self._state = np.asarray(state, dtype=np.int8)
+
+
+    def __getstate__(self):
+        return {'state': self._state}
+
+
+    def __setstate__(self, state):
+        # Boards pickled before squares were integers hold SquareType members
+        board = state['state']
+        if board.dtype == object:
+            board = np.vectorize(lambda square: SquareType(square).value, 
+                                 otypes=[np.int8])(board)
+
+        # A copy owns its squares, rather than keeping the pickle's buffer
+        self.state = np.array(board, dtype=np.int8)
+
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board._state = self._state.copy()
+        return board
+
+
+    def squares(self):
+        """
+        Get the board's squares as SquareType members, row by row.
+        """
+
+        return [[SquareType(square) for square in row] for row in self.state.tolist()]
+
+
+    def find(self, square):
+        """
+        Get the (row, col) of every square of a type, in row-major order.
+        """
+
+        return [(row, col) for row, col in 
+                np.argwhere(self.state == square.value).tolist()]
+
+
     def display(self):
         """
         Display the board state in the console.
         """
 
         board_repr = np.array([
-            [" " + square.value + " " for square in row]
-            for row in self.state
+            [" " + square.symbol + " " for square in row]
+            for row in self.squares()
         ])
 
         print('     A   B   C   D   E   F   G   H  ')
@@ -42,4 +88,4 @@ class Board:
         for i, row in enumerate(board_repr, start=1):
             row_str = '|'.join(row)
             print(f'{i} | {row_str} |')
-            print('  +' + '-' * 33 + '+')
\ No newline at end of file
+            print('  +' + '-' * 33 + '+')
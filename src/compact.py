@@ -0,0 +1,24 @@
+# Game, Board and Player objects keep their attributes in __slots__ rather than
+# a per-instance dict, as many games are kept in memory at once. They pickle
+# their attributes as a dict, so games pickled before they had slots load too.
+
+
+class Compact:
+    """
+    Base of classes keeping their attributes in __slots__.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {name: getattr(self, name) 
+                for cls in type(self).__mro__ 
+                for name in getattr(cls, '__slots__', ()) if hasattr(self, name)}
+
+
+    def __setstate__(self, state):
+        # Default slotted state, a (dict, slots) pair
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -0,0 +1,68 @@
+from .bitboard import FULL, legal_moves, play, popcount, square_bit, iter_squares
+
+# Exact endgame solver on bitboards. Scores are final disc differences from
+# the point of view of the side to move, with empty squares left uncounted.
+
+
+def solve(own, opp, alpha=-64, beta=64):
+    """
+    Search a position to the end of the game with alpha-beta pruning.
+
+    Args:
+        own (int): Bitboard of the side to move.
+        opp (int): Bitboard of the opponent.
+        alpha (int, optional): Lower bound of the score window.
+        beta (int, optional): Upper bound of the score window.
+
+    Returns:
+        int: The final disc difference with best play by both sides, exact if
+            it lies within (alpha, beta), otherwise a bound beyond the window.
+    """
+
+    moves = legal_moves(own, opp)
+
+    if not moves:
+        if not legal_moves(opp, own):
+            return popcount(own) - popcount(opp)
+        # Pass
+        return -solve(opp, own, -beta, -alpha)
+
+    best = -64
+    while moves:
+        move = moves & -moves
+        moves ^= move
+
+        new_own, new_opp = play(own, opp, move)
+        score = -solve(new_opp, new_own, -beta, -alpha)
+
+        if score > best:
+            best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    return best
+
+
+def solve_moves(black, white, black_to_move):
+    """
+    Find the exact score of every legal move of a position.
+
+    Returns:
+        List[Tuple[Tuple[int, int], int]]: Each legal move with the final disc
+            difference it leads to, from the point of view of the side to move.
+    """
+
+    own, opp = (black, white) if black_to_move else (white, black)
+
+    moves_with_scores = []
+    for row, col in iter_squares(legal_moves(own, opp)):
+        new_own, new_opp = play(own, opp, square_bit(row, col))
+        moves_with_scores.append(((row, col), -solve(new_opp, new_own)))
+
+    return moves_with_scores
+
+
+def empty_count(black, white):
+    return popcount(~(black | white) & FULL)
@@ -0,0 +1,314 @@
+import os
+import time
+import queue
+import socket
+import struct
+import threading
+import socketserver
+import multiprocessing
+
+from .square import SquareType
+from .player import Player, PlayerType
+from .state_evaluation import StateEvaluator, DEFAULT_WEIGHTS, AI_WEIGHTS
+from .assets import get_assets
+from .position import game_from_position
+from .bitboard import from_board, canonical
+from .search_stats import collect_stats
+from .single_flight import SingleFlight, from_canonical
+
+# The engine service searches positions for the web workers over a Unix
+# socket, on a pool of search processes whose caches and tables stay warm. A
+# connection carries any number of requests, one at a time, each a fixed size
+# record answered by a fixed size record. Identical requests in flight at the
+# same time, up to symmetry, share one search.
+
+# Request; Black and White bitboards, flags, depth, node budget (0 for none),
+# time budget (0 for none), noise, the evaluator's fingerprint and the ProbCut
+# confidence (0 for none)
+REQUEST = struct.Struct('<QQBBIffIf')
+BLACK_TO_MOVE = 1
+
+# Response; status, the move's row and column, and the nodes searched
+RESPONSE = struct.Struct('<BbbI')
+OK, NO_MOVE, FAILED = 0, 1, 2
+
+
+class EngineUnavailable(Exception):
+    """
+    Raised when the engine service can't answer a request.
+    """
+
+
+def encode_request(game, player):
+    """
+    Encode the search of a player's move in a game.
+
+    Returns:
+        bytes: The request.
+    """
+
+    black, white = from_board(game.board.state)
+    flags = BLACK_TO_MOVE if player.disc_color == SquareType.BLACK else 0
+    return REQUEST.pack(black, white, flags, player.depth,
+                        player.node_budget or 0, player.time_budget or 0.0,
+                        player.noise, player.state_eval.fingerprint(),
+                        player.probcut or 0.0)
+
+
+# Evaluators the service can search with, by fingerprint
+_evaluators = {}
+
+
+def get_evaluator(fingerprint):
+    """
+    Find an evaluator by fingerprint; a built-in one, or one of the published
+    assets (src/assets.py), which the web workers may have swapped in first.
+    """
+
+    if not _evaluators:
+        for weights in (DEFAULT_WEIGHTS, AI_WEIGHTS):
+            state_eval = StateEvaluator(weights=weights)
+            _evaluators[state_eval.fingerprint()] = state_eval
+    return _evaluators.get(fingerprint) or get_assets().evaluator(fingerprint)
+
+
+def search_request(data):
+    """
+    Answer a request, in a search process.
+
+    Returns:
+        bytes: The response.
+    """
+
+    (black, white, flags, depth, node_budget, time_budget,
+     noise, fingerprint, probcut) = REQUEST.unpack(data)
+
+    state_eval = get_evaluator(fingerprint)
+    if state_eval is None:
+        return RESPONSE.pack(FAILED, -1, -1, 0)
+
+    black_to_move = bool(flags & BLACK_TO_MOVE)
+    color, other = ((SquareType.BLACK, SquareType.WHITE) if black_to_move
+                    else (SquareType.WHITE, SquareType.BLACK))
+    player = Player(PlayerType.MINIMAX, color, state_eval, depth,
+                    node_budget=node_budget or None,
+                    time_budget=time_budget or None, noise=noise,
+                    probcut=probcut or None)
+    opponent = Player(PlayerType.USER, other)
+    players = (player, opponent) if black_to_move else (opponent, player)
+    game = game_from_position(black, white, black_to_move, *players)
+
+    with collect_stats() as stats:
+        move = player.get_minimax_move(game)
+
+    if move is None:
+        return RESPONSE.pack(NO_MOVE, -1, -1, stats.nodes)
+    return RESPONSE.pack(OK, move[0], move[1], stats.nodes)
+
+
+def canonical_request(data):
+    """
+    Map a request onto the canonical form of its position.
+
+    Returns:
+        Tuple[bytes, int]: The canonical request, and the symmetry mapping 
+            the position onto its canonical form.
+    """
+
+    black, white, flags, *settings = REQUEST.unpack(data)
+    black, white, symmetry = canonical(black, white)
+    return REQUEST.pack(black, white, flags, *settings), symmetry
+
+
+def restore_response(data, symmetry):
+    """
+    Map the response to a canonical request back onto the original position.
+    """
+
+    status, row, col, nodes = RESPONSE.unpack(data)
+    if status == OK:
+        row, col = from_canonical((row, col), symmetry)
+    return RESPONSE.pack(status, row, col, nodes)
+
+
+def _recv_exact(sock, size):
+    """
+    Read exactly size bytes, or None if the connection closed first.
+    """
+
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            data = _recv_exact(self.request, REQUEST.size)
+            if data is None:
+                return
+            try:
+                data, symmetry = canonical_request(data)
+                response, _ = self.server.searches.do(
+                    data, lambda: self.server.pool.apply(search_request, (data,)))
+                response = restore_response(response, symmetry)
+            except Exception:
+                response = RESPONSE.pack(FAILED, -1, -1, 0)
+            self.request.sendall(response)
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves search requests on a Unix socket, each connection in its own
+    thread, running the searches on a pool of processes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, n_workers=None):
+        """
+        Args:
+            path (str): Path of the socket, replacing a stale one.
+            n_workers (int, optional): Search processes, defaults to the
+                number of cores.
+        """
+
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.pool = multiprocessing.Pool(n_workers or os.cpu_count())
+        self.searches = SingleFlight()
+        super().__init__(path, _RequestHandler)
+
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class EngineClient:
+    """
+    Sends searches to the engine service, keeping a pool of open connections
+    that threads take turns using. After max_failures failures in a row the
+    service isn't tried again for retry_interval seconds, so that callers 
+    fall back to searching themselves without first waiting on a dead 
+    service, while one slow search doesn't send every thread's search back
+    in process.
+    """
+
+    def __init__(self, path, pool_size=4, timeout=10.0, retry_interval=5.0,
+                 max_failures=3):
+        """
+        Args:
+            path (str): Path of the service's socket.
+            pool_size (int, optional): Most idle connections kept open.
+            timeout (float, optional): Seconds to wait for a connection or an
+                answer.
+            retry_interval (float, optional): Seconds to skip the service for
+                after max_failures failures.
+            max_failures (int, optional): Failures in a row, of any threads,
+                after which the service is skipped.
+        """
+
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.max_failures = max_failures
+        self.failures = 0
+        self.connections = queue.LifoQueue(maxsize=pool_size)
+        self.lock = threading.Lock()
+        self.down_until = 0.0
+
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+    def _exchange(self, sock, request):
+        sock.sendall(request)
+        data = _recv_exact(sock, RESPONSE.size)
+        if data is None:
+            raise ConnectionResetError("Engine service closed the connection.")
+        return RESPONSE.unpack(data)
+
+
+    def best_move(self, game, player):
+        """
+        Search a player's move in a game on the service.
+
+        Returns:
+            Tuple[Tuple[int, int] or None, int]: The move, None if the player
+                has no moves, and the nodes searched.
+
+        Raises:
+            EngineUnavailable: If the service can't be reached, times out or
+                fails the search.
+        """
+
+        if time.monotonic() < self.down_until:
+            raise EngineUnavailable("Engine service recently failed.")
+
+        request = encode_request(game, player)
+        try:
+            sock = self.connections.get_nowait()
+        except queue.Empty:
+            sock = None
+
+        try:
+            if sock is not None:
+                try:
+                    response = self._exchange(sock, request)
+                except ConnectionError:
+                    # The pooled connection went stale, e.g. the service
+                    # restarted; retry once on a new one
+                    sock.close()
+                    sock = None
+            if sock is None:
+                sock = self._connect()
+                response = self._exchange(sock, request)
+
+        except OSError as error:
+            if sock is not None:
+                sock.close()
+            with self.lock:
+                self.failures += 1
+                if self.failures >= self.max_failures:
+                    self.failures = 0
+                    self.down_until = time.monotonic() + self.retry_interval
+            raise EngineUnavailable(str(error)) from error
+
+        with self.lock:
+            self.failures = 0
+
+        try:
+            self.connections.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+        status, row, col, nodes = response
+        if status == FAILED:
+            raise EngineUnavailable("Engine service failed the search.")
+        return ((row, col) if status == OK else None), nodes
+
+
+    def close(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                return
@@ -1,15 +1,19 @@
 
 import numpy as np
-import copy
 from .board import Board, SquareType
+from .compact import Compact
 from .player import Player, PlayerType
 
-class Game:
+class Game(Compact):
     """
     Handles the overall game flow, creating a Board() instance and two Player() 
     instances for black and white, respectively.   
     """
 
+    __slots__ = ('board', 'is_finished', 'player_black', 'player_white', 
+                 'active', 'inactive', 'next_move', 'prev_move', 
+                 'black_score', 'white_score', 'game_result')
+
     def __init__(self, player_black, player_white):
         self.board = Board()
         self.is_finished = False
@@ -35,8 +39,8 @@ class Game:
 
 
     def update_scores(self):
-        self.black_score = np.count_nonzero(self.board.state == SquareType.BLACK)
-        self.white_score = np.count_nonzero(self.board.state == SquareType.WHITE)    
+        self.black_score = int(np.count_nonzero(self.board.state == SquareType.BLACK.value))
+        self.white_score = int(np.count_nonzero(self.board.state == SquareType.WHITE.value))
 
 
     def is_valid_move(self, row, col):
@@ -51,7 +55,8 @@ class Game:
         # First, reset any moves on the board still displayed as valid
         self.reset_valid_moves()
 
-        if self.board.state[row, col] != SquareType.EMPTY:
+        state = self.board.state
+        if state.item(row, col) != SquareType.EMPTY:
             return False
 
         # Traversable directions; up, down, left, right and all diagonals
@@ -66,17 +71,18 @@ class Game:
             
             # While within board boundaries
             while 0 <= r < 8 and 0 <= c < 8:
-                if self.board.state[r, c] == SquareType.EMPTY:
+                square = state.item(r, c)
+                if square == SquareType.EMPTY:
                     break
 
-                if self.board.state[r, c] == self.active.disc_color:
+                if square == self.active.disc_color:
                     if found_opposing_disc:
                         # Found sequence of opponent's (inactive player) discs
                         # starting & ending with active player's own discs
                         return True
                     break
 
-                if self.board.state[r, c] == self.inactive.disc_color:
+                if square == self.inactive.disc_color:
                     found_opposing_disc = True
 
                 # Traverse another step in same direction
@@ -144,10 +150,8 @@ class Game:
         Reset all valid moves on the board to empty.
         """
 
-        for row in range(8):
-            for col in range(8):
-                if self.board.state[row, col] == SquareType.VALID:
-                    self.board.state[row, col] = SquareType.EMPTY
+        state = self.board.state
+        state[state == SquareType.VALID.value] = SquareType.EMPTY
 
 
     def update_valid_moves(self):
@@ -173,11 +177,7 @@ class Game:
 
     def is_valid_moves(self):
 
-        return any(
-            cell == SquareType.VALID 
-            for row in self.board.state 
-            for cell in row
-        )    
+        return bool(np.any(self.board.state == SquareType.VALID.value))
     
 
     def get_player_move(self):
@@ -231,12 +231,13 @@ class Game:
             flip_flag = False
 
             while 0 <= r < 8 and 0 <= c < 8:
-                if self.board.state[r, c] == self.inactive.disc_color:
+                square = self.board.state.item(r, c)
+                if square == self.inactive.disc_color:
                     # Add the opponent's disc to the sequence
                     seq_discs.append((r, c))
                     flip_flag = True
 
-                elif self.board.state[r, c] == self.active.disc_color:
+                elif square == self.active.disc_color:
                     if flip_flag:
                         # If we encounter our own disc after already 
                         # encountering opponent's discs, extend discs_to_flip
@@ -255,6 +256,9 @@ class Game:
     def flip(self):
         """
         Flip discs for the next move, thereby updating the board state.
+
+        Returns:
+            list: The (row, col) of each flipped disc.
         """
 
         row, col = self.next_move[0], self.next_move[1]
@@ -265,32 +269,33 @@ class Game:
             # Update the board state
             self.board.state[disc[0], disc[1]] = self.active.disc_color
 
+        return discs
+
 
     def make_move(self):
         """
         Make the next move, flipping opponent's discs. 
+
+        Returns:
+            list: The (row, col) of each flipped disc.
         """
 
         if self.next_move is None:
-            return
+            return []
 
         # Place disc
         row, col = self.next_move[0], self.next_move[1]
         self.board.state[row, col] = self.active.disc_color
         
         # Flip other discs
-        self.flip()
+        return self.flip()
         
 
     def is_board_full(self):
 
-        for row in range(8):
-            for col in range(8):
-                cell_state = self.board.state[row, col]
-                if cell_state in [SquareType.EMPTY, SquareType.VALID]:
-                    return False
-        
-        return True
+        state = self.board.state
+        return not np.any((state == SquareType.EMPTY.value) | 
+                          (state == SquareType.VALID.value))
     
 
     def check_finished(self):
@@ -327,6 +332,21 @@ class Game:
             self.game_result = "Draw"
 
 
+    def copy(self):
+        """
+        Copy the game, sharing its players, which don't change during play.
+
+        Returns:
+            Game: A new game instance with a copy of the board.
+        """
+
+        new_game = Game.__new__(Game)
+        for name in Game.__slots__:
+            setattr(new_game, name, getattr(self, name))
+        new_game.board = self.board.copy()
+        return new_game
+
+
     def simulate_move(self, move):
         """
         Simulate a move by creating a copy of the current game state.
@@ -335,8 +355,7 @@ class Game:
             Game: A new game instance with the move applied.
         """
 
-        # Create a deep copy of the game
-        new_game = copy.deepcopy(self)
+        new_game = self.copy()
 
         # Apply the input move 
         new_game.next_move = move
@@ -0,0 +1,338 @@
+import mmap
+import time
+import zlib
+import queue
+import random
+import struct
+import logging
+import multiprocessing
+
+from .square import SquareType
+from .player import Player, PlayerType
+from .bitboard import from_board, position_hash
+from .position import game_from_position
+from .search_stats import current_stats
+
+# Lazy SMP searches a position on several processes at once, all searching the
+# whole tree and sharing one transposition table in shared memory, rather than
+# dividing the root moves between them, which stalls when there are only a
+# few. Helpers search at staggered depths and in shuffled root orders, so they
+# fill the table with results the others then reuse, and the deepest search
+# any of them completes is played.
+
+# Header; id of the current search, changed to stop the helpers
+HEADER = struct.Struct('<Q')
+
+# Slot layout; key hash, black and white bitboards, lower and upper bounds of
+# the value, depth, best move square (NO_MOVE if none), flags (1 if Black is
+# to move, 2 if maximizing), and a CRC32 checksum of all preceding fields
+ENTRY = struct.Struct('<QQQddBBBxI')
+PAYLOAD_SIZE = ENTRY.size - 4
+NO_MOVE = 64
+
+# Slots per bucket; a position may be stored in either slot of its bucket
+WAYS = 2
+
+# Nodes a helper searches between checks for the search being stopped
+STOP_CHECK_INTERVAL = 64
+
+# Seconds the main process waits for a result before yielding
+POLL_INTERVAL = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+class SharedTranspositions:
+    """
+    A fixed-size transposition table in anonymous shared memory, which
+    processes forked after it is created share. It stands in for the dict of
+    Player.minimax(); keys are (black, white, side to move, maximizing) and
+    values (depth, lower, upper, best move).
+
+    Slots are written without locks; each carries a checksum, and torn or
+    half-written slots are simply treated as empty by readers.
+    """
+
+    def __init__(self, n_slots=1 << 18):
+        n_slots -= n_slots % WAYS
+        self.n_slots = n_slots
+        self.n_buckets = n_slots // WAYS
+        self.mmap = mmap.mmap(-1, HEADER.size + n_slots * ENTRY.size)
+
+
+    def _offset(self, slot):
+        return HEADER.size + slot * ENTRY.size
+
+
+    def _read(self, slot):
+        """
+        Read a slot, returning None if it is empty or fails its checksum.
+        """
+
+        offset = self._offset(slot)
+        raw = self.mmap[offset:offset + ENTRY.size]
+        entry = ENTRY.unpack(raw)
+
+        if entry[0] == 0 or zlib.crc32(raw[:PAYLOAD_SIZE]) != entry[-1]:
+            return None
+        return entry
+
+
+    def _write(self, slot, *fields):
+        payload = ENTRY.pack(*fields, 0)[:PAYLOAD_SIZE]
+        offset = self._offset(slot)
+        self.mmap[offset:offset + ENTRY.size] = (
+            payload + struct.pack('<I', zlib.crc32(payload))
+        )
+
+
+    def _locate(self, key):
+        black, white, color, maximizing = key
+        flags = (color == SquareType.BLACK) | (bool(maximizing) << 1)
+        hashed = position_hash(black, white, flags & 1) ^ (flags << 62) or 1
+        first = (hashed % self.n_buckets) * WAYS
+        return (hashed, black, white, flags), range(first, first + WAYS)
+
+
+    def get(self, key, default=None):
+        identity, slots = self._locate(key)
+
+        for slot in slots:
+            entry = self._read(slot)
+            if entry is None or (entry[:3] + entry[7:8]) != identity:
+                continue
+
+            _, _, _, lower, upper, depth, move, _, _ = entry
+            return depth, lower, upper, None if move == NO_MOVE else divmod(move, 8)
+
+        return default
+
+
+    def __setitem__(self, key, value):
+        """
+        Store a position's entry. An existing entry for the position is
+        overwritten, then an empty slot is used, and otherwise the shallower
+        of the bucket's entries is replaced.
+        """
+
+        identity, slots = self._locate(key)
+        depth, lower, upper, move = value
+        square = NO_MOVE if move is None else move[0] * 8 + move[1]
+
+        entries = [(slot, self._read(slot)) for slot in slots]
+        victim = next((slot for slot, entry in entries
+                       if entry is not None and entry[0] == identity[0]), None)
+        if victim is None:
+            victim = next((slot for slot, entry in entries if entry is None),
+                          None)
+        if victim is None:
+            victim = min(entries, key=lambda item: item[1][5])[0]
+
+        hashed, black, white, flags = identity
+        self._write(victim, hashed, black, white, float(lower), float(upper),
+                    depth, square, flags)
+
+
+    @property
+    def search_id(self):
+        return HEADER.unpack_from(self.mmap, 0)[0]
+
+
+    @search_id.setter
+    def search_id(self, value):
+        HEADER.pack_into(self.mmap, 0, value)
+
+
+    def close(self):
+        self.mmap.close()
+
+
+def helper_search(table, player, game, search_id, index, results):
+    """
+    Deepen a search of a position one ply at a time up to the player's depth,
+    reporting each completed depth, until done or the search is stopped.
+    Odd helpers start a ply deeper, and all but the first search the root
+    moves in a shuffled order.
+
+    Args:
+        table (SharedTranspositions): Table shared by the helpers.
+        player (Player): The player to move.
+        game (Game): The position.
+        search_id (int): Id of the search; it is stopped when the table's
+            search_id changes.
+        index (int): Index of the helper.
+        results (Queue): Receives (search_id, depth, move, nodes) for each
+            completed depth.
+    """
+
+    moves = game.get_valid_moves_by_color(player.disc_color)
+    if index:
+        random.Random(search_id * 1000 + index).shuffle(moves)
+
+    history = {}
+    nodes = 0
+    for depth in range(min(1 + index % 2, player.depth), player.depth + 1):
+        search = player.minimax_evaluate_moves_steps(
+            game, table, depth, history, moves)
+
+        while True:
+            try:
+                next(search)
+            except StopIteration as stop:
+                evaluated_moves = stop.value
+                break
+
+            nodes += 1
+            if nodes % STOP_CHECK_INTERVAL == 0 and table.search_id != search_id:
+                search.close()
+                return
+
+        move, _ = player.choose_move(evaluated_moves)
+        results.put((search_id, depth, move, nodes))
+        nodes = 0
+
+        # Search the best move first at the next depth
+        moves.remove(move)
+        moves.insert(0, move)
+
+
+def _helper_process(table, tasks, results, index):
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        search_id, player, black, white, black_to_move = task
+        opponent = Player(PlayerType.USER, SquareType.WHITE if black_to_move
+                          else SquareType.BLACK)
+        players = (player, opponent) if black_to_move else (opponent, player)
+        game = game_from_position(black, white, black_to_move, *players)
+        helper_search(table, player, game, search_id, index, results)
+
+
+class LazySMP:
+    """
+    A pool of helper processes searching positions together, sharing a
+    transposition table. Helpers are forked, so this is Unix only.
+    """
+
+    def __init__(self, n_helpers, n_slots=1 << 18):
+        """
+        Starts the helper processes.
+
+        Args:
+            n_helpers (int): Number of helper processes.
+            n_slots (int, optional): Slots of the shared transposition table,
+                48 bytes each.
+        """
+
+        self.n_helpers = n_helpers
+        self.table = SharedTranspositions(n_slots)
+        self._start_helpers()
+
+
+    def _start_helpers(self):
+        context = multiprocessing.get_context('fork')
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(self.n_helpers)]
+        self.helpers = [
+            context.Process(target=_helper_process, daemon=True,
+                            args=(self.table, tasks, self.results, index))
+            for index, tasks in enumerate(self.tasks)
+        ]
+        for helper in self.helpers:
+            helper.start()
+
+
+    def _stop_helpers(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for helper in self.helpers:
+            helper.join(timeout=5)
+            if helper.is_alive():
+                helper.terminate()
+
+
+    def helpers_alive(self):
+        return all(helper.is_alive() for helper in self.helpers)
+
+
+    def search_steps(self, game, player):
+        """
+        Search for a player's move on all helpers, yielding while waiting for
+        them so the search can be interleaved or abandoned like
+        Player.minimax_move_steps(). The player's time budget is respected,
+        its node budget isn't.
+
+        If a helper dies, the search falls back to searching in this
+        process, and the helpers are all restarted before the next search;
+        a helper killed while writing to the results queue may leave it
+        unusable.
+
+        Returns:
+            Tuple[int, int]: The best move of the deepest search completed by
+                any helper, or None if the player has no valid moves.
+        """
+
+        if not game.get_valid_moves_by_color(player.disc_color):
+            return None
+
+        if not self.helpers_alive():
+            logger.warning("Restarting Lazy SMP helpers")
+            self._stop_helpers()
+            self._start_helpers()
+
+        search_id = self.table.search_id + 1
+        self.table.search_id = search_id
+
+        black, white = from_board(game.board.state)
+        black_to_move = player.disc_color == SquareType.BLACK
+        for tasks in self.tasks:
+            tasks.put((search_id, player, black, white, black_to_move))
+
+        stats = current_stats()
+        best_depth, best_move = 0, None
+        start = time.perf_counter()
+
+        try:
+            while best_depth < player.depth:
+                if (player.time_budget and best_move is not None and
+                        time.perf_counter() - start > player.time_budget):
+                    break
+
+                try:
+                    result = self.results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if not self.helpers_alive():
+                        logger.error("A Lazy SMP helper died, searching in process")
+                        return (yield from player.minimax_move_steps(game))
+                    yield
+                    continue
+
+                result_id, depth, move, nodes = result
+                if result_id != search_id:
+                    continue
+
+                if stats is not None:
+                    stats.nodes += nodes
+                    stats.depth = max(stats.depth, depth)
+                if depth > best_depth:
+                    best_depth, best_move = depth, move
+        finally:
+            # Stop the helpers still searching
+            self.table.search_id = search_id + 1
+
+        return best_move
+
+
+    def close(self):
+        self._stop_helpers()
+        self.table.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
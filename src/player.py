@@ -1,8 +1,15 @@
 
+import time
 import random
 from enum import Enum
-from .board import SquareType
-from .state_evaluation import StateEvaluator
+from .square import SquareType
+from .bitboard import from_board, legal_moves, flips, iter_squares, square_bit, popcount
+from .state_evaluation import StateEvaluator, shared_evaluator
+from .compact import Compact
+from .shared_cache import get_shared_cache
+from .search_stats import current_stats
+from .scheduler import run_steps
+from .probcut import cut_parameters
 
 class PlayerType(Enum):
     USER = 'user'
@@ -11,16 +18,74 @@ class PlayerType(Enum):
     MINIMAX = 'minimax'
 
 
-class Player:
+# Search depth of OthelloAI
+AI_DEPTH = 3
+
+# Width of the window ProbCut's shallow searches test their bound with
+PROBCUT_WINDOW = 1e-9
+
+# Player settings of each difficulty level. The weaker levels deepen one ply
+# at a time until the node budget runs out, so their cost per move is bounded
+# whatever the position, and add noise to their move values. The hardest level
+# always completes a full depth search, the AI's strength before there were
+# levels.
+DIFFICULTY_LEVELS = {
+    'easy': {'depth': 2, 'node_budget': 40, 'noise': 0.2},
+    'medium': {'depth': 3, 'node_budget': 400, 'noise': 0.05},
+    'hard': {'depth': 3, 'node_budget': None, 'noise': 0.0},
+}
+
+
+# Settings added to players since games were first pickled, and the defaults
+# players pickled without them load with
+ADDED_SETTINGS = {'node_budget': None, 'time_budget': None, 'noise': 0.0,
+                  'probcut': None}
+
+# Players shared by all unpickled games, by settings
+_shared_players = {}
+
+
+def shared_player(*settings):
+    """
+    Get the process's player with the given settings, the arguments of 
+    Player(), created on first use. Games loaded from pickles share their 
+    players this way, as players don't change during play.
+    """
+
+    player = _shared_players.get(settings)
+    if player is None:
+        player = _shared_players.setdefault(settings, Player(*settings))
+    return player
+
+
+def ended_by_move(evaluation):
+    """
+    Whether the move just made in a search ended the game, as 
+    Game.check_finished() judges after a move; the board is full, or one 
+    color has no discs left.
+    """
+
+    black_discs, white_discs = evaluation.discs
+    return not black_discs or not white_discs or black_discs + white_discs == 64
+
+
+class Player(Compact):
     """
     Represents a player, e.g player type and disc color etc.
     """
 
+    __slots__ = ('player_type', 'disc_color', 'state_eval', 'depth', 
+                 'node_budget', 'time_budget', 'noise', 'probcut')
+
     def __init__(self, 
                  player_type: PlayerType, 
                  disc_color: SquareType, 
                  state_eval: StateEvaluator = None,
-                 depth: int = 2):
+                 depth: int = 2,
+                 node_budget: int = None,
+                 time_budget: float = None,
+                 noise: float = 0.0,
+                 probcut: float = None):
         """
         Initialises a player with a type, disc color etc.
 
@@ -28,13 +93,54 @@ class Player:
             player_type (PlayerType): The type of the player (e.g., user, AI).
             disc_color (SquareType): The color of the player's disc.
             state_eval (StateEvaluator, optional): Strategy state evaluation.
-            depth (int, optional): Depth for the Minimax algorithm.
+            depth (int, optional): Depth for the Minimax algorithm, or the 
+                deepest search if there is a budget.
+            node_budget (int, optional): Nodes a move's search may visit. The
+                search deepens one ply at a time, playing the move of the 
+                deepest search completed within budget.
+            time_budget (float, optional): Seconds a move's search may take,
+                as for node_budget.
+            noise (float, optional): Standard deviation of random noise added
+                to the values of moves, making weaker play.
+            probcut (float, optional): Confidence, in standard deviations, 
+                with which a shallow search must predict a deeper one falls 
+                outside the search window to skip it, see probcut.py. None 
+                searches every move fully.
         """
 
         self.player_type = player_type
         self.disc_color = disc_color
-        self.state_eval = state_eval if state_eval else StateEvaluator()
+        self.state_eval = state_eval if state_eval else shared_evaluator()
         self.depth = depth
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        self.noise = noise
+        self.probcut = probcut
+
+
+    def __reduce__(self):
+        return shared_player, tuple(getattr(self, name) for name in Player.__slots__)
+
+
+    def __setstate__(self, state):
+        # Players pickled before they had all their settings take the defaults
+        super().__setstate__(state)
+        for name, value in ADDED_SETTINGS.items():
+            if not hasattr(self, name):
+                setattr(self, name, value)
+
+
+    def replace(self, **settings):
+        """
+        Copy the player with some settings changed, e.g. replace(depth=2).
+        """
+
+        player = Player.__new__(Player)
+        for name in Player.__slots__:
+            setattr(player, name, getattr(self, name))
+        for name, value in settings.items():
+            setattr(player, name, value)
+        return player
 
     
     def get_offline_move(self, game):
@@ -62,11 +168,7 @@ class Player:
         Get a random agent's move.
         """
 
-        valid_moves = []
-        for row in range(8):
-            for col in range(8):
-                if game.board.state[row, col] == SquareType.VALID:
-                    valid_moves.append((row, col))
+        valid_moves = game.board.find(SquareType.VALID)
 
         if not valid_moves:
             return None
@@ -77,7 +179,26 @@ class Player:
         return row, col
     
 
-    def minimax(self, game, depth, maximizing_player):
+    def get_greedy_move(self, game):
+        """
+        Get the move flipping the most discs, found without searching.
+
+        Returns:
+            Tuple[int, int] or None: The move, or None if there are no moves.
+        """
+
+        black, white = from_board(game.board.state)
+        own, opp = (black, white) if self.disc_color == SquareType.BLACK else (white, black)
+
+        moves = list(iter_squares(legal_moves(own, opp)))
+        if not moves:
+            return None
+
+        return max(moves, key=lambda move: popcount(flips(own, opp, square_bit(*move))))
+
+
+    def minimax(self, game, depth, maximizing_player, transpositions=None,
+                history=None):
         """
         Calculates the Minimax value for a given game state.
 
@@ -86,64 +207,257 @@ class Player:
             depth (int): The maximum depth to explore in the game tree.
             maximizing_player (bool): True if current player is maximizing; 
                                       otherwise, False.
+            transpositions (dict, optional): Results of already searched 
+                positions, shared between searches to avoid repeating work.
+                Results are reused at the same depth, and the best move of a
+                position found at any depth is searched first.
+            history (dict, optional): Cutoffs caused by each move, shared
+                between searches like transpositions. Moves with more cutoffs
+                are searched first, after the best move of the table.
 
         Returns:
             float: The optimal score a maximizing player can obtain, or the 
                 optimal score a minimizing player can concede.
         """
 
-        # Base case. Return board's value if reach max-depth or game over
-        if depth == 0 or game.is_finished:
-            return self.state_eval.evaluate(game)            
+        return run_steps(self.minimax_steps(game, depth, maximizing_player, 
+                                            transpositions, history=history))
 
-        if maximizing_player:
-            max_eval = float('-inf')
-            # Iterate across all moves for the active player
-            for move in game.get_valid_moves_by_color(game.active.disc_color):
-                simulated_game = game.simulate_move(move)
 
-                # Evaluate and update
-                eval = self.minimax(simulated_game, depth - 1, False)
-                max_eval = max(max_eval, eval)
-            return max_eval
+    def minimax_steps(self, game, depth, maximizing_player, transpositions=None,
+                      alpha=float('-inf'), beta=float('inf'), history=None,
+                      evaluation=None):
+        """
+        Generator form of minimax(), yielding before each node so the search 
+        can be paused and resumed, e.g. by a SearchScheduler. Returns the 
+        minimax value.
+
+        Branches that can't change the result are pruned (alpha-beta). With 
+        the default window the value is exact; otherwise a value at or below
+        alpha is an upper bound, and one at or above beta a lower bound.
+
+        The game is only read at the root; the search below it runs on the
+        bitboards of an IncrementalEvaluation, see minimax_bitboard_steps(),
+        created from the game if not given.
+        """
+
+        if evaluation is None:
+            evaluation = self.state_eval.start(*from_board(game.board.state))
+
+        return (yield from self.minimax_bitboard_steps(
+            evaluation, game.active.disc_color == SquareType.BLACK, 
+            game.is_finished, depth, maximizing_player, transpositions, 
+            alpha, beta, history))
+
+
+    def minimax_bitboard_steps(self, evaluation, black_to_move, finished, depth,
+                               maximizing_player, transpositions=None,
+                               alpha=float('-inf'), beta=float('inf'), 
+                               history=None):
+        """
+        Search the position of an IncrementalEvaluation, like minimax_steps().
+        Moves are generated, made and taken back on its bitboards, so a node
+        costs in proportion to the discs its move flips, and no Game is 
+        copied.
+
+        Args:
+            evaluation (IncrementalEvaluation): The position, shared by the 
+                whole search.
+            black_to_move (bool): Whether Black is to move.
+            finished (bool): Whether the game has ended.
+        """
+
+        yield
+
+        stats = current_stats()
+        if stats is not None:
+            stats.nodes += 1
+
+        black, white = evaluation.black, evaluation.white
+
+        first_move = None
+        if transpositions is not None:
+            color = SquareType.BLACK if black_to_move else SquareType.WHITE
+            key = (black, white, color, maximizing_player)
+            entry = transpositions.get(key)
+            if entry is not None:
+                entry_depth, lower, upper, first_move = entry
+                if entry_depth == depth:
+                    if lower == upper or lower >= beta:
+                        return lower
+                    if upper <= alpha:
+                        return upper
+
+        # Skip the search if a shallower one predicts it can't change the result
+        if self.probcut and depth > 1 and not finished:
+            cut = yield from self.probcut_steps(evaluation, black_to_move, depth,
+                                                maximizing_player, transpositions,
+                                                alpha, beta, history)
+            if cut is not None:
+                return cut
+
+        window = alpha, beta
+        best_move = None
+
+        # Base case. Return board's value if reach max-depth or game over
+        if depth == 0 or finished:
+            if stats is None:
+                value = evaluation.evaluate(finished)
+            else:
+                start = time.perf_counter()
+                value = evaluation.evaluate(finished)
+                stats.evaluation_seconds += time.perf_counter() - start
+                stats.evaluations += 1
 
         else:
-            min_eval = float('inf')
-            # Iterate across all moves for the active player
-            for move in game.get_valid_moves_by_color(game.active.disc_color):
-                simulated_game = game.simulate_move(move)
+            own, opp = (black, white) if black_to_move else (white, black)
+            moves = list(iter_squares(legal_moves(own, opp)))
+
+            if history:
+                moves.sort(key=lambda move: -history.get(move, 0))
+
+            # Search the best move found before first, the likeliest cutoff
+            if first_move in moves:
+                moves.remove(first_move)
+                moves.insert(0, first_move)
+
+            value = float('-inf') if maximizing_player else float('inf')
+            for move in moves:
+                bit = square_bit(*move)
+                evaluation.make(bit, flips(own, opp, bit), black_to_move)
 
                 # Evaluate and update
-                eval = self.minimax(simulated_game, depth - 1, True)
-                min_eval = min(min_eval, eval)
-            return min_eval
+                eval = yield from self.minimax_bitboard_steps(
+                    evaluation, not black_to_move, ended_by_move(evaluation),
+                    depth - 1, not maximizing_player, transpositions, 
+                    alpha, beta, history)
+                evaluation.unmake()
+
+                if maximizing_player and eval > value:
+                    value, best_move = eval, move
+                    alpha = max(alpha, value)
+                elif not maximizing_player and eval < value:
+                    value, best_move = eval, move
+                    beta = min(beta, value)
+
+                if alpha >= beta:
+                    if history is not None:
+                        history[move] = history.get(move, 0) + depth * depth
+                    break
+
+        if transpositions is not None:
+            lower, upper = value, value
+            if value <= window[0]:
+                lower = float('-inf')
+            elif value >= window[1]:
+                upper = float('inf')
+            transpositions[key] = (depth, lower, upper, best_move or first_move)
+
+        return value
         
 
-    def minimax_evaluate_moves(self, game):
+    def probcut_steps(self, evaluation, black_to_move, depth, maximizing_player,
+                      transpositions, alpha, beta, history):
+        """
+        Predict the value of a search from a shallower one, with the 
+        parameters fitted for the depth and game phase (ProbCut).
+
+        Returns:
+            float or None: beta if the value is at or above beta, or alpha if
+                it's at or below alpha, with the player's confidence; 
+                otherwise None.
+        """
+
+        if alpha == float('-inf') and beta == float('inf'):
+            return None
+
+        parameters = cut_parameters(self.state_eval.key, depth, 
+                                    sum(evaluation.discs))
+        if parameters is None:
+            return None
+
+        shallow, a, b, sigma = parameters
+        if a <= 0 or shallow >= depth:
+            return None
+        margin = self.probcut * sigma
+
+        # Test the shallow value against the bound on a null window
+        if beta != float('inf'):
+            bound = (beta + margin - b) / a
+            value = yield from self.minimax_bitboard_steps(
+                evaluation, black_to_move, False, shallow, maximizing_player,
+                transpositions, bound - PROBCUT_WINDOW, bound, history)
+            if value >= bound:
+                return beta
+
+        if alpha != float('-inf'):
+            bound = (alpha - margin - b) / a
+            value = yield from self.minimax_bitboard_steps(
+                evaluation, black_to_move, False, shallow, maximizing_player,
+                transpositions, bound, bound + PROBCUT_WINDOW, history)
+            if value <= bound:
+                return alpha
+
+        return None
+
+
+    def minimax_evaluate_moves(self, game, transpositions=None):
         """
         Evaluate valid moves according to Minimax.
 
+        Args:
+            game (Game): The current state of the game.
+            transpositions (dict, optional): Table of searched positions, see
+                minimax().
+
         Returns:
             List[Tuple[Tuple[int, int], float]]: A list of tuples, each 
             containing a valid move and its associated minimax value.
         """
 
+        return run_steps(self.minimax_evaluate_moves_steps(game, transpositions))
+
+
+    def minimax_evaluate_moves_steps(self, game, transpositions=None, 
+                                     depth=None, history=None, moves=None):
+        """
+        Generator form of minimax_evaluate_moves(), searching to the given
+        depth instead of the player's depth if given, and ordering moves by
+        history if given, see minimax(). The valid moves are searched in the
+        order of moves if given.
+        """
+
+        depth = depth or self.depth
+
         moves_with_values = []
 
-        valid_moves = game.get_valid_moves_by_color(self.disc_color)
+        evaluation = self.state_eval.start(*from_board(game.board.state))
+        black_to_move = self.disc_color == SquareType.BLACK
+        own, opp = ((evaluation.black, evaluation.white) if black_to_move
+                    else (evaluation.white, evaluation.black))
+
+        valid_moves = list(iter_squares(legal_moves(own, opp)))
+        if moves is not None:
+            valid_moves = [move for move in moves if move in valid_moves]
 
         if not valid_moves:
             return moves_with_values
         
         for move in valid_moves:
-            simulated_game = game.simulate_move(move)
+            bit = square_bit(*move)
+            evaluation.make(bit, flips(own, opp, bit), black_to_move)
 
             # Compute the minimax value
-            minimax_value = self.minimax(
-                simulated_game, 
-                self.depth - 1, 
-                self.disc_color == SquareType.BLACK
+            minimax_value = yield from self.minimax_bitboard_steps(
+                evaluation, 
+                not black_to_move,
+                ended_by_move(evaluation),
+                depth - 1, 
+                black_to_move,
+                transpositions,
+                history=history
             )
+            evaluation.unmake()
 
             # Add minimax value to list
             moves_with_values.append((move, minimax_value))
@@ -151,6 +465,54 @@ class Player:
         return moves_with_values
 
 
+    def search_key(self, game, depth):
+        """
+        Key of a search in the shared cache; the position, side to move, depth
+        and evaluation weights.
+        """
+
+        black, white = from_board(game.board.state)
+        return (black, white, self.disc_color == SquareType.BLACK, depth,
+                self.state_eval.fingerprint())
+
+
+    def search_settings(self):
+        """
+        Settings the player's move depends on, besides the position.
+        """
+
+        return (self.state_eval.fingerprint(), self.depth, self.node_budget,
+                self.time_budget, self.noise, self.probcut)
+
+
+    def get_cached_move(self, game, depth=None):
+        """
+        Look up the move found by an identical search of any worker process.
+
+        Args:
+            game (Game): The current state of the game.
+            depth (int, optional): Depth of the search, defaults to the 
+                player's depth.
+
+        Returns:
+            Tuple[int, int] or None: The cached move, or None if the shared 
+                cache isn't configured or holds no such search.
+        """
+
+        cache = get_shared_cache()
+        if cache is None:
+            return None
+
+        cached = cache.lookup(*self.search_key(game, depth or self.depth))
+
+        stats = current_stats()
+        if stats is not None:
+            stats.cache_hits += cached is not None
+            stats.cache_misses += cached is None
+
+        return cached[0] if cached is not None else None
+
+
     def get_minimax_move(self, game):
         """
         Get the best move using the Minimax algorithm.
@@ -158,16 +520,126 @@ class Player:
         Returns:
             Tuple[int, int]: The row and column of the best move.
         """
-        evaluated_moves = self.minimax_evaluate_moves(game)
 
-        if not evaluated_moves:
-            return None
-        
+        return run_steps(self.minimax_move_steps(game))
+
+
+    def choose_move(self, evaluated_moves):
+        """
+        Choose the best of the evaluated moves, after adding the player's 
+        noise to their values.
+
+        Returns:
+            Tuple[Tuple[int, int], float]: The best move and its value.
+        """
+
+        if self.noise:
+            evaluated_moves = [(move, value + random.gauss(0, self.noise))
+                               for move, value in evaluated_moves]
+
         if self.disc_color == SquareType.BLACK:
             # Maximize the minimax value for Black.
-            best_move = max(evaluated_moves, key=lambda item: item[1])[0]
+            return max(evaluated_moves, key=lambda item: item[1])
         else:
             # Minimize the minimax value for White.
-            best_move = min(evaluated_moves, key=lambda item: item[1])[0]
+            return min(evaluated_moves, key=lambda item: item[1])
+
+
+    def minimax_move_steps(self, game, transpositions=None, history=None):
+        """
+        Generator form of get_minimax_move(), which a SearchScheduler can 
+        interleave with other searches. A table of searched positions and a 
+        move history kept from earlier moves of the game order the search, see
+        minimax().
+        """
+
+        stats = current_stats()
+        if stats is not None:
+            stats.searches += 1
+
+        if self.node_budget or self.time_budget:
+            return (yield from self.budget_move_steps(game, transpositions, 
+                                                      history))
+
+        if stats is not None:
+            stats.depth = max(stats.depth, self.depth)
+
+        # Reuse the result of an identical search by any worker process
+        cached_move = None if self.noise else self.get_cached_move(game)
+        if cached_move is not None:
+            return cached_move
+
+        evaluated_moves = yield from self.minimax_evaluate_moves_steps(
+            game, transpositions, history=history)
+
+        if not evaluated_moves:
+            return None
+        
+        best_move, best_value = self.choose_move(evaluated_moves)
+
+        cache = get_shared_cache()
+        if cache is not None and not self.noise:
+            cache.store(*self.search_key(game, self.depth), best_move, best_value)
+
+        return best_move
+
+
+    def budget_move_steps(self, game, transpositions=None, history=None):
+        """
+        Search one ply deeper at a time, up to the player's depth, until the 
+        node or time budget runs out. The first ply is always completed. 
+        Without noise, each depth's result is looked up in and published to 
+        the shared cache, like a fixed depth search's.
+
+        Returns:
+            Tuple[int, int]: The best move of the deepest completed search.
+        """
 
-        return best_move
\ No newline at end of file
+        start = time.perf_counter()
+        nodes = 0
+        best_move = None
+        cache = None if self.noise else get_shared_cache()
+
+        # Each iteration's best moves order the next one's search
+        if transpositions is None:
+            transpositions = {}
+
+        for depth in range(1, self.depth + 1):
+            cached_move = self.get_cached_move(game, depth) if cache else None
+            if cached_move is not None:
+                best_move = cached_move
+                continue
+
+            search = self.minimax_evaluate_moves_steps(game, transpositions, 
+                                                       depth, history)
+
+            while True:
+                try:
+                    next(search)
+                except StopIteration as stop:
+                    evaluated_moves = stop.value
+                    break
+
+                nodes += 1
+                over_budget = (
+                    (self.node_budget and nodes > self.node_budget) or
+                    (self.time_budget and 
+                     time.perf_counter() - start > self.time_budget)
+                )
+                if over_budget and best_move is not None:
+                    search.close()
+                    return best_move
+                yield
+
+            if not evaluated_moves:
+                return None
+
+            best_move, best_value = self.choose_move(evaluated_moves)
+            if cache is not None:
+                cache.store(*self.search_key(game, depth), best_move, best_value)
+
+            stats = current_stats()
+            if stats is not None:
+                stats.depth = max(stats.depth, depth)
+
+        return best_move
@@ -0,0 +1,152 @@
+import numpy as np
+from .board import SquareType
+from .game import Game
+from .bitboard import from_board, iter_squares, legal_moves
+
+# Characters of the compact position encoding; 64 squares in row-major order
+# followed by the side to move, e.g. '---...XO...---X'
+ENCODING = {SquareType.BLACK: 'X', SquareType.WHITE: 'O'}
+EMPTY_CHAR = '-'
+
+
+def position_key(game):
+    """
+    Get the exact key of a game position.
+
+    Returns:
+        Tuple[int, int, bool]: Black and White bitboards, and whether Black is
+            to move.
+    """
+
+    black, white = from_board(game.board.state)
+    return black, white, game.active.disc_color == SquareType.BLACK
+
+
+def encode_position(game):
+    """
+    Encode a game position as a compact 65 character string.
+    """
+
+    cells = ''.join(ENCODING.get(cell, EMPTY_CHAR)
+                    for row in game.board.state.tolist() for cell in row)
+    return cells + ENCODING[game.active.disc_color]
+
+
+def decode_position(text):
+    """
+    Decode a compact position string.
+
+    Returns:
+        Tuple[int, int, bool]: Black and White bitboards, and whether Black is
+            to move.
+    """
+
+    if not isinstance(text, str) or len(text) != 65:
+        raise ValueError("Position must be a string of 65 characters.")
+
+    if text[64] not in ('X', 'O'):
+        raise ValueError("Side to move must be 'X' or 'O'.")
+
+    black = 0
+    white = 0
+    for index, char in enumerate(text[:64]):
+        if char == 'X':
+            black |= 1 << index
+        elif char == 'O':
+            white |= 1 << index
+        elif char != EMPTY_CHAR:
+            raise ValueError(f"Invalid square character '{char}'.")
+
+    return black, white, text[64] == 'X'
+
+
+def game_from_position(black, white, black_to_move, player_black, player_white):
+    """
+    Create a game set up at a given position.
+
+    Returns:
+        Game: A game with the position's board, side to move and scores.
+    """
+
+    game = Game(player_black, player_white)
+
+    state = np.full((8, 8), SquareType.EMPTY, dtype=np.int8)
+    for row, col in iter_squares(black):
+        state[row, col] = SquareType.BLACK
+    for row, col in iter_squares(white):
+        state[row, col] = SquareType.WHITE
+    game.board.state = state
+
+    if not black_to_move:
+        game.change_turn()
+
+    game.update_valid_moves()
+    game.update_scores()
+
+    # Neither side can move
+    if not legal_moves(black, white) and not legal_moves(white, black):
+        game.is_finished = True
+        game.determine_winner()
+
+    return game
+
+
+def format_move(move):
+    """
+    Format a (row, col) move in the console notation, e.g. (3, 4) -> 'e4'.
+    """
+
+    row, col = move
+    return chr(ord('a') + col) + str(row + 1)
+
+
+def parse_move(text):
+    """
+    Parse a move in the console notation, e.g. 'e4' -> (3, 4).
+    """
+
+    if len(text) != 2 or not text[1].isdigit():
+        raise ValueError(f"Invalid move '{text}'.")
+
+    col = ord(text[0].lower()) - ord('a')
+    row = int(text[1]) - 1
+    if not (0 <= row < 8 and 0 <= col < 8):
+        raise ValueError(f"Invalid move '{text}'.")
+    return row, col
+
+
+def read_position_suite(path):
+    """
+    Read a file of test positions. Each line holds a position string, its best
+    moves separated by commas, the score of the best moves, the source of the
+    expected result and a name. Blank lines and lines starting with '#' are 
+    skipped.
+
+    Returns:
+        List[dict]: The positions, with keys position, best_moves, score, 
+            source and name.
+    """
+
+    suite = []
+    with open(path, 'r') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            try:
+                position, moves, score, source, name = line.split()
+                decode_position(position)
+                if any(entry['name'] == name for entry in suite):
+                    raise ValueError(f"Duplicate position name '{name}'.")
+                suite.append({
+                    'position': position,
+                    'best_moves': [parse_move(move) for move in moves.split(',')],
+                    'score': float(score),
+                    'source': source,
+                    'name': name
+                })
+            except ValueError as error:
+                raise ValueError(f"{path}, line {line_number}: {error}")
+
+    return suite
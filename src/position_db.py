@@ -0,0 +1,335 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+from .bitboard import (
+    legal_moves, play, square_bit, popcount, canonical, position_hash
+)
+from .position import parse_move
+
+# A position database indexes every position of a collection of games by the
+# hash of its canonical form, so that the games reaching a position, up to
+# symmetry, and how they ended can be looked up. Games are added in batches,
+# each written as an immutable segment of sorted arrays that are memory-mapped
+# for lookups, and segments are merged once there are too many.
+#
+# A segment holds, for each distinct position hash in ascending order, the
+# number of Black wins, draws and White wins of its games, and the offset of
+# its games in the lists of game ids and their results. A catalogue records
+# the source file and line of each game id.
+
+INITIAL_BLACK = square_bit(3, 4) | square_bit(4, 3)
+INITIAL_WHITE = square_bit(3, 3) | square_bit(4, 4)
+
+MANIFEST = 'manifest.json'
+CATALOGUE = 'games.bin'
+SEGMENT_ARRAYS = ('hashes', 'results', 'offsets', 'games', 'outcomes')
+
+# Catalogue entry of a game; index of its source file and its line number
+CATALOGUE_ENTRY = np.dtype([('source', '<u4'), ('line', '<u4')])
+
+
+def replay_hashes(moves):
+    """
+    Replay a game given by its moves, passes omitted.
+
+    Args:
+        moves (List[str]): The moves in the console notation, e.g. 'e4'.
+
+    Returns:
+        Tuple[List[int], int]: The canonical hash of every position of the
+            game, the initial one included, and the result; 1 if Black won, 0
+            for a draw and -1 if White won.
+
+    Raises:
+        ValueError: If a move is malformed or illegal.
+    """
+
+    own, opp = INITIAL_BLACK, INITIAL_WHITE
+    black_to_move = True
+    hashes = []
+
+    def add_position():
+        black, white = (own, opp) if black_to_move else (opp, own)
+        black, white, _ = canonical(black, white)
+        hashes.append(position_hash(black, white, black_to_move))
+
+    add_position()
+    for move in moves:
+        # Pass if the side to move has no moves
+        if not legal_moves(own, opp):
+            own, opp = opp, own
+            black_to_move = not black_to_move
+
+        bit = square_bit(*parse_move(move))
+        if not legal_moves(own, opp) & bit:
+            raise ValueError(f"Illegal move '{move}'.")
+        opp, own = play(own, opp, bit)
+        black_to_move = not black_to_move
+        add_position()
+
+    black, white = (own, opp) if black_to_move else (opp, own)
+    black_discs, white_discs = popcount(black), popcount(white)
+    return hashes, (black_discs > white_discs) - (black_discs < white_discs)
+
+
+def build_segment(game_hashes, results, first_game):
+    """
+    Build the sorted arrays of a segment.
+
+    Args:
+        game_hashes (List[List[int]]): The position hashes of each game.
+        results (List[int]): The result of each game, as replay_hashes().
+        first_game (int): Id of the first game; games are numbered in order.
+
+    Returns:
+        dict: The segment's arrays, by name.
+    """
+
+    counts = np.array([len(hashes) for hashes in game_hashes], dtype=np.int64)
+    hashes = np.fromiter((value for hashes in game_hashes for value in hashes),
+                         dtype=np.uint64, count=int(counts.sum()))
+    games = np.repeat(np.arange(first_game, first_game + len(game_hashes),
+                                dtype=np.uint32), counts)
+    outcomes = np.repeat(np.asarray(results, dtype=np.int8), counts)
+
+    return sort_postings(hashes, games, outcomes)
+
+
+def sort_postings(hashes, games, outcomes):
+    """
+    Sort the postings of a segment, one per position of a game, by hash and
+    game, and count the results of each distinct position.
+
+    Returns:
+        dict: The segment's arrays, by name.
+    """
+
+    order = np.lexsort((games, hashes))
+    hashes, games, outcomes = hashes[order], games[order], outcomes[order]
+
+    unique, starts = np.unique(hashes, return_index=True)
+    offsets = np.append(starts, len(hashes)).astype(np.uint64)
+
+    # Black wins, draws and White wins of each position
+    result_counts = np.zeros((len(unique), 3), dtype=np.uint32)
+    position = np.repeat(np.arange(len(unique)), np.diff(offsets).astype(np.int64))
+    np.add.at(result_counts, (position, 1 - outcomes.astype(np.int64)), 1)
+
+    return {'hashes': unique, 'results': result_counts, 'offsets': offsets,
+            'games': games, 'outcomes': outcomes}
+
+
+class PositionDatabase:
+    """
+    A database of positions of games, in a directory.
+    """
+
+    def __init__(self, directory, max_segments=8):
+        """
+        Opens the database, creating an empty one if there is none.
+
+        Args:
+            directory (str): The database directory.
+            max_segments (int, optional): Segments kept before they are
+                merged into one.
+        """
+
+        self.directory = directory
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {'segments': [], 'games': 0, 'next_segment': 0,
+                             'sources': []}
+        self._segments = {}
+
+        # Drop catalogue entries of games an interrupted build didn't add
+        self.catalogue_path = os.path.join(directory, CATALOGUE)
+        with open(self.catalogue_path, 'ab') as file:
+            file.truncate(self.manifest['games'] * CATALOGUE_ENTRY.itemsize)
+
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.manifest, file)
+        os.replace(temp_path, path)
+
+
+    def _write_segment(self, arrays):
+        name = f"segment-{self.manifest['next_segment']:05d}"
+        self.manifest['next_segment'] += 1
+
+        # Written under a temporary name, so a segment is either complete or
+        # absent. A segment left by an interrupted build isn't in the manifest
+        # and is replaced.
+        path = os.path.join(self.directory, name)
+        temp_path = path + '.partial'
+        os.makedirs(temp_path, exist_ok=True)
+        for key in SEGMENT_ARRAYS:
+            np.save(os.path.join(temp_path, key + '.npy'), arrays[key])
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(temp_path, path)
+        return name
+
+
+    def segment(self, name):
+        """
+        Get a segment's arrays, memory-mapped.
+        """
+
+        if name not in self._segments:
+            self._segments[name] = {
+                key: np.load(os.path.join(self.directory, name, key + '.npy'),
+                             mmap_mode='r')
+                for key in SEGMENT_ARRAYS
+            }
+        return self._segments[name]
+
+
+    @property
+    def games(self):
+        return self.manifest['games']
+
+
+    def _source_index(self, source):
+        for index, (path, _) in enumerate(self.manifest['sources']):
+            if path == source:
+                return index
+        self.manifest['sources'].append([source, 0])
+        return len(self.manifest['sources']) - 1
+
+
+    def indexed_lines(self, source):
+        """
+        Number of lines of a source file already added.
+        """
+
+        for path, lines in self.manifest['sources']:
+            if path == source:
+                return lines
+        return 0
+
+
+    def add_games(self, records, source, lines):
+        """
+        Add a batch of games from a source file as a new segment.
+
+        Args:
+            records (List[Tuple[List[int], int, int]]): Each game's position
+                hashes and result, as replay_hashes(), and its line number.
+            source (str): File the games were read from.
+            lines (int): Lines of the source read so far, so that a later 
+                build only reads the lines added since.
+
+        Returns:
+            range: The ids of the added games.
+        """
+
+        first_game = self.manifest['games']
+        source_index = self._source_index(source)
+
+        if records:
+            catalogue = np.array([(source_index, line) for _, _, line in records],
+                                 dtype=CATALOGUE_ENTRY)
+            with open(self.catalogue_path, 'ab') as file:
+                file.write(catalogue.tobytes())
+
+            arrays = build_segment([hashes for hashes, _, _ in records],
+                                   [result for _, result, _ in records], first_game)
+            self.manifest['segments'].append(self._write_segment(arrays))
+            self.manifest['games'] += len(records)
+
+        self.manifest['sources'][source_index][1] = lines
+        self._save_manifest()
+
+        if len(self.manifest['segments']) > self.max_segments:
+            self.compact()
+
+        return range(first_game, self.manifest['games'])
+
+
+    def compact(self):
+        """
+        Merge all segments into one.
+        """
+
+        names = self.manifest['segments']
+        if len(names) < 2:
+            return
+
+        parts = [self.segment(name) for name in names]
+        hashes = np.concatenate([
+            np.repeat(part['hashes'], np.diff(part['offsets']).astype(np.int64))
+            for part in parts])
+        games = np.concatenate([part['games'] for part in parts])
+        outcomes = np.concatenate([part['outcomes'] for part in parts])
+
+        merged = self._write_segment(sort_postings(hashes, games, outcomes))
+        self.manifest['segments'] = [merged]
+        self._save_manifest()
+
+        self._segments.clear()
+        for name in names:
+            shutil.rmtree(os.path.join(self.directory, name))
+
+
+    def game_source(self, game_id):
+        """
+        Find where a game was read from.
+
+        Returns:
+            Tuple[str, int]: The game's source file and line number.
+        """
+
+        if not 0 <= game_id < self.manifest['games']:
+            raise KeyError(f"No game {game_id}.")
+
+        catalogue = np.memmap(self.catalogue_path, dtype=CATALOGUE_ENTRY, mode='r',
+                              shape=(self.manifest['games'],))
+        entry = catalogue[game_id]
+        return self.manifest['sources'][int(entry['source'])][0], int(entry['line'])
+
+
+    def lookup(self, black, white, black_to_move, max_games=20):
+        """
+        Look up a position, in any of its symmetric forms.
+
+        Returns:
+            dict: The number of games reaching the position, how many of them
+                Black won, drew and White won, and the ids of up to max_games
+                of them.
+        """
+
+        black, white, _ = canonical(black, white)
+        key = np.uint64(position_hash(black, white, black_to_move))
+
+        counts = np.zeros(3, dtype=np.int64)
+        game_ids = []
+        for name in self.manifest['segments']:
+            part = self.segment(name)
+            index = int(np.searchsorted(part['hashes'], key))
+            if index == len(part['hashes']) or part['hashes'][index] != key:
+                continue
+            counts += part['results'][index]
+            if len(game_ids) < max_games:
+                start, end = part['offsets'][index], part['offsets'][index + 1]
+                end = min(end, start + max_games - len(game_ids))
+                game_ids.extend(int(game) for game in part['games'][start:end])
+
+        return {
+            'games': int(counts.sum()),
+            'black_wins': int(counts[0]),
+            'draws': int(counts[1]),
+            'white_wins': int(counts[2]),
+            'game_ids': game_ids
+        }
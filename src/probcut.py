@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+
+# ProbCut predicts the value of a deep search from a shallow one, as
+# deep = a * shallow + b with residuals of standard deviation sigma, and skips
+# the deep search when the prediction falls outside the search window with
+# enough confidence. Parameters are fitted per depth pair and game phase by
+# fit_probcut.py, for one evaluator.
+#
+# Players only prune this way when created with a probcut confidence; none of
+# the difficulty levels are. With the fitted parameters it searches fewer
+# nodes to the same depth, but on a time budget it has reached shallower
+# depths than the full search (benchmark_positions.py --engine probcut), so
+# it stays opt-in until it pays off.
+
+PROBCUT_PATH = os.environ.get(
+    'OTHELLO_PROBCUT',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data', 'probcut.json')
+)
+
+# Game phases by number of discs on the board; up to 20, up to 40, and more
+PHASE_BOUNDS = (20, 40)
+
+_parameters = {}
+_lock = threading.Lock()
+
+
+def game_phase(discs):
+    """
+    Get the phase of a position with the given number of discs.
+
+    Returns:
+        int: 0 for the opening, 1 for the midgame and 2 for the endgame.
+    """
+
+    return sum(discs > bound for bound in PHASE_BOUNDS)
+
+
+def load_parameters(path=None):
+    """
+    Load fitted ProbCut parameters, once per process and file.
+
+    Returns:
+        dict: The parameters of each evaluator fingerprint, as a dict of
+            (shallow depth, a, b, sigma) by (depth, phase). Empty if the file
+            doesn't exist.
+    """
+
+    path = path or PROBCUT_PATH
+    with _lock:
+        if path not in _parameters:
+            by_fingerprint = {}
+            if os.path.exists(path):
+                with open(path) as file:
+                    for entry in json.load(file)['parameters']:
+                        table = by_fingerprint.setdefault(entry['fingerprint'], {})
+                        table[entry['depth'], entry['phase']] = (
+                            entry['shallow'], entry['a'], entry['b'], entry['sigma'])
+            _parameters[path] = by_fingerprint
+        return _parameters[path]
+
+
+def save_parameters(entries, path=None):
+    """
+    Write fitted parameters, replacing the file in one step.
+
+    Args:
+        entries (List[dict]): One entry per evaluator fingerprint, depth pair
+            and phase, with the fitted a, b and sigma.
+    """
+
+    path = path or PROBCUT_PATH
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({'parameters': entries}, file, indent=1)
+    os.replace(temp_path, path)
+
+    with _lock:
+        _parameters.pop(path, None)
+
+
+def cut_parameters(fingerprint, depth, discs, path=None):
+    """
+    Get the parameters for cutting a search to a depth.
+
+    Returns:
+        Tuple[int, float, float, float] or None: The shallow search depth and
+            a, b and sigma, or None if none were fitted.
+    """
+
+    table = load_parameters(path).get(fingerprint)
+    if table is None:
+        return None
+    return table.get((depth, game_phase(discs)))
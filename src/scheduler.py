@@ -0,0 +1,153 @@
+import os
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+from .search_stats import current_stats, use_stats
+
+# Searches written as generators yield between units of work, e.g. before
+# each node, so a scheduler can pause them and run other searches in between.
+
+
+def run_steps(steps):
+    """
+    Run a generator-based task to completion.
+
+    Returns:
+        The value returned by the generator.
+    """
+
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+class _Task:
+    def __init__(self, steps, weight, stats):
+        self.steps = steps
+        self.weight = weight
+        self.stats = stats
+        self.future = Future()
+        self.runtime = 0.0
+
+
+class SearchScheduler:
+    """
+    Interleaves many generator-based searches on a fixed set of worker
+    threads. Each turn a task runs a slice of steps, and the task that has had
+    the least runtime so far, scaled by its weight, runs next. A cheap search
+    therefore finishes after a few slices, even while expensive searches are
+    running.
+    """
+
+    def __init__(self, n_workers=1, slice_steps=32):
+        """
+        Args:
+            n_workers (int, optional): Number of worker threads.
+            slice_steps (int, optional): Steps a task runs per turn.
+        """
+
+        self.n_workers = n_workers
+        self.slice_steps = slice_steps
+
+        self.condition = threading.Condition()
+        # Heap of (runtime, sequence number, task)
+        self.queue = []
+        self.counter = itertools.count()
+        # Runtime of the task most recently started, where new tasks start
+        self.min_runtime = 0.0
+        self.closed = False
+
+        self.pid = None
+        self.workers = []
+
+
+    def _start_workers(self):
+        # Threads don't survive a fork, so each process starts its own
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.workers = [threading.Thread(target=self._work, daemon=True)
+                        for _ in range(self.n_workers)]
+        for worker in self.workers:
+            worker.start()
+
+
+    def _push(self, task):
+        heapq.heappush(self.queue, (task.runtime, next(self.counter), task))
+        self.condition.notify()
+
+
+    def submit(self, steps, weight=1.0):
+        """
+        Schedule a generator-based task. Search stats being collected by the
+        calling thread are collected for the task too.
+
+        Args:
+            steps (Generator): The task.
+            weight (float, optional): Share of the workers' time relative to
+                other tasks; higher runs sooner.
+
+        Returns:
+            Future: The task's return value.
+        """
+
+        task = _Task(steps, weight, current_stats())
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Scheduler has been shut down.")
+            self._start_workers()
+            task.runtime = self.min_runtime
+            self._push(task)
+
+        return task.future
+
+
+    def run(self, steps, weight=1.0):
+        """
+        Schedule a task and wait for its result.
+        """
+
+        return self.submit(steps, weight).result()
+
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                runtime, _, task = heapq.heappop(self.queue)
+                self.min_runtime = max(self.min_runtime, runtime)
+
+            try:
+                with use_stats(task.stats):
+                    for _ in range(self.slice_steps):
+                        next(task.steps)
+            except StopIteration as stop:
+                task.future.set_result(stop.value)
+            except BaseException as error:
+                task.future.set_exception(error)
+            else:
+                with self.condition:
+                    task.runtime += self.slice_steps / task.weight
+                    self._push(task)
+
+
+    def shutdown(self):
+        """
+        Stop the workers once all scheduled tasks have finished.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,50 @@
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class SearchStats:
+    """
+    Counters describing the work done by searches run while collecting.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.nodes = 0
+        self.evaluations = 0
+        self.evaluation_seconds = 0.0
+        self.depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def current_stats():
+    """
+    Get the stats being collected in this thread, or None if not collecting.
+    """
+
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def use_stats(stats):
+    """
+    Collect stats of all searches run in this thread within the block into 
+    the given stats, or into none if None.
+    """
+
+    previous = current_stats()
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def collect_stats():
+    """
+    Collect stats of all searches run in this thread within the block.
+    """
+
+    return use_stats(SearchStats())
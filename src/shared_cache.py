@@ -0,0 +1,207 @@
+import os
+import mmap
+import fcntl
+import zlib
+import struct
+import atexit
+from .bitboard import (
+    canonical, position_hash, transform_square, inverse_transform_square
+)
+
+# File header; magic bytes, format version and number of slots
+HEADER = struct.Struct('<8sII')
+MAGIC = b'OTHCACHE'
+VERSION = 1
+
+# Slot layout; key hash, canonical black and white bitboards, score, depth,
+# best move square (NO_MOVE if none), side to move, and a CRC32 checksum of
+# all preceding fields
+ENTRY = struct.Struct('<QQQdBBBxI')
+PAYLOAD_SIZE = ENTRY.size - 4
+NO_MOVE = 64
+
+# Slots per bucket; a position may be stored in either slot of its bucket
+WAYS = 2
+
+
+def entry_key(black, white, black_to_move, depth, fingerprint):
+    """
+    Hash a canonical position together with the search settings it was
+    searched with, so that only results of identical searches are shared.
+    """
+
+    settings = zlib.crc32(struct.pack('<IB', fingerprint, depth))
+    return position_hash(black, white, black_to_move) ^ (settings << 32)
+
+
+class SharedEvalCache:
+    """
+    A fixed-size table of search results in a memory-mapped file. Every
+    process opening the same file shares the table, and it survives restarts.
+
+    Slots are written without locks; each carries a checksum, and torn or
+    half-written slots are simply treated as empty by readers.
+    """
+
+    def __init__(self, path, n_slots=1 << 20, flush_interval=256):
+        """
+        Opens the cache file, creating it if it doesn't exist.
+
+        Args:
+            path (str): Path of the cache file.
+            n_slots (int, optional): Number of slots when creating the file.
+            flush_interval (int, optional): Stores between flushes to disk.
+        """
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.stores_since_flush = 0
+
+        n_slots -= n_slots % WAYS
+        size = HEADER.size + n_slots * ENTRY.size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Only one process may initialise a new file
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, n_slots), 0)
+
+            magic, version, n_slots = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not an evaluation cache file.")
+
+            self.mmap = mmap.mmap(fd, HEADER.size + n_slots * ENTRY.size)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+        self.n_slots = n_slots
+        self.n_buckets = n_slots // WAYS
+
+        atexit.register(self.flush)
+
+
+    def _offset(self, slot):
+        return HEADER.size + slot * ENTRY.size
+
+
+    def _read(self, slot):
+        """
+        Read a slot, returning None if it is empty or fails its checksum.
+        """
+
+        offset = self._offset(slot)
+        raw = self.mmap[offset:offset + ENTRY.size]
+        entry = ENTRY.unpack(raw)
+
+        if entry[0] == 0 or zlib.crc32(raw[:PAYLOAD_SIZE]) != entry[-1]:
+            return None
+        return entry
+
+
+    def _write(self, slot, *fields):
+        payload = ENTRY.pack(*fields, 0)[:PAYLOAD_SIZE]
+        offset = self._offset(slot)
+        self.mmap[offset:offset + ENTRY.size] = (
+            payload + struct.pack('<I', zlib.crc32(payload))
+        )
+
+
+    def _slots(self, key):
+        first = (key % self.n_buckets) * WAYS
+        return range(first, first + WAYS)
+
+
+    def lookup(self, black, white, black_to_move, depth, fingerprint):
+        """
+        Look up the result of a search.
+
+        Returns:
+            Tuple[Tuple[int, int], float] or None: The best move (None if the
+                side to move had to pass) and its score, or None on a miss.
+        """
+
+        black, white, symmetry = canonical(black, white)
+        key = entry_key(black, white, black_to_move, depth, fingerprint)
+
+        for slot in self._slots(key):
+            entry = self._read(slot)
+            if entry is None or entry[:3] != (key, black, white):
+                continue
+
+            _, _, _, score, _, move, _ = entry[:7]
+            if move == NO_MOVE:
+                return None, score
+            return inverse_transform_square(*divmod(move, 8), symmetry), score
+
+        return None
+
+
+    def store(self, black, white, black_to_move, depth, fingerprint, move,
+              score):
+        """
+        Publish the result of a search. An existing entry for the position is
+        overwritten, then an empty slot is used, and otherwise the shallower
+        of the bucket's entries is replaced.
+        """
+
+        black, white, symmetry = canonical(black, white)
+        key = entry_key(black, white, black_to_move, depth, fingerprint)
+
+        if move is None:
+            square = NO_MOVE
+        else:
+            row, col = transform_square(*move, symmetry)
+            square = row * 8 + col
+
+        entries = [(slot, self._read(slot)) for slot in self._slots(key)]
+        victim = next((slot for slot, entry in entries
+                       if entry is not None and entry[0] == key), None)
+        if victim is None:
+            victim = next((slot for slot, entry in entries if entry is None),
+                          None)
+        if victim is None:
+            victim = min(entries, key=lambda item: item[1][4])[0]
+
+        self._write(victim, key, black, white, float(score), depth, square,
+                    int(black_to_move))
+
+        self.stores_since_flush += 1
+        if self.stores_since_flush >= self.flush_interval:
+            self.flush()
+
+
+    def flush(self):
+        if not self.mmap.closed:
+            self.mmap.flush()
+        self.stores_since_flush = 0
+
+
+    def close(self):
+        self.flush()
+        self.mmap.close()
+
+
+_shared_cache = None
+
+
+def get_shared_cache():
+    """
+    Get this process's handle on the shared evaluation cache, opened from the
+    path in the OTHELLO_EVAL_CACHE environment variable.
+
+    Returns:
+        SharedEvalCache or None: The cache, or None if it isn't configured.
+    """
+
+    global _shared_cache
+
+    if _shared_cache is None:
+        path = os.environ.get('OTHELLO_EVAL_CACHE')
+        if path:
+            n_slots = int(os.environ.get('OTHELLO_EVAL_CACHE_SLOTS', 1 << 20))
+            _shared_cache = SharedEvalCache(path, n_slots)
+
+    return _shared_cache
@@ -0,0 +1,112 @@
+import threading
+
+from .bitboard import canonical, transform_square, inverse_transform_square
+
+# Concurrent requests for the same search, e.g. users playing the same opening
+# line or a double-clicked move, wait on one search in flight and share its
+# result rather than each searching. Searches are keyed by the canonical form
+# of their position, so the 8 symmetric variants of a position share a search,
+# and moves are exchanged in the canonical orientation.
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs one call at a time per key, the callers arriving while it runs
+    waiting for it and sharing its result, or its exception.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+
+    def do(self, key, function):
+        """
+        Call a function, unless a call with the same key is in flight, in
+        which case wait for that call instead.
+
+        Args:
+            key (Hashable): Identifies calls giving the same result.
+            function (Callable[[], object]): Makes the call.
+
+        Returns:
+            Tuple[object, bool]: The call's result, and whether it was shared
+                with a call already in flight.
+        """
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+def search_key(black, white, black_to_move, settings):
+    """
+    Key the search of a position with the given settings, the same for all
+    symmetric variants of the position.
+
+    Args:
+        black (int): Black's bitboard.
+        white (int): White's bitboard.
+        black_to_move (bool): Whether Black is to move.
+        settings (tuple): Everything else the search's result depends on,
+            e.g. its depth and evaluator.
+
+    Returns:
+        Tuple[tuple, int]: The key, and the symmetry mapping the position
+            onto its canonical form.
+    """
+
+    black, white, symmetry = canonical(black, white)
+    return (black, white, black_to_move) + tuple(settings), symmetry
+
+
+def to_canonical(move, symmetry):
+    """
+    Map a move, or None, of a position onto its canonical form.
+    """
+
+    return None if move is None else transform_square(*move, symmetry)
+
+
+def from_canonical(move, symmetry):
+    """
+    Map a move, or None, of a canonical position back onto the position.
+    """
+
+    return None if move is None else inverse_transform_square(*move, symmetry)
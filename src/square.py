@@ -0,0 +1,33 @@
+from enum import IntEnum
+
+class SquareType(IntEnum):
+    """
+    State of a square. Boards store squares as these values in an int8 array.
+    """
+
+    EMPTY = 0
+    BLACK = 1
+    WHITE = 2
+    VALID = 3
+
+    @property
+    def symbol(self):
+        return SYMBOLS[self]
+
+
+    @classmethod
+    def _missing_(cls, value):
+        # Squares pickled before they were integers were pickled as symbols
+        for square, symbol in SYMBOLS.items():
+            if symbol == value:
+                return square
+        return None
+
+
+# Character displaying each square
+SYMBOLS = {
+    SquareType.EMPTY: ' ',
+    SquareType.BLACK: 'X',
+    SquareType.WHITE: 'O',
+    SquareType.VALID: '#'
+}
@@ -0,0 +1,184 @@
+from .bitboard import FULL, NOT_A_FILE, NOT_H_FILE, shift
+from .tables import register_table, get_table
+
+# Stable discs can never be flipped for the rest of the game. Discs on an edge
+# are looked up in a table of all 3^8 edge configurations, and stability then
+# spreads inward to discs whose every line is full or ends in a stable disc.
+
+# Edge squares are numbered 0 to 7 along the edge; each is empty (0), black
+# (1) or white (2), and a configuration's index is sum(digit * 3 ** square).
+EMPTY, BLACK, WHITE = 0, 1, 2
+
+# Bit index of each square of the four edges, in edge order
+EDGES = [
+    [col for col in range(8)],                      # Row 1
+    [56 + col for col in range(8)],                 # Row 8
+    [row * 8 for row in range(8)],                  # Column A
+    [row * 8 + 7 for row in range(8)],              # Column H
+]
+
+# The four line directions; horizontal, vertical and both diagonals. Each is
+# the shift and wrap-around mask to the neighbours on either side, and the
+# squares where the line meets the edge of the board.
+LINE_DIRECTIONS = [
+    ((1, NOT_A_FILE), (-1, NOT_H_FILE), 0x8181818181818181),
+    ((8, FULL), (-8, FULL), 0xFF000000000000FF),
+    ((9, NOT_A_FILE), (-9, NOT_H_FILE), 0xFF818181818181FF),
+    ((7, NOT_H_FILE), (-7, NOT_A_FILE), 0xFF818181818181FF),
+]
+
+
+def _line_masks(step_row, step_col):
+    """
+    Masks of every line of squares running in one direction.
+    """
+
+    masks = []
+    for row in range(8):
+        for col in range(8):
+            # Only start lines at squares with no predecessor on the board
+            if 0 <= row - step_row < 8 and 0 <= col - step_col < 8:
+                continue
+            mask = 0
+            r, c = row, col
+            while 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r * 8 + c)
+                r += step_row
+                c += step_col
+            masks.append(mask)
+    return masks
+
+
+# Lines of each direction of LINE_DIRECTIONS
+LINES = [_line_masks(0, 1), _line_masks(1, 0), _line_masks(1, 1), _line_masks(1, -1)]
+
+
+def _edge_flips(cells, square, color):
+    """
+    Squares of an edge flipped by placing a disc, counting flips along the
+    edge only.
+    """
+
+    opponent = BLACK + WHITE - color
+    flipped = []
+    for step in (1, -1):
+        run = []
+        index = square + step
+        while 0 <= index < 8 and cells[index] == opponent:
+            run.append(index)
+            index += step
+        if 0 <= index < 8 and cells[index] == color:
+            flipped.extend(run)
+    return flipped
+
+
+@register_table('edge_stability', 'B')
+def build_edge_stability():
+    """
+    Find the stable discs of every edge configuration, as an 8-bit mask of
+    edge squares. A disc is stable if no sequence of discs placed on the edge,
+    of either color and in any order, can flip it.
+
+    Returns:
+        List[int]: The mask of each configuration, by configuration index.
+    """
+
+    stable = [0] * 3 ** 8
+
+    # Fill configurations in order of decreasing disc count, so the stability
+    # of every configuration a move leads to is already known
+    configurations = sorted(range(3 ** 8), key=lambda index: -_disc_count(index))
+    for index in configurations:
+        cells = [index // 3 ** square % 3 for square in range(8)]
+        mask = sum(1 << square for square in range(8) if cells[square])
+
+        for square in range(8):
+            if cells[square]:
+                continue
+            for color in (BLACK, WHITE):
+                flipped = _edge_flips(cells, square, color)
+                after = index + color * 3 ** square
+                for flip in flipped:
+                    after += (BLACK + WHITE - 2 * cells[flip]) * 3 ** flip
+                mask &= stable[after] & ~sum(1 << flip for flip in flipped)
+
+        stable[index] = mask
+
+    return stable
+
+
+def _disc_count(index):
+    count = 0
+    while index:
+        count += index % 3 != 0
+        index //= 3
+    return count
+
+
+def edge_stable_discs(black, white):
+    """
+    Find discs made stable by their edges alone.
+
+    Returns:
+        int: A bitboard of the stable discs of both colors.
+    """
+
+    table = get_table('edge_stability')
+    stable = 0
+
+    for edge in EDGES:
+        index = 0
+        for square, bit in enumerate(edge):
+            if black >> bit & 1:
+                index += BLACK * 3 ** square
+            elif white >> bit & 1:
+                index += WHITE * 3 ** square
+
+        mask = table[index]
+        for square, bit in enumerate(edge):
+            if mask >> square & 1:
+                stable |= 1 << bit
+
+    return stable
+
+
+def full_lines(occupied):
+    """
+    Find squares whose line is full, for each line direction.
+
+    Returns:
+        List[int]: A bitboard per direction of LINE_DIRECTIONS.
+    """
+
+    return [sum(mask for mask in lines if occupied & mask == mask)
+            for lines in LINES]
+
+
+def stable_discs(black, white):
+    """
+    Find the stable discs of both colors. Starting from the edges, a disc is
+    stable if along each of its four lines the line is full, the disc ends
+    the line, or it borders a stable disc of its own color. This can miss some
+    stable discs, but never counts an unstable one.
+
+    Returns:
+        Tuple[int, int]: Bitboards of Black's and White's stable discs.
+    """
+
+    edge_stable = edge_stable_discs(black, white)
+    full = full_lines(black | white)
+
+    result = []
+    for own in (black, white):
+        stable = own & edge_stable
+        while True:
+            candidates = own & ~stable
+            for (forward, backward, ends), full_line in zip(LINE_DIRECTIONS, full):
+                candidates &= (full_line | ends |
+                               shift(stable, *forward) | shift(stable, *backward))
+            if not candidates:
+                break
+            stable |= candidates
+        result.append(stable)
+
+    return result[0], result[1]
@@ -1,12 +1,297 @@
 
-import numpy as np
+import os
+import math
+import zlib
 from enum import Enum, auto
-from .board import SquareType
+from functools import lru_cache
+from .square import SquareType
+from .bitboard import (
+    FULL, CORNERS, DIRECTIONS, from_board, legal_moves, popcount, shift
+)
+from .stability import stable_discs
 
 class HeuristicType(Enum):
     DISC_DIFF = auto()
     MOBILITY = auto()
     CORNERS = auto()
+    STABILITY = auto()
+    FRONTIER = auto()
+
+
+# Default weights, if not provided
+DEFAULT_WEIGHTS = {
+    HeuristicType.DISC_DIFF: 0.5,
+    HeuristicType.MOBILITY: 0.5,
+    HeuristicType.CORNERS: 0
+}
+
+# OthelloAI evaluation function weights
+AI_WEIGHTS = {
+    HeuristicType.DISC_DIFF: 25/60,
+    HeuristicType.MOBILITY: 5/60,
+    HeuristicType.CORNERS: 30/60
+}
+
+
+# Number of recent evaluations cached, per process
+EVAL_CACHE_SIZE = 65536
+
+# Non-zero weights of each evaluator, by fingerprint
+_weight_items = {}
+
+# Features kept up to date move by move during a search, see 
+# IncrementalEvaluation; the others depend on the whole board
+INCREMENTAL_TYPES = (HeuristicType.DISC_DIFF, HeuristicType.CORNERS)
+
+# Check every incremental update against a full recomputation, for debugging
+CHECK_INCREMENTAL = os.environ.get('OTHELLO_CHECK_EVAL') == '1'
+
+
+@lru_cache(maxsize=None)
+def check_weights(weight_items):
+    """
+    Check heuristic weights, given as (HeuristicType, weight) pairs, sum to 1. 
+    Each distinct set of weights is only checked once per process.
+    """
+
+    if not math.isclose(sum(weight for _, weight in weight_items), 1, 
+                        rel_tol=1e-5):
+        raise ValueError("Heuristic weights must sum to 1.")
+
+
+def extract_features(black, white, heuristic_types):
+    """
+    Count the discs, legal moves, corners, frontier discs or stable discs of 
+    both colors, in one pass over the bitboards of a position.
+
+    Args:
+        black (int): Bitboard of Black's discs.
+        white (int): Bitboard of White's discs.
+        heuristic_types (Iterable[HeuristicType]): The features to count.
+
+    Returns:
+        dict: Black's and White's count of each heuristic type's feature.
+    """
+
+    features = {}
+    for heuristic_type in heuristic_types:
+        if heuristic_type == HeuristicType.DISC_DIFF:
+            black_bits, white_bits = black, white
+        elif heuristic_type == HeuristicType.MOBILITY:
+            black_bits, white_bits = legal_moves(black, white), legal_moves(white, black)
+        elif heuristic_type == HeuristicType.CORNERS:
+            black_bits, white_bits = black & CORNERS, white & CORNERS
+        elif heuristic_type == HeuristicType.FRONTIER:
+            # Discs next to an empty square
+            empty = ~(black | white) & FULL
+            next_to_empty = 0
+            for amount, mask in DIRECTIONS:
+                next_to_empty |= shift(empty, amount, mask)
+            black_bits, white_bits = black & next_to_empty, white & next_to_empty
+        elif heuristic_type == HeuristicType.STABILITY:
+            black_bits, white_bits = stable_discs(black, white)
+        else:
+            raise ValueError(f"Can't find {heuristic_type} method.")
+        features[heuristic_type] = popcount(black_bits), popcount(white_bits)
+
+    return features
+
+
+@lru_cache(maxsize=EVAL_CACHE_SIZE)
+def evaluate_position(black, white, fingerprint):
+    """
+    Evaluate a position that isn't terminal with the weights of the evaluator
+    with the given fingerprint. Recent positions are cached, since searches 
+    reach the same position by different move orders.
+
+    Returns:
+        float: The weighted combination of heuristics.
+    """
+
+    weight_items = _weight_items[fingerprint]
+    features = extract_features(black, white, 
+                                [heuristic_type for heuristic_type, _ in weight_items])
+    return combine_features(weight_items, features)
+
+
+def combine_features(weight_items, features):
+    """
+    Combine both colors' feature counts into a position's value.
+
+    Args:
+        weight_items (Tuple[Tuple[HeuristicType, float]]): Each heuristic's
+            weight.
+        features (dict): Black's and White's count of each heuristic's 
+            feature, as extract_features().
+
+    Returns:
+        float: The weighted combination of heuristics.
+    """
+
+    score = 0.0
+    for heuristic_type, weight in weight_items:
+        max_count, min_count = features[heuristic_type]
+
+        # Fewer frontier discs is better
+        if heuristic_type == HeuristicType.FRONTIER:
+            max_count, min_count = min_count, max_count
+
+        # Avoid division by zero
+        if max_count + min_count:
+            score += weight * ((max_count - min_count) / (max_count + min_count))
+
+    return score
+
+
+# Evaluators shared by all players with the same weights
+_shared_evaluators = {}
+
+
+def shared_evaluator(weights=None):
+    """
+    Get the process's evaluator with the given weights, created on first use,
+    so that players and games don't each hold their own.
+
+    Args:
+        weights (dict, optional): Weight of each heuristic, defaults to 
+            DEFAULT_WEIGHTS.
+
+    Returns:
+        StateEvaluator: The shared evaluator.
+    """
+
+    weights = weights if weights else DEFAULT_WEIGHTS
+    key = frozenset(weights.items())
+    state_eval = _shared_evaluators.get(key)
+    if state_eval is None:
+        state_eval = _shared_evaluators.setdefault(key, StateEvaluator(weights))
+    return state_eval
+
+
+class IncrementalEvaluation:
+    """
+    The bitboards of a position being searched, with the counts of the 
+    incremental features kept up to date as moves are made and unmade, so 
+    that each move costs in proportion to the discs it flips. Leaves are 
+    evaluated from the whole board, through the cache of evaluate_position().
+    """
+
+    def __init__(self, fingerprint, black, white, check=None):
+        """
+        Args:
+            fingerprint (int): The evaluator's fingerprint.
+            black (int): Bitboard of Black's discs.
+            white (int): Bitboard of White's discs.
+            check (bool, optional): Compare every update and evaluation with
+                a full recomputation, defaults to CHECK_INCREMENTAL.
+        """
+
+        self.fingerprint = fingerprint
+        self.weight_items = _weight_items[fingerprint]
+        self.other_types = [heuristic_type for heuristic_type, _ in self.weight_items
+                            if heuristic_type not in INCREMENTAL_TYPES]
+        self.check = CHECK_INCREMENTAL if check is None else check
+
+        self.black, self.white = black, white
+        self.discs = popcount(black), popcount(white)
+        self.corners = popcount(black & CORNERS), popcount(white & CORNERS)
+        self.undo = []
+
+
+    def make(self, move, flipped, black_to_move):
+        """
+        Apply a move.
+
+        Args:
+            move (int): Bitboard of the square played.
+            flipped (int): Bitboard of the discs it flips.
+            black_to_move (bool): Whether Black made the move.
+        """
+
+        self.undo.append((self.black, self.white, self.discs, self.corners))
+
+        flip_count = popcount(flipped)
+        corner_gain = popcount((move | flipped) & CORNERS)
+        corner_loss = popcount(flipped & CORNERS)
+        black_discs, white_discs = self.discs
+        black_corners, white_corners = self.corners
+
+        if black_to_move:
+            self.black |= move | flipped
+            self.white &= ~flipped
+            self.discs = black_discs + 1 + flip_count, white_discs - flip_count
+            self.corners = black_corners + corner_gain, white_corners - corner_loss
+        else:
+            self.white |= move | flipped
+            self.black &= ~flipped
+            self.discs = black_discs - flip_count, white_discs + 1 + flip_count
+            self.corners = black_corners - corner_loss, white_corners + corner_gain
+
+        if self.check:
+            self.verify()
+
+
+    def unmake(self):
+        """
+        Take back the last move made.
+        """
+
+        self.black, self.white, self.discs, self.corners = self.undo.pop()
+
+
+    def verify(self, state=None):
+        """
+        Compare the incremental counts with counts of the whole board, and 
+        the bitboards with the board state if given.
+
+        Raises:
+            AssertionError: If they differ.
+        """
+
+        if state is not None and from_board(state) != (self.black, self.white):
+            raise AssertionError("Incremental bitboards differ from the board.")
+
+        features = extract_features(self.black, self.white, INCREMENTAL_TYPES)
+        counts = {HeuristicType.DISC_DIFF: self.discs,
+                  HeuristicType.CORNERS: self.corners}
+        if features != counts:
+            raise AssertionError(
+                f"Incremental features {counts} differ from {features}.")
+
+
+    def evaluate(self, finished=False):
+        """
+        Evaluate the current position, like StateEvaluator.evaluate().
+        Positions that aren't terminal go through the cache of 
+        evaluate_position(), as the search reaches many of them more than
+        once; the incremental counts are only combined into a value when 
+        checking the cached one.
+
+        Args:
+            finished (bool, optional): Whether the game has ended.
+
+        Returns:
+            float: The value of the position.
+        """
+
+        black_discs, white_discs = self.discs
+
+        # If terminal state
+        if finished:
+            return (black_discs > white_discs) - (black_discs < white_discs)
+
+        score = evaluate_position(self.black, self.white, self.fingerprint)
+
+        if self.check:
+            features = extract_features(self.black, self.white, self.other_types)
+            features[HeuristicType.DISC_DIFF] = self.discs
+            features[HeuristicType.CORNERS] = self.corners
+            expected = combine_features(self.weight_items, features)
+            if score != expected:
+                raise AssertionError(
+                    f"Incremental evaluation {expected} differs from {score}.")
+
+        return score
 
 
 class StateEvaluator:
@@ -14,29 +299,58 @@ class StateEvaluator:
     State evaluation using a weighted combination of heuristic components.
     """
 
+    __slots__ = ('weights', 'key')
+
     def __init__(self, weights=None):
         """
         Initialises the evaluator with specified heuristic weights.
         """
 
-        self.heuristic_methods = {
-            HeuristicType.DISC_DIFF: self.disc_diff_heuristic,
-            HeuristicType.MOBILITY: self.mobility_heuristic,
-            HeuristicType.CORNERS: self.corner_heuristic,
-        }
+        self.weights = weights if weights else DEFAULT_WEIGHTS
+
+        # Check if weights sum to 1
+        check_weights(tuple(self.weights.items()))
 
-        # Default weights, if not provided
-        default_weights = {
-            HeuristicType.DISC_DIFF: 0.5,
-            HeuristicType.MOBILITY: 0.5,
-            HeuristicType.CORNERS: 0
-        }
+        self.register()
 
-        self.weights = weights if weights else default_weights
 
-        # Check if weights sum to 1
-        if not np.isclose(sum(self.weights.values()), 1):
-            raise ValueError("Heuristic weights must sum to 1.")
+    def register(self):
+        # Heuristics with no weight are skipped
+        self.key = self.fingerprint()
+        _weight_items[self.key] = tuple(
+            (heuristic_type, weight) 
+            for heuristic_type, weight in self.weights.items() if weight)
+
+
+    def __deepcopy__(self, memo):
+        # Evaluators never change, so copies of a game can share one
+        return self
+
+
+    def __reduce__(self):
+        # Unpickled games share the process's evaluator with these weights
+        return shared_evaluator, (self.weights,)
+
+
+    def __setstate__(self, state):
+        # Evaluators pickled before they were shared
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        self.weights = state['weights']
+        self.register()
+
+
+    def fingerprint(self):
+        """
+        Identify the evaluator by its weights, consistently across processes.
+
+        Returns:
+            int: A 32-bit checksum of the heuristic weights.
+        """
+
+        weights = sorted((heuristic_type.name, weight)
+                         for heuristic_type, weight in self.weights.items())
+        return zlib.crc32(repr(weights).encode())
         
         
     def evaluate(self, game):
@@ -44,32 +358,33 @@ class StateEvaluator:
         Evaluate a game state using a weighted combination of heuristics.
  
         If the game has ended, assign +1 for Black win, and and -1 for White 
-        win. Otherwise, evaluate using weighted heuristic components.
+        win. Otherwise, evaluate using weighted heuristic components, all 
+        computed together from the position's bitboards.
 
         Returns:
             float: The value of the game state or terminal state.
         """
 
+        black, white = from_board(game.board.state)
+
         # If terminal state
         if game.is_finished:
-            game.determine_winner()
-            if game.game_result == "Black Wins":
-                return 1
-            elif game.game_result == "Draw":
-                return 0
-            elif game.game_result == "White Wins":
-                return -1
+            black_discs, white_discs = popcount(black), popcount(white)
+            return (black_discs > white_discs) - (black_discs < white_discs)
 
         # If not terminal state
-        score = 0.0
-        for heuristic_type, weight in self.weights.items():
-            method = self.heuristic_methods.get(heuristic_type)
-            if method is not None:
-                score += weight * method(game)
-            else:
-                raise ValueError(f"Can't find {heuristic_type} method.")
-            
-        return score
+        return evaluate_position(black, white, self.key)
+
+
+    def start(self, black, white, check=None):
+        """
+        Start evaluating a search from a position incrementally.
+
+        Returns:
+            IncrementalEvaluation: The position, updated as moves are made.
+        """
+
+        return IncrementalEvaluation(self.key, black, white, check)
 
         
     def count_valid_moves(self, game, disc_color):
@@ -120,7 +435,7 @@ class StateEvaluator:
         CORNERS = [(0, 0), (0, 7), (7, 0), (7, 7)]
         count = 0
         for row, col in CORNERS:
-            if game.board.state[row, col] == disc_color:
+            if game.board.state.item(row, col) == disc_color:
                 count += 1
 
         return count
@@ -138,4 +453,47 @@ class StateEvaluator:
         if max_corners + min_corners == 0:
             return 0
 
-        return (max_corners - min_corners) / (max_corners + min_corners)
\ No newline at end of file
+        return (max_corners - min_corners) / (max_corners + min_corners)
+
+
+    def stability_heuristic(self, game):
+        """
+        Compute the stable disc heuristic for the current state of the game.
+        """
+
+        black_stable, white_stable = stable_discs(*from_board(game.board.state))
+        max_stable = popcount(black_stable)
+        min_stable = popcount(white_stable)
+
+        # Avoid division by zero
+        if max_stable + min_stable == 0:
+            return 0
+
+        return (max_stable - min_stable) / (max_stable + min_stable)
+
+
+    def frontier_heuristic(self, game):
+        """
+        Compute the frontier heuristic, favouring the color with fewer discs
+        next to empty squares, for the current state of the game.
+        """
+
+        features = extract_features(*from_board(game.board.state), 
+                                    [HeuristicType.FRONTIER])
+        max_frontier, min_frontier = features[HeuristicType.FRONTIER]
+
+        # Avoid division by zero
+        if max_frontier + min_frontier == 0:
+            return 0
+
+        return (min_frontier - max_frontier) / (max_frontier + min_frontier)
+
+
+    # Heuristic method for each heuristic type, shared by all instances
+    heuristic_methods = {
+        HeuristicType.DISC_DIFF: disc_diff_heuristic,
+        HeuristicType.MOBILITY: mobility_heuristic,
+        HeuristicType.CORNERS: corner_heuristic,
+        HeuristicType.STABILITY: stability_heuristic,
+        HeuristicType.FRONTIER: frontier_heuristic,
+    }
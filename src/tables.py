@@ -0,0 +1,85 @@
+import os
+import mmap
+import tempfile
+from array import array
+
+# Precomputed lookup tables are stored as raw arrays in this directory, so
+# each process memory-maps them instead of rebuilding them
+TABLES_DIR = os.environ.get(
+    'OTHELLO_TABLES_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data', 'tables')
+)
+
+# Table name -> (array typecode, version, builder function)
+_builders = {}
+
+# Table name -> memory-mapped view, for tables loaded by this process
+_loaded = {}
+
+
+def register_table(name, typecode, version=1):
+    """
+    Register a function building a lookup table. The function returns an
+    iterable of values, stored as an array of the given typecode. Bump the
+    version whenever the builder's output changes.
+    """
+
+    def decorator(builder):
+        _builders[name] = (typecode, version, builder)
+        return builder
+
+    return decorator
+
+
+def table_path(name):
+    typecode, version, _ = _builders[name]
+    return os.path.join(TABLES_DIR, f"{name}-v{version}.{typecode}.bin")
+
+
+def build_table(name):
+    """
+    Build a table and write it to the tables directory. The file is written
+    under a temporary name and renamed, so concurrent builders are safe.
+
+    Returns:
+        str: The path of the table file.
+    """
+
+    typecode, _, builder = _builders[name]
+    path = table_path(name)
+    values = array(typecode, builder())
+
+    os.makedirs(TABLES_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=TABLES_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        values.tofile(file)
+    os.replace(temp_path, path)
+
+    return path
+
+
+def get_table(name):
+    """
+    Get a lookup table, memory-mapping its file on first use in this process
+    and building the file first if it doesn't exist yet.
+
+    Returns:
+        memoryview: The table's values, indexable like a list.
+    """
+
+    if name not in _loaded:
+        typecode = _builders[name][0]
+        path = table_path(name)
+        if not os.path.exists(path):
+            build_table(name)
+
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _loaded[name] = memoryview(mapped).cast(typecode)
+
+    return _loaded[name]
+
+
+def registered_tables():
+    return sorted(_builders)
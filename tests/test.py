@@ -8,11 +8,48 @@ project_root = os.path.dirname(current_dir)
 sys.path.append(os.path.join(project_root, 'src'))
 
 import unittest
+import time
+import copy
+import random
+import pickle
+import pstats
+import socket
+import tempfile
+import signal
+import subprocess
+import threading
+import multiprocessing
+from unittest import mock
 import numpy as np
 from src.game import Game
 from src.board import Board, SquareType
-from src.player import Player, PlayerType
-from src.state_evaluation import StateEvaluator, HeuristicType
+from src.player import Player, PlayerType, DIFFICULTY_LEVELS
+from src.state_evaluation import StateEvaluator, HeuristicType, AI_WEIGHTS
+from src import state_evaluation
+from src import bitboard
+from src.batch import BatchGame
+from src import position
+from src.analysis import PositionAnalyser
+from src.shared_cache import SharedEvalCache, ENTRY, HEADER
+from src import lazy_smp
+from src.lazy_smp import LazySMP, SharedTranspositions
+from src import tables
+from src import assets
+from src.assets import AssetStore, publish_version
+from src import endgame
+from src import stability
+from src import probcut
+from src.bloom import BloomFilter
+from src.position_db import PositionDatabase, replay_hashes
+from src.single_flight import SingleFlight, search_key, to_canonical, from_canonical
+from src.scheduler import SearchScheduler, run_steps
+from src.search_stats import collect_stats
+from website import create_app, views, metrics, admission
+from src.engine_service import (
+    EngineServer, EngineClient, EngineUnavailable, get_evaluator, encode_request,
+    search_request, OK
+)
+from website.engines import EngineRegistry, SessionEngine
 
 class TestGame(unittest.TestCase):
     """
@@ -226,6 +263,37 @@ class TestPlayer(unittest.TestCase):
 
 
 
+class TestNodeBudget(unittest.TestCase):
+    """
+    Test searches limited by a node budget.
+    """
+
+    def setUp(self):
+        self.game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                         Player(PlayerType.USER, SquareType.WHITE))
+        self.game.next_move = (2, 3)
+        self.game.make_move()
+        self.game.change_turn()
+
+
+    def test_budget_bounds_nodes(self):
+        player = Player(PlayerType.MINIMAX, SquareType.WHITE, depth=3, 
+                        node_budget=30)
+        with collect_stats() as stats:
+            move = player.get_minimax_move(self.game)
+
+        self.assertIn(move, self.game.get_valid_moves_by_color(SquareType.WHITE))
+        self.assertLessEqual(stats.nodes, 31)
+
+
+    def test_ample_budget_matches_fixed_depth(self):
+        budget_player = Player(PlayerType.MINIMAX, SquareType.WHITE, depth=2, 
+                               node_budget=10000)
+        depth_player = Player(PlayerType.MINIMAX, SquareType.WHITE, depth=2)
+        self.assertEqual(budget_player.get_minimax_move(self.game),
+                         depth_player.get_minimax_move(self.game))
+
+
 class TestStateEvaluator(unittest.TestCase):
     """
     Test functionality for the StateEvaluator class.
@@ -256,6 +324,11 @@ class TestStateEvaluator(unittest.TestCase):
         self.assertEqual(white_valid_moves_count, EXPECTED_WHITE_VALID_MOVES_COUNT)
 
 
+    def test_invalid_weights(self):
+        with self.assertRaises(ValueError):
+            StateEvaluator(weights={HeuristicType.DISC_DIFF: 0.5})
+
+
 
 
 class TestHeuristics(unittest.TestCase):
@@ -385,10 +458,233 @@ class TestHeuristics(unittest.TestCase):
         # Assert evaluation function returns +1 for a Black win
         self.assertEqual(evaluation_score, 1, 
                          "Evaluate function should return +1 for a Black win.")
+        self.assertEqual(self.game.game_result, "Black Wins")
+
+
+    def test_evaluate_leaves_game_unchanged(self):
+        self.game.board.state.fill(SquareType.WHITE)
+        self.game.update_scores()
+        self.game.is_finished = True
+
+        self.assertEqual(self.evaluator.evaluate(self.game), -1)
+        self.assertIsNone(self.game.game_result)
+
+
+    def test_frontier_heuristic(self):
+        # Every disc borders an empty square, Black has four and White one
+        self.assertEqual(self.evaluator.frontier_heuristic(self.game), -3/5)
+
+
+    def test_features_match_heuristics(self):
+        weights = {
+            HeuristicType.DISC_DIFF: 0.4,
+            HeuristicType.MOBILITY: 0.3,
+            HeuristicType.CORNERS: 0.2,
+            HeuristicType.FRONTIER: 0.1,
+        }
+        evaluator = StateEvaluator(weights=weights)
+        random.seed(3)
+
+        game = self.game
+        game.board.state = Board().state
+        game.update_scores()
+        game.update_valid_moves()
+        for _ in range(40):
+            moves = game.get_valid_moves()
+            if not moves:
+                break
+            game = game.simulate_move(random.choice(moves))
+
+            expected = sum(weight * evaluator.heuristic_methods[heuristic_type](evaluator, game)
+                           for heuristic_type, weight in weights.items())
+            self.assertAlmostEqual(evaluator.evaluate(game), expected)
+
+        self.assertIs(copy.deepcopy(game).active.state_eval, game.active.state_eval)
         
 
 
 
+class TestIncrementalEvaluation(unittest.TestCase):
+    """
+    Test evaluation features updated move by move.
+    """
+
+    def setUp(self):
+        self.evaluator = StateEvaluator({HeuristicType.DISC_DIFF: 0.4,
+                                         HeuristicType.CORNERS: 0.3,
+                                         HeuristicType.MOBILITY: 0.3})
+
+
+    def test_make_and_unmake(self):
+        rng = random.Random(3)
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        evaluation = self.evaluator.start(*bitboard.from_board(game.board.state),
+                                          check=True)
+        positions = []
+
+        while not game.is_finished:
+            moves = game.get_valid_moves()
+            if not moves:
+                game.change_turn()
+                continue
+            move = rng.choice(moves)
+            black, white = evaluation.black, evaluation.white
+            positions.append((black, white))
+
+            black_to_move = game.active.disc_color == SquareType.BLACK
+            own, opp = (black, white) if black_to_move else (white, black)
+            bit = bitboard.square_bit(*move)
+            evaluation.make(bit, bitboard.flips(own, opp, bit), black_to_move)
+            game = game.simulate_move(move)
+            game.check_finished()
+
+            evaluation.verify(game.board.state)
+            self.assertEqual(evaluation.evaluate(game.is_finished), 
+                             self.evaluator.evaluate(game))
+
+        # Taking every move back restores each earlier position
+        while positions:
+            evaluation.unmake()
+            self.assertEqual((evaluation.black, evaluation.white), positions.pop())
+        self.assertEqual(evaluation.discs, (2, 2))
+
+
+    def test_check_finds_mismatch(self):
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        evaluation = self.evaluator.start(*bitboard.from_board(game.board.state),
+                                          check=True)
+        evaluation.discs = (3, 2)
+
+        bit = bitboard.square_bit(2, 3)
+        with self.assertRaises(AssertionError):
+            evaluation.make(bit, bitboard.flips(evaluation.black, evaluation.white, bit),
+                            True)
+
+
+    def test_search_with_checks(self):
+        player = Player(PlayerType.MINIMAX, SquareType.BLACK, self.evaluator, 3)
+        game = Game(player, Player(PlayerType.USER, SquareType.WHITE))
+        expected = player.minimax_evaluate_moves(game)
+
+        with mock.patch.object(state_evaluation, 'CHECK_INCREMENTAL', True), \
+                mock.patch.object(state_evaluation.IncrementalEvaluation, 'verify',
+                                  autospec=True, 
+                                  side_effect=state_evaluation.IncrementalEvaluation.verify) as verify:
+            self.assertEqual(player.minimax_evaluate_moves(game), expected)
+        self.assertGreater(verify.call_count, 0)
+
+
+    def test_search_without_game_copies(self):
+        player = Player(PlayerType.MINIMAX, SquareType.BLACK, self.evaluator, 3)
+        game = Game(player, Player(PlayerType.USER, SquareType.WHITE))
+        expected = player.minimax_evaluate_moves(game)
+
+        # Below the root, the search only touches bitboards
+        with mock.patch.object(Game, 'copy', side_effect=AssertionError), \
+                mock.patch.object(Game, 'get_valid_moves_by_color',
+                                  side_effect=AssertionError):
+            self.assertEqual(player.minimax_evaluate_moves(game), expected)
+
+
+    def test_evaluate_uses_cache(self):
+        evaluation = self.evaluator.start(0x0000003810000000, 0x0000000008000000)
+        evaluation.evaluate()
+        hits = state_evaluation.evaluate_position.cache_info().hits
+        evaluation.evaluate()
+        self.assertEqual(state_evaluation.evaluate_position.cache_info().hits,
+                         hits + 1)
+
+
+class TestCompactGame(unittest.TestCase):
+    """
+    Test the compact board, and the sharing of players and evaluators 
+    between games.
+    """
+
+    def setUp(self):
+        ai_player = Player(PlayerType.MINIMAX, SquareType.WHITE, 
+                           StateEvaluator(AI_WEIGHTS), depth=3)
+        self.game = Game(Player(PlayerType.USER, SquareType.BLACK), ai_player)
+        self.game = self.game.simulate_move((2, 3))
+
+
+    def test_board_is_int8(self):
+        state = self.game.board.state
+        self.assertEqual(state.dtype, np.int8)
+        self.assertEqual(state[2, 3], SquareType.BLACK)
+        self.assertEqual(self.game.board.squares()[2][3], SquareType.BLACK)
+        self.assertEqual(self.game.board.find(SquareType.VALID), [(2, 2), (2, 4), (4, 2)])
+
+        # Boards set from SquareType members are stored as int8 too
+        self.game.board.state = np.full((8, 8), SquareType.WHITE)
+        self.assertEqual(self.game.board.state.dtype, np.int8)
+
+
+    def test_copy_shares_players(self):
+        copied = self.game.simulate_move((2, 4))
+        self.assertIs(copied.player_white, self.game.player_white)
+        self.assertEqual(self.game.board.state[2, 4], SquareType.VALID)
+
+
+    def test_loaded_games_share_players(self):
+        payload = pickle.dumps(self.game)
+        first, second = pickle.loads(payload), pickle.loads(payload)
+
+        self.assertIs(first.player_white, second.player_white)
+        self.assertIs(first.player_white.state_eval, second.player_white.state_eval)
+        self.assertEqual(first.player_white.depth, 3)
+        self.assertTrue(np.array_equal(first.board.state, self.game.board.state))
+        self.assertIsNot(first.board.state, second.board.state)
+
+        # Changing a setting gives a separate player
+        searcher = first.player_white.replace(depth=1)
+        self.assertEqual((searcher.depth, first.player_white.depth), (1, 3))
+
+
+    def test_old_pickles_load(self):
+        # Games pickled before slots, with boards of SquareType members
+        # pickled by their symbols
+        board = Board.__new__(Board)
+        old_state = np.full((8, 8), SquareType.EMPTY, dtype=object)
+        old_state[3, 3] = SquareType(' ')
+        old_state[4, 4] = SquareType('O')
+        board.__setstate__({'state': old_state})
+        self.assertEqual(board.state.dtype, np.int8)
+        self.assertEqual(board.state[4, 4], SquareType.WHITE)
+
+        game = Game.__new__(Game)
+        game.__setstate__({name: getattr(self.game, name) for name in Game.__slots__})
+        self.assertEqual(game.black_score, 4)
+
+
+    def test_baseline_pickle_plays(self):
+        # A game against OthelloAI pickled by the web app before this series,
+        # after Black played d3 and White c3
+        path = os.path.join(current_dir, 'baseline_game.pickle')
+        with open(path, 'rb') as file:
+            payload = file.read()
+
+        game = pickle.loads(payload)
+        ai_player = game.player_white
+        self.assertEqual((ai_player.depth, ai_player.node_budget, ai_player.time_budget,
+                          ai_player.noise, ai_player.probcut), (3, None, None, 0.0, None))
+        self.assertEqual(ai_player.state_eval.weights, AI_WEIGHTS)
+        self.assertEqual(pickle.loads(pickle.dumps(game)).player_white.search_settings(),
+                         ai_player.search_settings())
+
+        # The web app plays on from the session
+        with mock.patch.object(views, 'AI_DEPTH', 1):
+            client = create_app().test_client()
+            with client.session_transaction() as session:
+                session['game_instance'] = payload
+                session['game_id'] = 'baseline'
+            response = client.post('/turn', json={'row': 2, 'col': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['agent_moved'])
+
+
 class TestSimulateMove(unittest.TestCase):
 
     def setUp(self):
@@ -524,6 +820,1630 @@ class TestMinimax(unittest.TestCase):
         # Assert best move is as expected
         self.assertEqual(best_move_white, EXPECTED_BEST_MOVE,
                         f"The best minimax move for White expected to be {EXPECTED_BEST_MOVE}, but got {best_move_white}.")
+
+
+
+class TestBitboard(unittest.TestCase):
+    """
+    Test the bitboard move generation against the Game class.
+    """
+
+    def setUp(self):
+        black_player = Player(PlayerType.RANDOM, SquareType.BLACK)
+        white_player = Player(PlayerType.RANDOM, SquareType.WHITE)
+        self.game = Game(black_player, white_player)
+
+
+    def test_initial_legal_moves(self):
+        black, white = bitboard.from_board(self.game.board.state)
+        moves = bitboard.legal_moves(black, white)
+        self.assertEqual(list(bitboard.iter_squares(moves)),
+                         [(2, 3), (3, 2), (4, 5), (5, 4)])
+
+
+    def test_flips_match_game(self):
+        black, white = bitboard.from_board(self.game.board.state)
+        flipped = bitboard.flips(black, white, bitboard.square_bit(2, 3))
+        self.assertEqual(list(bitboard.iter_squares(flipped)),
+                         self.game.discs_to_flip(2, 3))
+
+
+    def test_from_board(self):
+        game = self.game.simulate_move((2, 3))
+        state = game.board.state
+        for board in (state, state.astype(np.int64)):
+            black, white = bitboard.from_board(board)
+            self.assertEqual(list(bitboard.iter_squares(black)),
+                             [(2, 3), (3, 3), (3, 4), (4, 3)])
+            self.assertEqual(list(bitboard.iter_squares(white)), [(4, 4)])
+
+
+    def test_search_modules_skip_numpy(self):
+        # Tools and engine processes importing only these start without
+        # NumPy, see benchmark_startup.py
+        script = ("import sys, src.bitboard, src.state_evaluation, src.player, "
+                  "src.shared_cache; print('numpy' in sys.modules)")
+        output = subprocess.run([sys.executable, '-c', script], cwd=project_root,
+                                check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+
+
+
+class TestBatchGame(unittest.TestCase):
+    """
+    Test the lockstep batched game engine.
+    """
+
+    def test_random_playouts_finish(self):
+        batch = BatchGame(200, seed=0)
+        batch.run('random')
+        black, white = batch.scores()
+
+        self.assertTrue(batch.is_finished.all(), "All games should finish.")
+        self.assertTrue(((black + white) <= 64).all())
+        self.assertTrue((batch.legal_moves() == 0).all())
+
+
+    def test_matches_game_engine(self):
+        """
+        Replay a random batched game move by move through the Game class.
+        """
+        batch = BatchGame(1, seed=3)
+        game = Game(Player(PlayerType.RANDOM, SquareType.BLACK),
+                    Player(PlayerType.RANDOM, SquareType.WHITE))
+
+        while not batch.is_finished[0]:
+            legal = batch.legal_moves()
+            self.assertEqual(list(bitboard.iter_squares(int(legal[0]))),
+                             game.get_valid_moves())
+
+            move = batch.sample_random_moves(legal)
+            batch.step(move)
+
+            game.next_move = bitboard.bit_square(int(move[0])) if move[0] else None
+            game.make_move()
+            game.change_turn()
+
+            black, white = bitboard.from_board(game.board.state)
+            self.assertEqual((black, white),
+                             (int(batch.boards[0, 0]), int(batch.boards[0, 1])))
+
+
+    def test_greedy_picks_most_flips(self):
+        batch = BatchGame(1, seed=0)
+
+        # Play a few random plies to get a position with unequal flip counts
+        for _ in range(6):
+            batch.step(batch.sample_random_moves(batch.legal_moves()))
+
+        legal = batch.legal_moves()
+        own, opp = (int(bits[0]) for bits in batch.own_opp())
+        most_flips = max(bitboard.popcount(bitboard.flips(own, opp, 1 << index))
+                         for index in range(64) if int(legal[0]) >> index & 1)
+
+        move = int(batch.sample_greedy_moves(legal)[0])
+        self.assertEqual(bitboard.popcount(bitboard.flips(own, opp, move)),
+                         most_flips)
+
+
+
+class TestStability(unittest.TestCase):
+    """
+    Test the edge-stability table and stable disc counts.
+    """
+
+    def setUp(self):
+        # Build the edge table in a temporary directory
+        self.directory = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(tables, 'TABLES_DIR', self.directory.name),
+            mock.patch.dict(tables._loaded),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.directory.cleanup)
+
+
+    def edge_index(self, edge):
+        digits = {'-': stability.EMPTY, 'X': stability.BLACK, 'O': stability.WHITE}
+        return sum(digits[cell] * 3 ** square for square, cell in enumerate(edge))
+
+
+    def test_edge_table(self):
+        table = stability.build_edge_stability()
+
+        # Only the corner and the disc beside it can't be flanked
+        self.assertEqual(table[self.edge_index('XXO-----')], 0b11)
+        self.assertEqual(table[self.edge_index('-XO-----')], 0)
+        self.assertEqual(table[self.edge_index('XOXOXOXO')], 0xFF)
+        self.assertEqual(table[self.edge_index('X------O')], 0b10000001)
+
+
+    def test_full_board_is_stable(self):
+        black = 0x00000000FFFFFFFF
+        white = bitboard.FULL & ~black
+        self.assertEqual(stability.stable_discs(black, white), (black, white))
+
+
+    def test_single_corner(self):
+        corner = bitboard.square_bit(0, 0)
+        self.assertEqual(stability.stable_discs(corner, 0), (corner, 0))
+
+
+    def test_inner_disc_needs_every_line_protected(self):
+        a1, b1, a2, b2 = [bitboard.square_bit(row, col)
+                          for row, col in ((0, 0), (0, 1), (1, 0), (1, 1))]
+        white = bitboard.square_bit(3, 3)
+
+        # B2 could still be flanked along A3-C1 while both are empty
+        black_stable, _ = stability.stable_discs(a1 | b1 | a2 | b2, white)
+        self.assertEqual(black_stable, a1 | b1 | a2)
+
+        a3, c1 = bitboard.square_bit(2, 0), bitboard.square_bit(0, 2)
+        black_stable, _ = stability.stable_discs(a1 | b1 | a2 | b2 | a3 | c1, white)
+        self.assertTrue(black_stable & b2)
+
+
+    def test_stability_heuristic(self):
+        evaluator = StateEvaluator(weights={HeuristicType.STABILITY: 1})
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+
+        # No stable discs in the opening position
+        self.assertEqual(evaluator.evaluate(game), 0)
+
+        game.board.state[0, 0] = SquareType.BLACK
+        game.board.state[0, 1] = SquareType.BLACK
+        game.board.state[7, 7] = SquareType.WHITE
+        game.update_scores()
+        self.assertAlmostEqual(evaluator.evaluate(game), 1/3)
+
+
+
+class TestPosition(unittest.TestCase):
+    """
+    Test position encoding, hashing and symmetries.
+    """
+
+    def setUp(self):
+        black_player = Player(PlayerType.USER, SquareType.BLACK)
+        white_player = Player(PlayerType.USER, SquareType.WHITE)
+        self.game = Game(black_player, white_player).simulate_move((2, 3))
+
+
+    def test_symmetries_match_squares(self):
+        for symmetry in range(8):
+            for row in range(8):
+                for col in range(8):
+                    moved = bitboard.transform_square(row, col, symmetry)
+                    self.assertEqual(
+                        bitboard.transform_bits(bitboard.square_bit(row, col), symmetry),
+                        bitboard.square_bit(*moved))
+                    self.assertEqual(
+                        bitboard.inverse_transform_square(*moved, symmetry),
+                        (row, col))
+
+
+    def test_canonical_is_shared_by_symmetric_positions(self):
+        black, white, _ = position.position_key(self.game)
+        expected = bitboard.canonical(black, white)[:2]
+
+        for symmetry in range(8):
+            variant = bitboard.canonical(bitboard.transform_bits(black, symmetry),
+                                         bitboard.transform_bits(white, symmetry))
+            self.assertEqual(variant[:2], expected)
+
+
+    def test_encode_decode_round_trip(self):
+        text = position.encode_position(self.game)
+        self.assertEqual(len(text), 65)
+        self.assertEqual(text[-1], 'O', "White should be to move after D3.")
+
+        decoded = position.decode_position(text)
+        self.assertEqual(decoded, position.position_key(self.game))
+
+        game = position.game_from_position(*decoded, self.game.player_black,
+                                           self.game.player_white)
+        self.assertEqual(position.encode_position(game), text)
+        self.assertEqual((game.black_score, game.white_score), (4, 1))
+
+
+    def test_decode_invalid_position(self):
+        with self.assertRaises(ValueError):
+            position.decode_position('X' * 64)
+        with self.assertRaises(ValueError):
+            position.decode_position('?' * 64 + 'X')
+
+
+
+
+class TestPositionSuite(unittest.TestCase):
+    """
+    Test the benchmark position suite and the endgame solver checking it.
+    """
+
+    def test_move_notation(self):
+        self.assertEqual(position.format_move((3, 4)), 'e4')
+        self.assertEqual(position.parse_move('e4'), (3, 4))
+        for text in ('j9', '', 'e', 'e44', 'e-'):
+            with self.assertRaises(ValueError):
+                position.parse_move(text)
+
+
+    def test_solver_finds_final_score(self):
+        # White to move fills the last square, flipping one Black disc
+        black = bitboard.FULL & ~0b101
+        white = 0b001
+        self.assertEqual(endgame.solve_moves(black, white, False),
+                         [((0, 2), 3 - 61)])
+
+
+    def test_exact_entries_match_solver(self):
+        suite = position.read_position_suite(
+            os.path.join('data', 'benchmark_positions.txt'))
+        self.assertGreater(len(suite), 20)
+
+        for entry in suite:
+            black, white, black_to_move = position.decode_position(entry['position'])
+            if entry['source'] != 'exact' or endgame.empty_count(black, white) > 7:
+                continue
+
+            moves_with_scores = endgame.solve_moves(black, white, black_to_move)
+            best = max(score for _, score in moves_with_scores)
+            self.assertEqual(sorted(entry['best_moves']),
+                             [move for move, score in moves_with_scores if score == best])
+            self.assertEqual(entry['score'], best if black_to_move else -best)
+
+
+class TestProbCut(unittest.TestCase):
+    """
+    Test ProbCut forward pruning and its parameter file.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = mock.patch.object(probcut, 'PROBCUT_PATH', 
+                                  os.path.join(directory.name, 'probcut.json'))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.state_eval = StateEvaluator(AI_WEIGHTS)
+        probcut.save_parameters([
+            {'fingerprint': self.state_eval.fingerprint(), 'depth': 3, 
+             'shallow': 1, 'phase': phase, 'a': 1.0, 'b': 0.0, 'sigma': 0.05}
+            for phase in range(3)
+        ])
+
+        self.game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                         Player(PlayerType.USER, SquareType.WHITE))
+        for move in [(2, 3), (2, 2), (3, 2), (4, 2)]:
+            self.game = self.game.simulate_move(move)
+
+
+    def test_parameters(self):
+        self.assertEqual(probcut.game_phase(20), 0)
+        self.assertEqual(probcut.game_phase(21), 1)
+        self.assertEqual(probcut.game_phase(64), 2)
+
+        fingerprint = self.state_eval.fingerprint()
+        self.assertEqual(probcut.cut_parameters(fingerprint, 3, 8), (1, 1.0, 0.0, 0.05))
+        self.assertIsNone(probcut.cut_parameters(fingerprint, 4, 8))
+        self.assertIsNone(probcut.cut_parameters(fingerprint + 1, 3, 8))
+
+
+    def test_search_cuts(self):
+        def search(confidence):
+            player = Player(PlayerType.MINIMAX, SquareType.BLACK, self.state_eval,
+                            probcut=confidence)
+            with collect_stats() as stats:
+                value = player.minimax(self.game, 4, False)
+            return value, stats.nodes
+
+        value, nodes = search(None)
+
+        # Too confident a cut is never made, and the value is exact
+        self.assertEqual(search(1e9)[0], value)
+
+        # A prediction far above any window cuts every search it can
+        probcut.save_parameters([
+            {'fingerprint': self.state_eval.fingerprint(), 'depth': 3, 
+             'shallow': 1, 'phase': 0, 'a': 1.0, 'b': 10.0, 'sigma': 0.05}
+        ])
+        self.assertLess(search(1.0)[1], nodes / 2)
+
+
+class TestPositionDatabase(unittest.TestCase):
+    """
+    Test the database of positions of archived games.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'positions.db')
+
+        # The second game is the first rotated by 180 degrees
+        self.games = [['f5', 'd6', 'c3'], ['c4', 'e3', 'f6'], ['f5', 'f6'],
+                      ['f5', 'f4', 'e3']]
+
+
+    def add(self, db, numbers, source='games.jsonl'):
+        records = []
+        for number in numbers:
+            hashes, result = replay_hashes(self.games[number])
+            records.append((hashes, result, number + 1))
+        return db.add_games(records, source, max(numbers) + 1)
+
+
+    def lookup(self, db, moves):
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        for move in moves:
+            game = game.simulate_move(position.parse_move(move))
+        return db.lookup(*position.position_key(game))
+
+
+    def test_replay_hashes(self):
+        hashes, result = replay_hashes(self.games[0])
+        rotated, rotated_result = replay_hashes(self.games[1])
+        self.assertEqual(len(hashes), 4)
+        self.assertEqual(hashes, rotated)
+        self.assertEqual(result, rotated_result)
+        self.assertEqual(result, 1)
+
+        with self.assertRaises(ValueError):
+            replay_hashes(['f5', 'a1'])
+
+
+    def test_lookup(self):
+        db = PositionDatabase(self.path)
+        self.assertEqual(list(self.add(db, [0, 1, 2, 3])), [0, 1, 2, 3])
+
+        self.assertEqual(self.lookup(db, [])['games'], 4)
+
+        result = self.lookup(db, ['f5', 'd6'])
+        self.assertEqual(result['games'], 2)
+        self.assertEqual(result['black_wins'], 2)
+        self.assertEqual(result['game_ids'], [0, 1])
+
+        # Reached after a different first move, up to symmetry
+        self.assertEqual(self.lookup(db, ['e6', 'f4'])['games'], 2)
+        self.assertEqual(self.lookup(db, ['f5', 'f4'])['game_ids'], [3])
+        self.assertEqual(self.lookup(db, ['f5', 'd6', 'c5'])['games'], 0)
+        self.assertEqual(db.game_source(3), ('games.jsonl', 4))
+
+
+    def test_incremental_build(self):
+        db = PositionDatabase(self.path, max_segments=2)
+        self.add(db, [0])
+        self.add(db, [1, 2])
+        self.assertEqual(len(db.manifest['segments']), 2)
+
+        # A third segment merges them all into one
+        self.assertEqual(list(self.add(db, [3])), [3])
+        self.assertEqual(len(db.manifest['segments']), 1)
+
+        db = PositionDatabase(self.path)
+        self.assertEqual(db.games, 4)
+        self.assertEqual(db.indexed_lines('games.jsonl'), 4)
+        self.assertEqual(db.indexed_lines('other.jsonl'), 0)
+        self.assertEqual(self.lookup(db, ['f5', 'd6'])['game_ids'], [0, 1])
+        self.assertEqual(self.lookup(db, [])['games'], 4)
+        self.assertEqual(db.game_source(2), ('games.jsonl', 3))
+
+
+    def test_interrupted_build(self):
+        db = PositionDatabase(self.path)
+        self.add(db, [0, 1])
+
+        # Catalogue entries written without the manifest being saved
+        with open(os.path.join(self.path, 'games.bin'), 'ab') as file:
+            file.write(b'\0' * 16)
+
+        db = PositionDatabase(self.path)
+        self.assertEqual(list(self.add(db, [2])), [2])
+        self.assertEqual(db.game_source(2), ('games.jsonl', 3))
+
+
+class TestPositionAnalyser(unittest.TestCase):
+    """
+    Test move analysis and its position cache.
+    """
+
+    def setUp(self):
+        self.analyser = PositionAnalyser()
+        self.game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                         Player(PlayerType.USER, SquareType.WHITE))
+
+
+    def test_analyse_matches_minimax(self):
+        game = self.game.simulate_move((2, 3))
+        moves_with_values = self.analyser.analyse(game, 2)
+
+        player = Player(PlayerType.MINIMAX, SquareType.WHITE, StateEvaluator(), 2)
+        expected = dict(player.minimax_evaluate_moves(game))
+
+        self.assertEqual(dict(moves_with_values), expected)
+        # White minimizes, so the lowest value comes first
+        self.assertEqual(moves_with_values[0][0], (2, 2))
+
+
+    def test_symmetric_position_is_cached(self):
+        self.analyser.analyse(self.game.simulate_move((2, 3)), 2)
+        # F5 is the mirror image of D3 through the board centre
+        moves_with_values = self.analyser.analyse(self.game.simulate_move((4, 5)), 2)
+
+        self.assertEqual(self.analyser.hits, 1)
+        expected = PositionAnalyser().analyse(self.game.simulate_move((4, 5)), 2)
+        self.assertEqual(dict(moves_with_values), dict(expected))
+
+
+    def test_analyse_game(self):
+        analysis = self.analyser.analyse_game([(2, 3), (2, 2), (2, 1)], 1)
+        self.assertEqual([entry['color'] for entry in analysis],
+                         ['BLACK', 'WHITE', 'BLACK'])
+        self.assertEqual(analysis[1]['move'], (2, 2))
+
+        with self.assertRaises(ValueError):
+            self.analyser.analyse_game([(0, 0)], 1)
+
+
+    def test_analyse_within_time_limit(self):
+        depth, moves_with_values = self.analyser.analyse_within(self.game, 60, 2)
+        self.assertEqual(depth, 2)
+        self.assertEqual(moves_with_values, self.analyser.analyse(self.game, 2))
+
+        # Out of time after the first ply
+        analysis = self.analyser.analyse_game([(2, 3), (2, 2)], 3, time_limit=0)
+        self.assertEqual([entry['depth'] for entry in analysis], [1, 1])
+
+
+    def test_search_table_orders_next_position(self):
+        first = self.game.simulate_move((2, 3))
+        second = first.simulate_move((2, 2))
+        transpositions = {}
+        PositionAnalyser().analyse(first, 3, transpositions)
+
+        with collect_stats() as warm:
+            warm_moves = PositionAnalyser().analyse(second, 3, transpositions)
+        with collect_stats() as cold:
+            cold_moves = PositionAnalyser().analyse(second, 3, {})
+
+        # Same values, found with fewer nodes thanks to the first search
+        self.assertEqual(warm_moves, cold_moves)
+        self.assertLess(warm.nodes, cold.nodes)
+
+
+
+def store_in_shared_cache(path, position, move):
+    # Runs in a separate process
+    SharedEvalCache(path, 64).store(*position, move, 0.5)
+
+
+def counting_task(steps, finished):
+    for _ in range(steps):
+        yield
+    finished.append(steps)
+    return steps
+
+
+class TestSearchScheduler(unittest.TestCase):
+    """
+    Test interleaving of generator-based searches.
+    """
+
+    def setUp(self):
+        self.scheduler = SearchScheduler(n_workers=1, slice_steps=10)
+        self.addCleanup(self.scheduler.shutdown)
+
+
+    def test_cheap_task_is_not_stuck_behind_expensive_one(self):
+        finished = []
+        expensive = self.scheduler.submit(counting_task(100000, finished))
+        cheap = self.scheduler.submit(counting_task(50, finished))
+
+        self.assertEqual(cheap.result(timeout=10), 50)
+        self.assertEqual(expensive.result(timeout=10), 100000)
+        self.assertEqual(finished, [50, 100000])
+
+
+    def test_heavier_task_finishes_first(self):
+        finished = []
+        light = self.scheduler.submit(counting_task(1000, finished))
+        heavy = self.scheduler.submit(counting_task(999, finished), weight=4)
+
+        self.assertEqual(light.result(timeout=10), 1000)
+        self.assertEqual(heavy.result(timeout=10), 999)
+        self.assertEqual(finished, [999, 1000])
+
+
+    def test_errors_are_raised_to_caller(self):
+        def failing_task():
+            yield
+            raise ValueError("Search failed")
+
+        with self.assertRaises(ValueError):
+            self.scheduler.run(failing_task())
+
+
+    def test_scheduled_search_matches_direct_search(self):
+        black_player = Player(PlayerType.MINIMAX, SquareType.BLACK, depth=2)
+        white_player = Player(PlayerType.USER, SquareType.WHITE)
+        game = Game(black_player, white_player)
+
+        with collect_stats() as stats:
+            move = self.scheduler.run(black_player.minimax_move_steps(game))
+        self.assertEqual(move, black_player.get_minimax_move(game))
+        self.assertEqual(stats.searches, 1)
+        self.assertGreater(stats.nodes, 0)
+
+
+class TestBloomFilter(unittest.TestCase):
+    """
+    Test the duplicate filter of self-play games.
+    """
+
+    def test_membership(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        keys = [bitboard.position_hash(value, 0, True) for value in range(1000)]
+
+        self.assertTrue(all(bloom.add(key) for key in keys[:500]))
+        self.assertFalse(bloom.add(keys[0]), "A key should only be added once.")
+        self.assertTrue(all(key in bloom for key in keys[:500]))
+
+        false_positives = sum(key in bloom for key in keys[500:])
+        self.assertLess(false_positives, 25)
+
+
+    def test_save_and_load(self):
+        bloom = BloomFilter(100)
+        bloom.add(12345)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seen.bloom')
+            bloom.save(path)
+            loaded = BloomFilter(100)
+            loaded.load(path)
+
+            self.assertIn(12345, loaded)
+            self.assertEqual(loaded.count, 1)
+            with self.assertRaises(ValueError):
+                BloomFilter(1000).load(path)
+
+
+    def test_save_replaces_file(self):
+        bloom = BloomFilter(100)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seen.bloom')
+            bloom.save(path)
+            bloom.add(12345)
+            bloom.save(path)
+            self.assertEqual(os.listdir(directory), ['seen.bloom'])
+
+            loaded = BloomFilter(100)
+            loaded.load(path)
+            self.assertIn(12345, loaded)
+
+            # A truncated file is rejected, not loaded as an emptier filter
+            with open(path, 'r+b') as file:
+                file.truncate(20)
+            with self.assertRaises(ValueError):
+                BloomFilter(100).load(path)
+
+
+class TestSharedEvalCache(unittest.TestCase):
+    """
+    Test the memory-mapped evaluation cache shared between processes.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'eval_cache.bin')
+        self.cache = SharedEvalCache(self.path, 64)
+
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        self.game = game.simulate_move((2, 3))
+        black, white, _ = position.position_key(self.game)
+        self.position = (black, white, False, 3, 1234)
+
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+
+    def test_store_and_lookup(self):
+        self.assertIsNone(self.cache.lookup(*self.position))
+        self.cache.store(*self.position, (2, 2), -0.25)
+        self.assertEqual(self.cache.lookup(*self.position), ((2, 2), -0.25))
+
+        # Different depth or evaluator are different searches
+        self.assertIsNone(self.cache.lookup(*self.position[:3], 2, 1234))
+        self.assertIsNone(self.cache.lookup(*self.position[:4], 4321))
+
+
+    def test_symmetric_lookup(self):
+        self.cache.store(*self.position, (2, 2), -0.25)
+        black, white = self.position[:2]
+        # Rotating by 180 degrees flips both rows and columns
+        rotated = (bitboard.transform_bits(black, 3),
+                   bitboard.transform_bits(white, 3))
+        self.assertEqual(self.cache.lookup(*rotated, *self.position[2:]),
+                         ((5, 5), -0.25))
+
+
+    def test_warm_on_reopen(self):
+        self.cache.store(*self.position, (2, 2), -0.25)
+        self.cache.close()
+
+        self.cache = SharedEvalCache(self.path)
+        self.assertEqual(self.cache.n_slots, 64)
+        self.assertEqual(self.cache.lookup(*self.position), ((2, 2), -0.25))
+
+
+    def test_corrupt_slot_is_a_miss(self):
+        self.cache.store(*self.position, (2, 2), -0.25)
+
+        # Flip a byte of every written slot, as a torn write would
+        for slot in range(self.cache.n_slots):
+            offset = HEADER.size + slot * ENTRY.size + 20
+            self.cache.mmap[offset] ^= 0xFF
+
+        self.assertIsNone(self.cache.lookup(*self.position))
+
+
+    def test_shared_between_processes(self):
+        process = multiprocessing.Process(
+            target=store_in_shared_cache,
+            args=(self.path, self.position, (2, 4))
+        )
+        process.start()
+        process.join()
+
+        self.assertEqual(self.cache.lookup(*self.position), ((2, 4), 0.5))
+
+
+    def test_get_minimax_move_publishes_and_consults(self):
+        white = Player(PlayerType.MINIMAX, SquareType.WHITE, StateEvaluator(), 2)
+
+        with mock.patch('src.player.get_shared_cache', return_value=self.cache):
+            self.assertEqual(white.get_minimax_move(self.game), (2, 2))
+
+            # Plant a different answer to check it is served without search
+            search = self.position[:3] + (2, white.state_eval.fingerprint())
+            self.cache.store(*search, (4, 2), 0.0)
+            self.assertEqual(white.get_minimax_move(self.game), (4, 2))
+
+
+    def test_budget_search_publishes_each_depth(self):
+        white = Player(PlayerType.MINIMAX, SquareType.WHITE, StateEvaluator(), 2,
+                       node_budget=10000)
+
+        with mock.patch('src.player.get_shared_cache', return_value=self.cache):
+            white.get_minimax_move(self.game)
+            for depth in (1, 2):
+                self.assertIsNotNone(white.get_cached_move(self.game, depth))
+
+
+
+class TestLazySMP(unittest.TestCase):
+    """
+    Test the shared transposition table and searching on helper processes.
+    """
+
+    def setUp(self):
+        self.table = SharedTranspositions(64)
+        evaluator = StateEvaluator(AI_WEIGHTS)
+        self.player = Player(PlayerType.MINIMAX, SquareType.WHITE, evaluator, 3)
+        game = Game(Player(PlayerType.USER, SquareType.BLACK), self.player)
+        self.game = game.simulate_move((2, 3))
+        black, white, _ = position.position_key(self.game)
+        self.key = (black, white, SquareType.WHITE, True)
+
+
+    def tearDown(self):
+        self.table.close()
+
+
+    def test_store_and_get(self):
+        self.assertIsNone(self.table.get(self.key))
+        self.table[self.key] = (3, float('-inf'), 0.5, (2, 2))
+        self.assertEqual(self.table.get(self.key), (3, float('-inf'), 0.5, (2, 2)))
+
+        self.table[self.key] = (4, -0.25, -0.25, None)
+        self.assertEqual(self.table.get(self.key), (4, -0.25, -0.25, None))
+
+        # The minimizing side's entry is a different one
+        self.assertIsNone(self.table.get(self.key[:3] + (False,)))
+
+
+    def test_corrupt_slot_is_a_miss(self):
+        self.table[self.key] = (3, 0.5, 0.5, (2, 2))
+
+        # Flip a byte of every written slot, as a torn write would
+        for slot in range(self.table.n_slots):
+            offset = lazy_smp.HEADER.size + slot * lazy_smp.ENTRY.size + 20
+            self.table.mmap[offset] ^= 0xFF
+
+        self.assertIsNone(self.table.get(self.key))
+
+
+    def test_shared_with_forked_process(self):
+        def store():
+            self.table[self.key] = (3, 0.5, 0.5, (2, 2))
+
+        process = multiprocessing.get_context('fork').Process(target=store)
+        process.start()
+        process.join(10)
+        self.assertEqual(self.table.get(self.key), (3, 0.5, 0.5, (2, 2)))
+
+
+    def test_minimax_with_shared_table(self):
+        table = SharedTranspositions(1 << 12)
+        try:
+            self.assertEqual(self.player.minimax_evaluate_moves(self.game, table),
+                             self.player.minimax_evaluate_moves(self.game, {}))
+        finally:
+            table.close()
+
+
+    def test_search_plays_best_move(self):
+        values = dict(self.player.minimax_evaluate_moves(self.game))
+
+        with LazySMP(2, 1 << 12) as smp:
+            for _ in range(2):
+                with collect_stats() as stats:
+                    move = run_steps(smp.search_steps(self.game, self.player))
+                self.assertEqual(values[move], min(values.values()))
+                self.assertEqual(stats.depth, 3)
+
+
+    def test_helper_killed_during_search(self):
+        values = dict(self.player.minimax_evaluate_moves(self.game))
+
+        # With one helper, none can finish the search after it's killed; it's
+        # stopped first so it can't finish it before
+        with LazySMP(1, 1 << 12) as smp:
+            helper = smp.helpers[0]
+            os.kill(helper.pid, signal.SIGSTOP)
+            search = smp.search_steps(self.game, self.player)
+            next(search)
+            helper.kill()
+            helper.join(5)
+
+            with self.assertLogs(lazy_smp.logger, 'ERROR'):
+                move = run_steps(search)
+            self.assertEqual(values[move], min(values.values()))
+
+            # The helpers are restarted for the next search
+            with self.assertLogs(lazy_smp.logger, 'WARNING'):
+                move = run_steps(smp.search_steps(self.game, self.player))
+            self.assertEqual(values[move], min(values.values()))
+            self.assertTrue(smp.helpers_alive())
+
+
+class TestTables(unittest.TestCase):
+    """
+    Test precomputed lookup tables are built once and memory-mapped.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.object(tables, 'TABLES_DIR', self.directory.name),
+            mock.patch.dict(tables._builders),
+            mock.patch.dict(tables._loaded),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        self.builds = 0
+
+        @tables.register_table('squares', 'H')
+        def build_squares():
+            self.builds += 1
+            return [index * index for index in range(64)]
+
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.directory.cleanup()
+
+
+    def test_table_built_on_first_use(self):
+        table = tables.get_table('squares')
+        self.assertEqual(table[7], 49)
+        self.assertEqual(len(table), 64)
+        self.assertTrue(os.path.exists(tables.table_path('squares')))
+
+        # Loaded tables are reused within the process
+        self.assertIs(tables.get_table('squares'), table)
+        self.assertEqual(self.builds, 1)
+
+
+    def test_existing_file_is_not_rebuilt(self):
+        tables.build_table('squares')
+        tables.get_table('squares')
+        self.assertEqual(self.builds, 1)
+
+
+
+class TestAssets(unittest.TestCase):
+    """
+    Test publishing versions of OthelloAI's assets and swapping them in.
+    """
+
+    WEIGHTS = {'DISC_DIFF': 0.25, 'MOBILITY': 0.25, 'CORNERS': 0.5}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = AssetStore(self.directory.name, check_interval=0)
+
+
+    def test_no_version_published(self):
+        self.assertIsNone(self.store.current())
+
+        with mock.patch.object(assets, '_store', self.store):
+            self.assertEqual(assets.current_evaluator().weights, AI_WEIGHTS)
+
+
+    def test_swap_in_new_version(self):
+        self.assertEqual(publish_version(self.directory.name, AI_WEIGHTS), 'v0001')
+        first = self.store.current()
+        self.assertEqual(first.evaluator.weights, AI_WEIGHTS)
+
+        table = os.path.join(self.directory.name, 'squares.bin')
+        with open(table, 'wb') as file:
+            file.write(bytes(range(64)))
+        book = {'position': 'f5'}
+        name = publish_version(self.directory.name, self.WEIGHTS, book,
+                               {'squares.B.bin': table})
+
+        second = self.store.current()
+        self.assertEqual(second.name, name)
+        self.assertEqual(second.weights[HeuristicType.MOBILITY], 0.25)
+        self.assertEqual(second.book, book)
+        self.assertEqual(second.tables['squares'][63], 63)
+
+        # Evaluators of both versions are found, for games started on either
+        for version in (first, second):
+            fingerprint = version.evaluator.fingerprint()
+            self.assertIs(self.store.evaluator(fingerprint), version.evaluator)
+
+
+    def test_check_interval(self):
+        self.store.check_interval = 3600
+        self.assertIsNone(self.store.current())
+
+        publish_version(self.directory.name, AI_WEIGHTS)
+        self.assertIsNone(self.store.current())
+        self.store.refresh()
+        self.assertEqual(self.store.current().name, 'v0001')
+
+
+    def test_invalid_version_rejected(self):
+        publish_version(self.directory.name, AI_WEIGHTS)
+
+        with self.assertRaises(ValueError):
+            publish_version(self.directory.name, {'DISC_DIFF': 0.5})
+        with self.assertRaises(ValueError):
+            publish_version(self.directory.name, {'PARITY': 1.0})
+        with self.assertRaises(ValueError):
+            publish_version(self.directory.name, AI_WEIGHTS, tables={'squares.bin': ''})
+        self.assertEqual(self.store.current().name, 'v0001')
+
+        # A version broken after publishing keeps the loaded one
+        name = publish_version(self.directory.name, self.WEIGHTS)
+        with open(os.path.join(self.directory.name, name, 'weights.json'), 'w') as file:
+            file.write('{"DISC_DIFF": 2}')
+        with self.assertLogs(assets.logger, 'ERROR'):
+            self.assertEqual(self.store.current().name, 'v0001')
+
+
+    def test_old_versions_removed(self):
+        for _ in range(4):
+            publish_version(self.directory.name, AI_WEIGHTS, keep=2)
+        self.assertEqual(assets.version_names(self.directory.name),
+                         ['v0003', 'v0004'])
+
+
+    def test_versions_ordered_by_number(self):
+        for name in ('v9', 'v10', 'v0002'):
+            os.makedirs(os.path.join(self.directory.name, name))
+        self.assertEqual(assets.version_names(self.directory.name),
+                         ['v0002', 'v9', 'v10'])
+
+        self.assertEqual(publish_version(self.directory.name, AI_WEIGHTS), 'v0011')
+        self.assertEqual(self.store.current().name, 'v0011')
+
+
+    def test_new_games_use_current_version(self):
+        publish_version(self.directory.name, self.WEIGHTS)
+
+        with mock.patch.object(assets, '_store', self.store):
+            client = create_app().test_client()
+            client.post('/play_game', data={'color': 'BLACK'})
+            state_eval = self.store.current().evaluator
+            self.assertIs(views.get_analyser().state_eval, state_eval)
+            self.assertIs(get_evaluator(state_eval.fingerprint()), state_eval)
+
+        with client.session_transaction() as session:
+            ai_player = pickle.loads(session['game_instance']).player_white
+        self.assertEqual(ai_player.state_eval.weights[HeuristicType.MOBILITY], 0.25)
+
+
+class TestViews(unittest.TestCase):
+    """
+    Test the game endpoints of the web app.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(views, 'AI_DEPTH', 1)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.client = create_app().test_client()
+        self.client.post('/play_game', data={'color': 'BLACK'})
+
+
+    def test_difficulty_sets_budget(self):
+        self.client.post('/play_game', data={'color': 'BLACK', 'difficulty': 'easy'})
+
+        with self.client.session_transaction() as session:
+            ai_player = pickle.loads(session['game_instance']).player_white
+        self.assertEqual(ai_player.node_budget, DIFFICULTY_LEVELS['easy']['node_budget'])
+        self.assertEqual(ai_player.noise, DIFFICULTY_LEVELS['easy']['noise'])
+
+        # The default level always searches to full depth
+        self.client.post('/play_game', data={'color': 'BLACK'})
+        with self.client.session_transaction() as session:
+            ai_player = pickle.loads(session['game_instance']).player_white
+        self.assertIsNone(ai_player.node_budget)
+
+
+    def test_turn_returns_both_moves(self):
+        response = self.client.post('/turn', json={'row': 2, 'col': 3})
+        data = response.get_json()
+
+        user_move, agent_move = data['moves']
+        self.assertEqual(user_move, {'color': 'BLACK', 'square': [2, 3],
+                                     'flipped': [[3, 3]]})
+        self.assertEqual(agent_move['color'], 'WHITE')
+        self.assertTrue(data['agent_moved'])
+        self.assertEqual(data['black_score'] + data['white_score'], 6)
+        self.assertTrue(data['user_has_moves'])
+
+        # Valid moves returned match the stored game
+        state = self.client.get('/get_game_state').get_json()['game_state']
+        valid = [[row, col] for row in range(8) for col in range(8)
+                 if state[row][col] == 'VALID']
+        self.assertEqual(data['valid_moves'], valid)
+
+
+    def test_turn_rejects_invalid_move(self):
+        response = self.client.post('/turn', json={'row': 0, 'col': 0})
+        self.assertEqual(response.status_code, 400)
+
+        for move in ({'row': 'two', 'col': 3}, {'row': [2], 'col': 3}):
+            response = self.client.post('/turn', json=move)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json(), {'message': 'Invalid move'})
+
+        # OthelloAI can't be asked to move while it's the user's turn
+        response = self.client.post('/turn', json={})
+        self.assertEqual(response.status_code, 400)
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['game_version'], 1)
+
+
+    def test_analysis_rejects_invalid_depth(self):
+        for depth in ('deep', [3], None):
+            response = self.client.post('/analyse_position', json={'depth': depth})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/analyse_game',
+                                        json={'depth': depth, 'moves': [[2, 3]]})
+            self.assertEqual(response.status_code, 400)
+
+
+    def test_game_state_not_modified(self):
+        response = self.client.get('/get_game_state')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/get_game_state',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post('/turn', json={'row': 2, 'col': 3})
+        response = self.client.get('/get_game_state',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+    def test_engine_kept_between_moves(self):
+        engines = self.client.application.extensions['othello_engines']
+        with self.client.session_transaction() as session:
+            game_id = session['game_id']
+
+        data = self.client.post('/turn', json={'row': 2, 'col': 3}).get_json()
+        engine = engines.engines[game_id]
+        self.assertEqual(engine.searches, 1)
+        self.assertTrue(engine.transpositions)
+
+        row, col = data['valid_moves'][0]
+        self.client.post('/turn', json={'row': row, 'col': col})
+        self.assertIs(engines.engines[game_id], engine)
+        self.assertEqual(engine.searches, 2)
+
+        self.client.post('/reset_game')
+        self.assertNotIn(game_id, engines.engines)
+
+
+class TestBestMove(unittest.TestCase):
+    """
+    Test the stateless best move endpoint.
+    """
+
+    def setUp(self):
+        self.client = create_app().test_client()
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        self.game = game.simulate_move((2, 3)).simulate_move((2, 2))
+        self.position = position.encode_position(self.game)
+
+
+    def test_best_move(self):
+        response = self.client.get('/best_move',
+                                   query_string={'position': self.position, 'depth': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Set-Cookie', response.headers)
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertIn('max-age=3600', response.headers['Cache-Control'])
+
+        data = response.get_json()
+        player = Player(PlayerType.MINIMAX, SquareType.BLACK,
+                        StateEvaluator(AI_WEIGHTS), 2)
+        values = dict(player.minimax_evaluate_moves(self.game))
+        self.assertEqual(data['color'], 'BLACK')
+        self.assertEqual(data['score'], max(values.values()))
+        self.assertEqual(values[tuple(data['move'])], data['score'])
+        self.assertEqual(data['notation'], position.format_move(data['move']))
+
+        # The same request gets the same answer
+        again = self.client.get('/best_move',
+                                query_string={'position': self.position, 'depth': 2})
+        self.assertEqual(again.get_json(), data)
+        self.assertEqual(again.headers['ETag'], response.headers['ETag'])
+
+
+    def test_not_modified(self):
+        query = {'position': self.position, 'depth': 2}
+        etag = self.client.get('/best_move', query_string=query).headers['ETag']
+
+        with mock.patch.object(views, 'search_best_move') as search:
+            response = self.client.get('/best_move', query_string=query,
+                                       headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        search.assert_not_called()
+
+        # Another depth is another result
+        response = self.client.get('/best_move', headers={'If-None-Match': etag},
+                                   query_string={'position': self.position, 'depth': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+    def test_symmetric_positions(self):
+        black, white, black_to_move = position.decode_position(self.position)
+        # Rotating by 180 degrees flips both rows and columns
+        rotated = position.encode_position(position.game_from_position(
+            bitboard.transform_bits(black, 3), bitboard.transform_bits(white, 3),
+            black_to_move, Player(PlayerType.USER, SquareType.BLACK),
+            Player(PlayerType.USER, SquareType.WHITE)))
+
+        data = self.client.get('/best_move', query_string={'position': self.position}).get_json()
+        rotated_data = self.client.get('/best_move', query_string={'position': rotated}).get_json()
+        self.assertEqual(rotated_data['move'], [7 - data['move'][0], 7 - data['move'][1]])
+        self.assertEqual(rotated_data['score'], data['score'])
+
+
+    def test_no_moves(self):
+        # Only Black's discs are left, so the game is over
+        finished = 'X' * 64 + 'O'
+        data = self.client.get('/best_move', query_string={'position': finished}).get_json()
+        self.assertIsNone(data['move'])
+        self.assertTrue(data['game_over'])
+
+
+    def test_invalid_position(self):
+        for query in ({}, {'position': 'X' * 10},
+                      {'position': self.position, 'depth': 'deep'}):
+            response = self.client.get('/best_move', query_string=query)
+            self.assertEqual(response.status_code, 400)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Test sharing concurrent identical searches.
+    """
+
+    def wait_for_waiter(self, flight, key):
+        deadline = time.monotonic() + 5
+        while flight.calls[key].waiters == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+
+    def game_after(self, moves):
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        for move in moves:
+            game = game.simulate_move(move)
+        return game
+
+
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            release.wait(5)
+            return len(calls)
+
+        results = []
+        follower = threading.Thread(
+            target=lambda: results.append(flight.do('key', call)))
+
+        def lead():
+            follower.start()
+            self.wait_for_waiter(flight, 'key')
+            release.set()
+            return call()
+
+        self.assertEqual(flight.do('key', lead), (1, False))
+        follower.join()
+        self.assertEqual(results, [(1, True)])
+        self.assertEqual(flight.in_flight(), 0)
+
+        # Once finished, a call runs again
+        self.assertEqual(flight.do('key', call), (2, False))
+
+
+    def test_error_shared(self):
+        flight = SingleFlight()
+        errors = []
+
+        def follow():
+            try:
+                flight.do('key', lambda: None)
+            except ValueError as error:
+                errors.append(error)
+
+        follower = threading.Thread(target=follow)
+
+        def lead():
+            follower.start()
+            self.wait_for_waiter(flight, 'key')
+            raise ValueError("Search failed.")
+
+        with self.assertRaises(ValueError):
+            flight.do('key', lead)
+        follower.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+
+    def test_symmetric_positions_share_key(self):
+        black, white = bitboard.from_board(self.game_after([(4, 5)]).board.state)
+        key, symmetry = search_key(black, white, False, (1, 2))
+
+        # The same position reflected
+        other_black, other_white = bitboard.from_board(
+            self.game_after([(2, 3)]).board.state)
+        other_key, other_symmetry = search_key(other_black, other_white, False, (1, 2))
+        self.assertEqual(key, other_key)
+        self.assertNotEqual(search_key(black, white, False, (1, 3))[0], key)
+
+        move = (3, 5)
+        self.assertEqual(from_canonical(to_canonical(move, symmetry), symmetry), move)
+        other_move = from_canonical(to_canonical(move, symmetry), other_symmetry)
+        self.assertEqual(
+            bitboard.canonical(*bitboard.from_board(
+                self.game_after([(4, 5), move]).board.state))[:2],
+            bitboard.canonical(*bitboard.from_board(
+                self.game_after([(2, 3), other_move]).board.state))[:2])
+        self.assertIsNone(to_canonical(None, symmetry))
+
+
+    def test_app_shares_search(self):
+        with mock.patch.object(views, 'AI_DEPTH', 1):
+            app = create_app()
+            clients = [app.test_client(), app.test_client()]
+            for client in clients:
+                client.post('/play_game', data={'color': 'BLACK'})
+            searches = app.extensions['othello_searches']
+            search_move = views.search_move
+
+            def blocking_search(*args):
+                # Wait for the other request to join this search
+                deadline = time.monotonic() + 5
+                while not any(call.waiters for call in searches.calls.values()):
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.001)
+                return search_move(*args)
+
+            responses = {}
+
+            def play(index, move):
+                responses[index] = clients[index].post(
+                    '/turn', json={'row': move[0], 'col': move[1]})
+
+            # Symmetric openings
+            with mock.patch.object(views, 'search_move', 
+                                   side_effect=blocking_search) as patched:
+                threads = [threading.Thread(target=play, args=(index, move))
+                           for index, move in enumerate([(4, 5), (2, 3)])]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        self.assertEqual(patched.call_count, 1)
+
+        boards = []
+        for index, client in enumerate(clients):
+            self.assertTrue(responses[index].get_json()['agent_moved'])
+            with client.session_transaction() as session:
+                game = pickle.loads(session['game_instance'])
+            boards.append(bitboard.canonical(*bitboard.from_board(game.board.state))[:2])
+        self.assertEqual(boards[0], boards[1])
+
+
+class TestEngineRegistry(unittest.TestCase):
+    """
+    Test the search state kept between OthelloAI's moves.
+    """
+
+    def test_eviction(self):
+        registry = EngineRegistry(max_engines=2, max_idle=60)
+        first = registry.get('a')
+        registry.get('b')
+        self.assertIs(registry.get('a'), first)
+
+        # The least recently used engine goes first
+        registry.get('c')
+        self.assertEqual(list(registry.engines), ['a', 'c'])
+
+        # Idle engines are dropped, but never the one being fetched
+        registry.max_idle = 0
+        registry.get('d')
+        self.assertEqual(list(registry.engines), ['d'])
+
+
+    def test_prepare_drops_past_positions(self):
+        game = Game(Player(PlayerType.USER, SquareType.BLACK),
+                    Player(PlayerType.USER, SquareType.WHITE))
+        engine = SessionEngine()
+        engine.transpositions = {(0b111, 0, SquareType.BLACK, True): None,
+                                 (0b11111, 0, SquareType.BLACK, True): None}
+        engine.history = {(2, 3): 5, (3, 2): 1}
+
+        engine.prepare(game)
+        self.assertEqual(list(engine.transpositions), [(0b11111, 0, SquareType.BLACK, True)])
+        self.assertEqual(engine.history, {(2, 3): 2})
+
+
+class TestEngineService(unittest.TestCase):
+    """
+    Test searching on the engine service, and falling back without it.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'engine.sock')
+
+
+    def test_service_matches_in_process_search(self):
+        server = EngineServer(self.path, n_workers=1)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+        client = EngineClient(self.path, pool_size=1)
+        self.addCleanup(client.close)
+        player = Player(PlayerType.MINIMAX, SquareType.WHITE, 
+                        StateEvaluator(AI_WEIGHTS), 2)
+        game = Game(Player(PlayerType.USER, SquareType.BLACK), player)
+        game = game.simulate_move((2, 3))
+
+        for _ in range(2):
+            move, nodes = client.best_move(game, player)
+            self.assertEqual(move, player.get_minimax_move(game))
+            self.assertGreater(nodes, 0)
+
+        # Both requests used the same connection
+        self.assertEqual(client.connections.qsize(), 1)
+
+
+    def test_request_keeps_settings(self):
+        player = Player(PlayerType.MINIMAX, SquareType.WHITE, StateEvaluator(AI_WEIGHTS),
+                        3, node_budget=400, noise=0.25, probcut=1.5)
+        game = Game(Player(PlayerType.USER, SquareType.BLACK), player)
+        game = game.simulate_move((2, 3))
+
+        searched = []
+        def get_minimax_move(self, game):
+            searched.append(self)
+            return (2, 2)
+
+        with mock.patch.object(Player, 'get_minimax_move', get_minimax_move):
+            search_request(encode_request(game, player))
+        self.assertEqual(searched[0].search_settings(), player.search_settings())
+
+
+    def test_unavailable_service(self):
+        client = EngineClient(self.path, retry_interval=60, max_failures=2)
+        player = Player(PlayerType.MINIMAX, SquareType.BLACK)
+        game = Game(player, Player(PlayerType.USER, SquareType.WHITE))
+
+        for failures in (1, 2):
+            with self.assertRaises(EngineUnavailable):
+                client.best_move(game, player)
+            self.assertEqual(client.down_until > time.monotonic(), failures == 2)
+
+        # The web app searches in process instead
+        with mock.patch.dict(os.environ, {'OTHELLO_ENGINE_SOCKET': self.path}), \
+                mock.patch.object(views, 'AI_DEPTH', 1):
+            app_client = create_app().test_client()
+            app_client.post('/play_game', data={'color': 'WHITE'})
+            response = app_client.post('/turn', json={})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['agent_moved'])
+
+
+    def test_one_timeout_keeps_service(self):
+        # A service that accepts connections but never answers
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(self.path)
+        listener.listen(8)
+
+        client = EngineClient(self.path, timeout=0.05, retry_interval=60)
+        self.addCleanup(client.close)
+        player = Player(PlayerType.MINIMAX, SquareType.BLACK)
+        game = Game(player, Player(PlayerType.USER, SquareType.WHITE))
+
+        for _ in range(client.max_failures - 1):
+            with self.assertRaises(EngineUnavailable):
+                client.best_move(game, player)
+        self.assertLess(client.down_until, time.monotonic())
+
+        # A success in between starts the count again
+        with mock.patch.object(client, '_exchange', return_value=(OK, 2, 3, 10)):
+            self.assertEqual(client.best_move(game, player), ((2, 3), 10))
+        self.assertEqual(client.failures, 0)
+
+        for _ in range(client.max_failures):
+            with self.assertRaises(EngineUnavailable):
+                client.best_move(game, player)
+        self.assertGreater(client.down_until, time.monotonic())
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Test request phase timings and sampled profiling.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(views, 'AI_DEPTH', 1)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.client.post('/play_game', data={'color': 'WHITE'})
+
+
+    def test_server_timing_phases(self):
+        response = self.client.post('/turn', json={})
+        phases = [entry.split(';')[0] for entry in
+                  response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['decode', 'search', 'evaluation',
+                                  'serialize', 'total'])
+
+        summary = self.client.get('/timings').get_json()
+        self.assertGreaterEqual(summary['views.turn']['search']['count'], 1)
+
+
+    def test_sampled_requests_are_captured(self):
+        self.app.config['PROFILE_SAMPLE_RATE'] = 1
+        self.app.config['PROFILE_DIR'] = self.directory.name
+
+        self.client.post('/turn', json={})
+        extensions = sorted(os.path.splitext(name)[1]
+                            for name in os.listdir(self.directory.name))
+        self.assertEqual(extensions, ['.prof', '.tracemalloc'])
+
+        # The search ran where the profiler could see it
+        name = next(name for name in os.listdir(self.directory.name)
+                    if name.endswith('.prof'))
+        stats = pstats.Stats(os.path.join(self.directory.name, name))
+        self.assertIn('minimax_bitboard_steps', 
+                      [function for _, _, function in stats.stats])
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test the Prometheus metrics endpoint.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(views, 'AI_DEPTH', 1)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+        with mock.patch.dict(os.environ, {'OTHELLO_METRICS_DIR': self.directory.name}):
+            self.app = create_app()
+        self.client = self.app.test_client()
+
+
+    def test_requests_and_searches_are_counted(self):
+        self.client.post('/play_game', data={'color': 'WHITE'})
+        self.client.post('/turn', json={})
+
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('othello_http_request_duration_seconds_count{route="views.turn"} 1', text)
+        self.assertIn('othello_http_requests_in_flight 1', text)
+        self.assertIn('othello_searches_total 1', text)
+        self.assertIn('othello_session_payload_bytes_count 2', text)
+
+
+    def test_workers_are_summed(self):
+        store = self.app.extensions['othello_metrics']
+        store.inc('othello_searches_total', 2)
+
+        # A second worker with the same layout, no longer running
+        other = metrics.MetricsStore(self.directory.name, store.label_values['route'])
+        with mock.patch('os.getpid', return_value=2 ** 22 + 1):
+            other.inc('othello_searches_total', 3)
+            other.inc('othello_http_requests_in_flight')
+
+        # A recycled process id gets a file of its own
+        recycled = metrics.MetricsStore(self.directory.name, store.label_values['route'])
+        with mock.patch('os.getpid', return_value=2 ** 22 + 1):
+            recycled.inc('othello_searches_total', 1)
+
+        searches = store.index[('othello_searches_total', None, '')]
+        in_flight = store.index[('othello_http_requests_in_flight', None, '')]
+        totals = store.collect()
+        self.assertEqual(totals[searches], 6)
+        self.assertEqual(totals[in_flight], 0)
+
+        # Exited workers are folded into one file, keeping their counters
+        open(os.path.join(self.directory.name, 'worker-unknown.bin'), 'w').close()
+        store.remove_dead_workers()
+        names = os.listdir(self.directory.name)
+        workers = [name for name in names if metrics.worker_pid(name)]
+        self.assertEqual(len(workers), 1)
+        self.assertTrue(workers[0].startswith(f'worker-{os.getpid()}-'))
+        self.assertIn(metrics.DEAD_WORKERS, names)
+        self.assertEqual(store.collect()[searches], 6)
         
+
+
+class TestAdmission(unittest.TestCase):
+    """
+    Test degradation of AI searches under load.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(views, 'AI_DEPTH', 2)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.app = create_app()
+        self.controller = self.app.extensions['othello_admission']
+        self.client = self.app.test_client()
+        self.client.post('/play_game', data={'color': 'WHITE'})
+
+
+    def test_levels_follow_load(self):
+        controller = admission.AdmissionController(
+            in_flight_thresholds=(2, 3, 4, 5), wait_thresholds=(0.5, 1.5, 3.0, 10.0))
+        self.assertEqual(controller.level(), 'full')
+
+        controller.in_flight = 2
+        self.assertEqual(controller.level(), 'minimal')
+
+        controller.in_flight = 3
+        self.assertEqual(controller.level(), 'cached')
+
+        controller.in_flight = 0
+        controller.record_wait(5.0)
+        self.assertEqual(controller.level(), 'reduced')
+
+        # Waits are forgotten once the load has passed
+        controller.wait_updated -= 60
+        self.assertEqual(controller.level(), 'full')
+
+
+    def test_degraded_search_is_reported(self):
+        self.controller.in_flight = 2
+        response = self.client.post('/turn', json={})
+        self.assertEqual(response.get_json()['degradation'], 'reduced')
+
+        with self.client.session_transaction() as session:
+            game = pickle.loads(session['game_instance'])
+        self.assertEqual(game.player_black.depth, 2,
+                         "The AI's own depth should be kept.")
+
+
+    def test_cached_level_answers_without_searching(self):
+        self.controller.in_flight = 7
+        with collect_stats() as stats:
+            response = self.client.post('/turn', json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['degradation'], 'cached')
+        self.assertEqual(len(response.get_json()['moves']), 1)
+        self.assertEqual(stats.nodes, 0)
+
+
+    def test_slot_timeout_falls_back_to_cached(self):
+        controller = admission.AdmissionController(max_searches=1, max_wait=0.01)
+        with controller.admit() as first:
+            with controller.admit() as second:
+                self.assertEqual((first, second), ('full', 'cached'))
+        self.assertEqual(controller.in_flight, 0)
+
+
+    def test_analysis_is_admitted(self):
+        self.controller.in_flight = 2
+        response = self.client.post('/analyse_position', json={'depth': 3})
+        self.assertEqual(response.get_json()['depth'], 2)
+        self.assertEqual(response.get_json()['degradation'], 'reduced')
+
+        self.controller.in_flight = 7
+        response = self.client.post('/analyse_game', json={'moves': [[2, 3]]})
+        self.assertEqual(response.status_code, 503)
+
+
+    def test_overload_is_shed(self):
+        self.controller.in_flight = 15
+        response = self.client.post('/turn', json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['game_version'], 1)
+
+
+    def test_upstream_wait(self):
+        start = time.time() - 2
+        with self.app.test_request_context(
+                headers={'X-Request-Start': f't={int(start * 1000)}'}):
+            self.assertAlmostEqual(admission.upstream_wait(), 2, delta=0.1)
+        with self.app.test_request_context():
+            self.assertEqual(admission.upstream_wait(), 0.0)
+
+
 if __name__ == '__main__':
-    unittest.main(verbosity=2)
\ No newline at end of file
+    unittest.main(verbosity=2)
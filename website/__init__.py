@@ -3,14 +3,67 @@
 # file will run automatically. This behavior effectively turns the folder into 
 # a package.
 
+import os
+import tempfile
 from flask import Flask
 
 def create_app():
     app = Flask(__name__)
     app.config["SECRET_KEY"] = "Othello"
 
+    # Profile 1 in N requests (0 disables), saving captures to PROFILE_DIR
+    app.config["PROFILE_SAMPLE_RATE"] = int(os.environ.get("OTHELLO_PROFILE_SAMPLE", 0))
+    app.config["PROFILE_DIR"] = os.environ.get("OTHELLO_PROFILE_DIR", "profiles")
+
+    # Directory shared by all worker processes for their metrics
+    app.config["METRICS_DIR"] = os.environ.get(
+        "OTHELLO_METRICS_DIR", 
+        os.path.join(tempfile.gettempdir(), "othello-metrics")
+    )
+
+    # Admission control of AI searches; searches run at once, fewer than the
+    # request threads (gunicorn.conf.py) so that queueing shows, and the 
+    # searches in flight and average queue wait at which OthelloAI plays 
+    # weaker, answers from the cache alone, then turns requests away
+    app.config["ADMISSION_MAX_SEARCHES"] = int(os.environ.get("OTHELLO_MAX_SEARCHES", 2))
+    app.config["ADMISSION_IN_FLIGHT_THRESHOLDS"] = tuple(
+        int(value) for value in os.environ.get("OTHELLO_DEGRADE_IN_FLIGHT", "3,4,8,16").split(","))
+    app.config["ADMISSION_WAIT_THRESHOLDS"] = tuple(
+        float(value) for value in os.environ.get("OTHELLO_DEGRADE_WAIT", "0.5,1.5,3,10").split(","))
+    app.config["ADMISSION_MAX_WAIT"] = 5.0
+    app.config["ADMISSION_RETRY_AFTER"] = 2
+
+    # Threads running admitted searches, interleaved in slices of nodes so a
+    # cheap search isn't stuck behind an expensive one
+    app.config["SEARCH_WORKERS"] = int(os.environ.get("OTHELLO_SEARCH_WORKERS", 1))
+    app.config["SEARCH_SLICE_NODES"] = 32
+
+    # Search state kept between OthelloAI's moves, for this many recent games
+    # per worker process, each dropped after this many idle seconds
+    app.config["ENGINE_SESSIONS"] = int(os.environ.get("OTHELLO_ENGINE_SESSIONS", 256))
+    app.config["ENGINE_MAX_IDLE"] = float(os.environ.get("OTHELLO_ENGINE_IDLE", 1800))
+
+    # Engine service searching for the workers (engine_server.py), if any; a
+    # connection per request thread, and the seconds to wait for an answer
+    # before searching in process
+    app.config["ENGINE_SOCKET"] = os.environ.get("OTHELLO_ENGINE_SOCKET")
+    app.config["ENGINE_CONNECTIONS"] = 4
+    app.config["ENGINE_TIMEOUT"] = float(os.environ.get("OTHELLO_ENGINE_TIMEOUT", 10))
+
+    # Seconds upstream caches may serve a /best_move response; results only
+    # change when a new evaluator is deployed, which changes their entity tag
+    app.config["BEST_MOVE_MAX_AGE"] = int(os.environ.get("OTHELLO_BEST_MOVE_MAX_AGE", 3600))
+
     from .views import views
+    from .profiling import init_profiling
+    from .metrics import init_metrics
+    from .admission import init_admission
+    from .engines import init_engines
     
     app.register_blueprint(views, url_prefix = "/")
+    init_profiling(app)
+    init_metrics(app)
+    init_admission(app)
+    init_engines(app)
 
     return app
\ No newline at end of file
@@ -0,0 +1,209 @@
+# The purpose of the admission.py file is to keep the app available under peak
+# load. Each AI search has to be admitted first; as searches pile up, or wait
+# too long for a free slot, OthelloAI searches less deeply, then stops
+# searching and answers from the cache, and only when the server is far past
+# that are requests turned away with a 503. Admitted searches share the 
+# worker's search threads, see SearchScheduler.
+
+import time
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, request, jsonify
+
+from src.scheduler import SearchScheduler
+
+# Degradation levels, from full strength to turning requests away. Below full
+# strength, a full depth result from the shared cache is used if there is one.
+# At the cached level there is no search at all; without a cached result the
+# move flipping the most discs is played.
+LEVELS = ('full', 'reduced', 'minimal', 'cached', 'shed')
+
+
+class Overloaded(Exception):
+    """
+    Raised when a search can't be admitted, with the seconds to wait before
+    retrying.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Tracks the searches of this process, and picks a degradation level from
+    the number of searches in flight and the recent time spent queueing for a
+    search slot.
+    """
+
+    def __init__(self, max_searches=1, in_flight_thresholds=(3, 4, 8, 16),
+                 wait_thresholds=(0.5, 1.5, 3.0, 10.0), max_wait=5.0,
+                 retry_after=2):
+        """
+        Args:
+            max_searches (int): Searches allowed to run at the same time.
+            in_flight_thresholds (Tuple[int, int, int, int]): Searches in 
+                flight, counting queued ones and the arriving one, at which 
+                the reduced, minimal, cached and shed levels start.
+            wait_thresholds (Tuple[float, float, float, float]): Average queue
+                wait in seconds at which the same levels start.
+            max_wait (float): Longest a search queues for a slot before it
+                falls back to the cached level.
+            retry_after (int): Seconds clients are asked to wait when shed.
+        """
+
+        self.slots = threading.BoundedSemaphore(max_searches)
+        self.in_flight_thresholds = in_flight_thresholds
+        self.wait_thresholds = wait_thresholds
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        # Moving average of queue waits, decaying towards zero over time so
+        # that shedding stops once the load has passed
+        self.average_wait = 0.0
+        self.wait_updated = time.monotonic()
+        self.wait_half_life = 5.0
+
+
+    def _current_wait(self):
+        elapsed = time.monotonic() - self.wait_updated
+        return self.average_wait * 0.5 ** (elapsed / self.wait_half_life)
+
+
+    def level(self):
+        """
+        Get the degradation level a newly arriving search would get.
+        """
+
+        with self.lock:
+            in_flight = self.in_flight + 1
+            average_wait = self._current_wait()
+
+        by_in_flight = sum(in_flight >= threshold
+                           for threshold in self.in_flight_thresholds)
+        by_wait = sum(average_wait >= threshold
+                      for threshold in self.wait_thresholds)
+        return LEVELS[max(by_in_flight, by_wait)]
+
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.average_wait = 0.8 * self._current_wait() + 0.2 * seconds
+            self.wait_updated = time.monotonic()
+
+
+    @contextmanager
+    def admit(self, upstream_wait=0.0):
+        """
+        Admit a search, waiting for a free slot if needed.
+
+        Args:
+            upstream_wait (float, optional): Seconds the request already spent
+                queueing before reaching the app.
+
+        Yields:
+            str: The degradation level the search runs at. A search waiting
+                longer than max_wait for a slot runs at the cached level.
+
+        Raises:
+            Overloaded: If the server is overloaded.
+        """
+
+        level = self.level()
+        if level == 'shed':
+            raise Overloaded(self.retry_after)
+
+        with self.lock:
+            self.in_flight += 1
+
+        try:
+            # Answering from the cache takes no search slot
+            if level == 'cached':
+                self.record_wait(upstream_wait)
+                yield level
+                return
+
+            start = time.perf_counter()
+            acquired = self.slots.acquire(timeout=self.max_wait)
+            self.record_wait(upstream_wait + time.perf_counter() - start)
+            if not acquired:
+                yield 'cached'
+                return
+
+            try:
+                yield level
+            finally:
+                self.slots.release()
+
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def degraded_depth(depth, level):
+    """
+    Get the search depth to use at a degradation level.
+    """
+
+    if level == 'reduced':
+        return max(1, depth - 1)
+    if level == 'minimal':
+        return 1
+    return depth
+
+
+def upstream_wait():
+    """
+    Get the seconds the current request queued in front of the app, from the
+    X-Request-Start header set by the router or proxy, if any.
+    """
+
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        start = float(header.removeprefix('t='))
+    except ValueError:
+        return 0.0
+
+    # Routers send seconds, milliseconds or microseconds since the epoch
+    while start > 1e11:
+        start /= 1000
+    return max(0.0, time.time() - start)
+
+
+def get_admission():
+    return current_app.extensions['othello_admission']
+
+
+def get_scheduler():
+    return current_app.extensions['othello_scheduler']
+
+
+def overloaded_response(error):
+    response = jsonify({'message': 'Server busy, please retry',
+                        'degradation': 'shed'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def init_admission(app):
+    """
+    Create the admission controller from the app's ADMISSION_* settings, and
+    the scheduler running searches from the SEARCH_* settings.
+    """
+
+    app.extensions['othello_admission'] = AdmissionController(
+        max_searches=app.config['ADMISSION_MAX_SEARCHES'],
+        in_flight_thresholds=app.config['ADMISSION_IN_FLIGHT_THRESHOLDS'],
+        wait_thresholds=app.config['ADMISSION_WAIT_THRESHOLDS'],
+        max_wait=app.config['ADMISSION_MAX_WAIT'],
+        retry_after=app.config['ADMISSION_RETRY_AFTER']
+    )
+    app.extensions['othello_scheduler'] = SearchScheduler(
+        n_workers=app.config['SEARCH_WORKERS'],
+        slice_steps=app.config['SEARCH_SLICE_NODES']
+    )
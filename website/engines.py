@@ -0,0 +1,146 @@
+# The purpose of the engines.py file is to keep OthelloAI's search state
+# between its moves of a game. A game's next search starts two plies deeper in
+# the tree the last one searched, so the positions and move orderings it
+# learned make the next search cheaper. Each worker process keeps the engines
+# of its recent games, evicting the least recently used and long idle ones.
+# Searches may instead go to the engine service, see engine_server.py.
+
+import time
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from src.bitboard import from_board, popcount
+from src.engine_service import EngineClient
+from src.single_flight import SingleFlight
+
+
+class SessionEngine:
+    """
+    Search state of one game; its table of searched positions, whose best
+    moves include the last search's principal variation, and the history of
+    moves causing cutoffs.
+    """
+
+    def __init__(self, max_entries=200_000):
+        """
+        Args:
+            max_entries (int, optional): Positions kept in the table before it
+                is cleared.
+        """
+
+        self.transpositions = {}
+        self.history = {}
+        self.max_entries = max_entries
+        self.last_used = time.monotonic()
+        self.searches = 0
+
+
+    def prepare(self, game):
+        """
+        Drop what can't help the search of a game's current position; discs
+        are never removed, so positions with fewer discs can't come up again.
+        The history is halved so that it follows the game.
+        """
+
+        black, white = from_board(game.board.state)
+        discs = popcount(black | white)
+
+        if len(self.transpositions) > self.max_entries:
+            self.transpositions = {}
+        else:
+            self.transpositions = {
+                key: entry for key, entry in self.transpositions.items()
+                if popcount(key[0] | key[1]) >= discs
+            }
+        self.history = {move: count // 2 for move, count in self.history.items()
+                        if count > 1}
+        self.searches += 1
+
+
+class EngineRegistry:
+    """
+    The engines of a process's recent games, by game id. An engine is evicted
+    when more than max_engines games are kept, least recently used first, or
+    when it has been idle for max_idle seconds.
+    """
+
+    def __init__(self, max_engines=256, max_idle=1800.0):
+        self.max_engines = max_engines
+        self.max_idle = max_idle
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def get(self, game_id):
+        """
+        Get the engine of a game, creating it if there is none.
+
+        Returns:
+            SessionEngine: The game's engine.
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            engine = self.engines.get(game_id)
+            if engine is None:
+                engine = self.engines[game_id] = SessionEngine()
+            else:
+                self.engines.move_to_end(game_id)
+            engine.last_used = now
+
+            while len(self.engines) > self.max_engines:
+                self.engines.popitem(last=False)
+            while self.engines:
+                oldest_id, oldest = next(iter(self.engines.items()))
+                if oldest is engine or now - oldest.last_used < self.max_idle:
+                    break
+                del self.engines[oldest_id]
+
+        return engine
+
+
+    def discard(self, game_id):
+        with self.lock:
+            self.engines.pop(game_id, None)
+
+
+def get_engines():
+    return current_app.extensions['othello_engines']
+
+
+def get_searches():
+    """
+    Get the process's searches in flight, see single_flight.py.
+    """
+
+    return current_app.extensions['othello_searches']
+
+
+def get_engine_client():
+    """
+    Get the client of the engine service, or None if there is no service.
+    """
+
+    return current_app.extensions.get('othello_engine_client')
+
+
+def init_engines(app):
+    """
+    Create the engine registry, the searches in flight, and the engine 
+    service's client if there is a service, from the app's ENGINE_* settings.
+    """
+
+    app.extensions['othello_engines'] = EngineRegistry(
+        max_engines=app.config['ENGINE_SESSIONS'],
+        max_idle=app.config['ENGINE_MAX_IDLE']
+    )
+    app.extensions['othello_searches'] = SingleFlight()
+
+    if app.config['ENGINE_SOCKET']:
+        app.extensions['othello_engine_client'] = EngineClient(
+            app.config['ENGINE_SOCKET'],
+            pool_size=app.config['ENGINE_CONNECTIONS'],
+            timeout=app.config['ENGINE_TIMEOUT']
+        )
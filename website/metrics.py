@@ -0,0 +1,369 @@
+# The purpose of the metrics.py file is to expose measurements of the app in
+# the Prometheus text format at /metrics. Each worker process keeps its
+# counters in its own memory-mapped file within a shared directory, and
+# /metrics sums the files of all workers, so any worker can answer a scrape.
+# Counters of workers that have exited are folded into a single file, so the
+# totals never go backwards however often workers are recycled.
+
+import os
+import mmap
+import fcntl
+import time
+import zlib
+import struct
+import threading
+
+from flask import current_app, g, request, Response
+
+from .admission import LEVELS
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PAYLOAD_BUCKETS = (512, 1024, 2048, 4096, 8192, 16384, 32768)
+CACHES = ('analysis', 'eval', 'search')
+
+# Name, type, help text, histogram buckets, and label name
+METRICS = [
+    ('othello_http_request_duration_seconds', 'histogram',
+     'Request latency by route.', LATENCY_BUCKETS, 'route'),
+    ('othello_http_requests_in_flight', 'gauge',
+     'Requests currently being handled.', None, None),
+    ('othello_searches_total', 'counter',
+     'AI searches run.', None, None),
+    ('othello_search_nodes_total', 'counter',
+     'Nodes visited by AI searches.', None, None),
+    ('othello_search_seconds_total', 'counter',
+     'Time spent in AI searches.', None, None),
+    ('othello_search_depth_total', 'counter',
+     'Sum of the depths reached by AI searches.', None, None),
+    ('othello_search_degradation_total', 'counter',
+     'AI moves by degradation level, shed ones refused.', None, 'level'),
+    ('othello_cache_hits_total', 'counter',
+     'Cache lookups answered from the cache.', None, 'cache'),
+    ('othello_cache_misses_total', 'counter',
+     'Cache lookups not answered from the cache.', None, 'cache'),
+    ('othello_session_payload_bytes', 'histogram',
+     'Size of the serialized game stored in the session.', PAYLOAD_BUCKETS,
+     None),
+]
+
+# File header; magic bytes, layout checksum and the writer's process id
+HEADER = struct.Struct('<8sII')
+MAGIC = b'OTHMETRI'
+
+# File of the summed counters of exited workers
+DEAD_WORKERS = 'dead-workers.bin'
+
+# Seconds between foldings of exited workers' files
+PRUNE_INTERVAL = 60
+
+
+class MetricsStore:
+    """
+    Counters of every metric series, stored as float64 values in a
+    memory-mapped file per process.
+    """
+
+    def __init__(self, directory, routes):
+        """
+        Lays out all metric series.
+
+        Args:
+            directory (str): Directory shared by all worker processes.
+            routes (List[str]): Endpoint names, labelling request metrics.
+        """
+
+        self.directory = directory
+        self.label_values = {'route': sorted(routes), 'cache': list(CACHES),
+                             'level': list(LEVELS)}
+
+        # (name, label value, suffix) -> index of the series' value
+        self.index = {}
+        for name, kind, _, buckets, label in METRICS:
+            for value in self.label_values[label] if label else [None]:
+                suffixes = ['']
+                if kind == 'histogram':
+                    suffixes = [f'_bucket:{bound}' for bound in buckets]
+                    suffixes += ['_bucket:+Inf', '_sum', '_count']
+                for suffix in suffixes:
+                    self.index[(name, value, suffix)] = len(self.index)
+
+        self.layout = zlib.crc32(repr(sorted(self.index.items())).encode())
+        self.gauges = {index for (name, _, _), index in self.index.items()
+                       if name == 'othello_http_requests_in_flight'}
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = None
+        self.pruned = 0.0
+
+
+    def _open(self):
+        """
+        Open this process's file, after a fork creating a new one. Files are
+        named by process id and start time, so a recycled process id never
+        reuses the file of an earlier worker.
+        """
+
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        size = HEADER.size + 8 * len(self.index)
+        name = f'worker-{self.pid}-{time.time_ns()}.bin'
+
+        with open(os.path.join(self.directory, name), 'x+b') as file:
+            file.write(HEADER.pack(MAGIC, self.layout, self.pid))
+            file.truncate(size)
+            mapped = mmap.mmap(file.fileno(), size)
+        self.values = memoryview(mapped)[HEADER.size:].cast('d')
+
+
+    def inc(self, name, amount=1, label=None):
+        with self.lock:
+            self._open()
+            self.values[self.index[(name, label, '')]] += amount
+
+
+    def observe(self, name, value, label=None):
+        """
+        Add an observation to a histogram, whose buckets are cumulative.
+        """
+
+        buckets = next(metric[3] for metric in METRICS if metric[0] == name)
+        with self.lock:
+            self._open()
+            for bound in buckets:
+                if value <= bound:
+                    self.values[self.index[(name, label, f'_bucket:{bound}')]] += 1
+            self.values[self.index[(name, label, '_bucket:+Inf')]] += 1
+            self.values[self.index[(name, label, '_sum')]] += value
+            self.values[self.index[(name, label, '_count')]] += 1
+
+
+    def collect(self):
+        """
+        Sum the values of all worker processes. Gauges of processes that are
+        no longer running are left out.
+
+        Returns:
+            List[float]: The value of each series.
+        """
+
+        if time.monotonic() - self.pruned >= PRUNE_INTERVAL:
+            self.remove_dead_workers()
+
+        totals = [0.0] * len(self.index)
+        for filename in os.listdir(self.directory):
+            if filename != DEAD_WORKERS and worker_pid(filename) is None:
+                continue
+            values = self._read(filename)
+            if values is None:
+                continue
+
+            alive = filename != DEAD_WORKERS and is_running(worker_pid(filename))
+            for index, value in enumerate(values):
+                if alive or index not in self.gauges:
+                    totals[index] += value
+
+        return totals
+
+
+    def _read(self, filename):
+        """
+        Read the values of a file, or None if it's missing or was written
+        with another layout.
+        """
+
+        try:
+            with open(os.path.join(self.directory, filename), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) != HEADER.size + 8 * len(self.index):
+            return None
+        magic, layout, _ = HEADER.unpack(data[:HEADER.size])
+        if magic != MAGIC or layout != self.layout:
+            return None
+        return memoryview(data)[HEADER.size:].cast('d')
+
+
+    def remove_dead_workers(self):
+        """
+        Fold the counters of processes that are no longer running into the
+        dead workers' file, and delete their files. Gauges are dropped.
+        """
+
+        self.pruned = time.monotonic()
+        if not os.path.isdir(self.directory):
+            return
+
+        # One process folds at a time, or counters could be lost or doubled
+        with open(os.path.join(self.directory, 'prune.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            dead = [filename for filename in os.listdir(self.directory)
+                    if worker_pid(filename) is not None
+                    and not is_running(worker_pid(filename))]
+            if not dead:
+                return
+
+            totals = list(self._read(DEAD_WORKERS) or [0.0] * len(self.index))
+            for filename in dead:
+                values = self._read(filename) or [0.0] * len(self.index)
+                for index, value in enumerate(values):
+                    if index not in self.gauges:
+                        totals[index] += value
+
+            temp_path = os.path.join(self.directory, DEAD_WORKERS + '.tmp')
+            with open(temp_path, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, self.layout, 0))
+                file.write(struct.pack(f'{len(totals)}d', *totals))
+            os.replace(temp_path, os.path.join(self.directory, DEAD_WORKERS))
+
+            for filename in dead:
+                os.remove(os.path.join(self.directory, filename))
+
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format.
+        """
+
+        totals = self.collect()
+        value = lambda name, label=None, suffix='': totals[self.index[(name, label, suffix)]]
+        series = lambda name, labels: f'{name}{{{labels}}}' if labels else name
+        lines = []
+
+        for name, kind, help_text, buckets, label in METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+            for label_value in self.label_values[label] if label else [None]:
+                labels = f'{label}="{label_value}"' if label else ''
+                if kind != 'histogram':
+                    lines.append(f'{series(name, labels)} {value(name, label_value):g}')
+                    continue
+
+                prefix = labels + ',' if labels else ''
+                for bound in [*buckets, '+Inf']:
+                    count = value(name, label_value, f'_bucket:{bound}')
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count:g}')
+                lines.append(f'{series(name + "_sum", labels)} {value(name, label_value, "_sum"):g}')
+                lines.append(f'{series(name + "_count", labels)} {value(name, label_value, "_count"):g}')
+
+        # Ratios derived from the counters above
+        nodes = value('othello_search_nodes_total')
+        seconds = value('othello_search_seconds_total')
+        searches = value('othello_searches_total')
+        depth = value('othello_search_depth_total')
+
+        lines.append('# HELP othello_search_nodes_per_second Average AI search speed.')
+        lines.append('# TYPE othello_search_nodes_per_second gauge')
+        lines.append(f'othello_search_nodes_per_second {nodes / seconds if seconds else 0:g}')
+
+        lines.append('# HELP othello_search_depth_average Average depth reached by AI searches.')
+        lines.append('# TYPE othello_search_depth_average gauge')
+        lines.append(f'othello_search_depth_average {depth / searches if searches else 0:g}')
+
+        lines.append('# HELP othello_cache_hit_ratio Fraction of cache lookups that hit.')
+        lines.append('# TYPE othello_cache_hit_ratio gauge')
+        for cache in CACHES:
+            hits = value('othello_cache_hits_total', cache)
+            misses = value('othello_cache_misses_total', cache)
+            ratio = hits / (hits + misses) if hits + misses else 0
+            lines.append(f'othello_cache_hit_ratio{{cache="{cache}"}} {ratio:g}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def worker_pid(filename):
+    """
+    Get the process id of a worker's file name, or None if it isn't one.
+    """
+
+    parts = filename.split('-')
+    if len(parts) != 3 or parts[0] != 'worker' or not parts[2].endswith('.bin'):
+        return None
+    try:
+        return int(parts[1])
+    except ValueError:
+        return None
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_store():
+    return current_app.extensions['othello_metrics']
+
+
+def record_search(stats, seconds):
+    """
+    Record the searches collected in a SearchStats.
+    """
+
+    store = get_store()
+    store.inc('othello_searches_total', stats.searches)
+    store.inc('othello_search_nodes_total', stats.nodes)
+    store.inc('othello_search_seconds_total', seconds)
+    store.inc('othello_search_depth_total', stats.depth * stats.searches)
+    store.inc('othello_cache_hits_total', stats.cache_hits, 'eval')
+    store.inc('othello_cache_misses_total', stats.cache_misses, 'eval')
+
+
+def record_cache(cache, hits, misses):
+    store = get_store()
+    store.inc('othello_cache_hits_total', hits, cache)
+    store.inc('othello_cache_misses_total', misses, cache)
+
+
+def record_degradation(level):
+    get_store().inc('othello_search_degradation_total', 1, level)
+
+
+def record_payload(size):
+    get_store().observe('othello_session_payload_bytes', size)
+
+
+def init_metrics(app):
+    """
+    Register request hooks measuring latency and requests in flight, and the
+    /metrics endpoint, storing counters in METRICS_DIR.
+    """
+
+    store = MetricsStore(app.config['METRICS_DIR'],
+                         list(app.view_functions) + ['metrics'])
+    store.remove_dead_workers()
+    app.extensions['othello_metrics'] = store
+
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_start = time.perf_counter()
+        store.inc('othello_http_requests_in_flight')
+
+
+    @app.teardown_request
+    def finish_metrics(exception):
+        if 'metrics_start' not in g:
+            return
+
+        store.inc('othello_http_requests_in_flight', -1)
+        route = request.endpoint
+        if route in store.label_values['route']:
+            store.observe('othello_http_request_duration_seconds',
+                          time.perf_counter() - g.metrics_start, route)
+
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(store.render(),
+                        mimetype='text/plain; version=0.0.4')
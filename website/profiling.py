@@ -0,0 +1,166 @@
+# The purpose of the profiling.py file is to measure where time goes within
+# each request. Request phases (session decode, search, evaluation and
+# serialization) are reported in a Server-Timing header and kept in rolling
+# histograms, and 1 in N requests can be captured with cProfile and tracemalloc.
+
+import os
+import time
+import cProfile
+import itertools
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, jsonify
+
+
+class RollingHistogram:
+    """
+    Keeps the most recent durations of a measurement, for percentiles.
+    """
+
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+
+    def summary(self):
+        """
+        Summarise recent durations in milliseconds.
+        """
+
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {'count': self.count}
+
+        def percentile(fraction):
+            index = min(len(ordered) - 1, int(fraction * len(ordered)))
+            return round(ordered[index] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'p50_ms': percentile(0.5),
+            'p90_ms': percentile(0.9),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        }
+
+
+# (endpoint, phase) -> RollingHistogram, for all requests of this process
+histograms = {}
+_histograms_lock = threading.Lock()
+
+_request_counter = itertools.count(1)
+
+# Only one request is captured at a time, as tracing is process-wide
+_capture_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a phase of the current request. Repeated phases are summed.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+
+def record_phase(name, seconds):
+    if has_request_context() and 'phases' in g:
+        g.phases[name] = g.phases.get(name, 0.0) + seconds
+
+
+def server_timing(phases):
+    return ', '.join(f"{name};dur={seconds * 1000:.2f}"
+                     for name, seconds in phases.items())
+
+
+def init_profiling(app):
+    """
+    Register request hooks measuring phase timings, and sampled profiling
+    configured by PROFILE_SAMPLE_RATE (0 disables it) and PROFILE_DIR.
+    """
+
+    @app.before_request
+    def start_request():
+        g.phases = {}
+        g.request_start = time.perf_counter()
+        g.profiler = None
+
+        sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+        if sample_rate and next(_request_counter) % sample_rate == 0 \
+                and _capture_lock.acquire(blocking=False):
+            tracemalloc.start()
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_start' not in g:
+            return response
+
+        phases = dict(g.phases)
+        phases['total'] = time.perf_counter() - g.request_start
+        response.headers['Server-Timing'] = server_timing(phases)
+
+        endpoint = request.endpoint or 'unknown'
+        with _histograms_lock:
+            for name, seconds in phases.items():
+                key = (endpoint, name)
+                if key not in histograms:
+                    histograms[key] = RollingHistogram()
+                histograms[key].add(seconds)
+
+        if g.profiler is not None:
+            try:
+                save_profile(app.config['PROFILE_DIR'], endpoint, g.profiler)
+            finally:
+                g.profiler = None
+                _capture_lock.release()
+
+        return response
+
+
+    @app.teardown_request
+    def abandon_capture(exception):
+        # A request failing before after_request still has to stop tracing
+        if g.get('profiler') is not None:
+            g.profiler.disable()
+            tracemalloc.stop()
+            g.profiler = None
+            _capture_lock.release()
+
+
+    @app.route('/timings')
+    def timings():
+        with _histograms_lock:
+            summary = {}
+            for (endpoint, name), histogram in sorted(histograms.items()):
+                summary.setdefault(endpoint, {})[name] = histogram.summary()
+        return jsonify(summary)
+
+
+def save_profile(directory, endpoint, profiler):
+    """
+    Write a captured request's cProfile stats and tracemalloc snapshot.
+    """
+
+    profiler.disable()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{endpoint}"
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    snapshot.dump(os.path.join(directory, name + '.tracemalloc'))
@@ -50,6 +50,100 @@ function fetchAndDisplayGameOutcome() {
     .catch(error => console.error('Error fetching game outcome:', error));
 }
 
+// Set the contents of a single board cell
+function setCell(row, col, html) {
+  const cellElement = document.querySelector(`.cell[data-row="${row}"][data-col="${col}"]`);
+  cellElement.innerHTML = html;
+}
+
+// Apply a move returned by the server; the placed disc and flipped discs
+function applyMove(move) {
+  const discClass = move.color === 'BLACK' ? 'black-disc' : 'white-disc';
+  const [row, col] = move.square;
+  setCell(row, col, `<div class="${discClass}"></div>`);
+  move.flipped.forEach(([r, c]) => setCell(r, c, `<div class="${discClass}"></div>`));
+}
+
+// Replace the displayed valid moves
+function showValidMoves(validMoves) {
+  document.querySelectorAll('.grey-disc').forEach(disc => disc.remove());
+  if (validMovesVisible) {
+    validMoves.forEach(([row, col]) => setCell(row, col, '<div class="grey-disc"></div>'));
+  }
+}
+
+// Update the page once OthelloAI's reply (or pass) has been shown
+function finishTurn(data) {
+  if (data.game_over) {
+    displayMessage(data.outcome);
+  } else if (data.agent_moved) {
+    // If OthelloAI made a move
+    if (data.user_has_moves) {
+      // If user has valid moves
+      validMovesVisible = true;
+      showValidMoves(data.valid_moves);
+      document.getElementById('message-box').style.visibility = 'hidden';
+    } else {
+      console.log("User has no valid moves, AI's turn again.");
+      displayMessage("You have no valid moves. OthelloAI's turn.");
+
+      // Schedule AI to move again after a delay
+      setTimeout(handleAgentMove, 2000);
+    }
+  } else if (!data.user_has_moves) {
+    // If user also has no valid moves
+    console.log("Neither AI nor user has valid moves. Game over.");
+
+    fetchAndDisplayGameOutcome();
+  } else {
+    console.log("Agent had no valid move, user's turn again.");
+    displayMessage("OthelloAI has no valid moves. Your turn.");
+
+    // Show valid moves for user
+    validMovesVisible = true;
+    showValidMoves(data.valid_moves);
+  }
+}
+
+// Play a turn; the user's move (if any) followed by OthelloAI's reply
+function playTurn(userMove) {
+  return fetch('/turn', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(userMove || {}),
+  }).then(response => {
+    // Server overloaded; nothing was played, so retry the same turn
+    if (response.status === 503) {
+      const retryAfter = parseInt(response.headers.get('Retry-After')) || 2;
+      displayMessage("OthelloAI is busy, retrying...");
+      return new Promise(resolve => setTimeout(resolve, retryAfter * 1000))
+        .then(() => playTurn(userMove));
+    }
+    // Rejected; nothing was played, so redraw the board as the server has it
+    if (!response.ok) {
+      validMovesVisible = true;
+      updateGameBoard();
+      return response.json().then(data => {
+        throw new Error(data.message);
+      });
+    }
+    return response.json();
+  });
+}
+
+// Show OthelloAI's move after a delay, then finish the turn
+function showAgentMove(data, agentMove) {
+  displayMessage("OthelloAI is analysing...");
+
+  // Delay for AI's response
+  setTimeout(() => {
+    if (agentMove) {
+      applyMove(agentMove);
+    }
+    finishTurn(data);
+  }, 2000);
+}
+
 function handleUserMove(event) {
   const tdElement = event.target.closest('.cell');
 
@@ -57,26 +151,22 @@ function handleUserMove(event) {
     const row = parseInt(tdElement.dataset.row);
     const col = parseInt(tdElement.dataset.col);
 
-    // Hide any message currently displayed
+    // Hide any message currently displayed, and valid moves until the
+    // user's turn comes back
     document.getElementById('message-box').style.visibility = 'hidden';
+    validMovesVisible = false;
+    showValidMoves([]);
 
-    fetch('/user_move', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ row, col }),
-    })
-      .then(response => response.json())
+    playTurn({ row, col })
       .then(data => {
         console.log('Response from backend:', data);
-        updateGameBoard();
+        const [userMove, agentMove] = data.moves;
+        applyMove(userMove);
 
-        if (data.game_over) {
-          fetchAndDisplayGameOutcome();
+        if (data.game_over && !agentMove) {
+          displayMessage(data.outcome);
         } else {
-          // Request Agent's move if game not over
-          handleAgentMove();
+          showAgentMove(data, agentMove);
         }
       })
       .catch(userError => {
@@ -90,58 +180,16 @@ function handleUserMove(event) {
 function handleAgentMove() {
   // Initially hide valid moves
   validMovesVisible = false; 
+  showValidMoves([]);
 
-  displayMessage("OthelloAI is analysing...");
-
-  setTimeout(() => {
-    fetch('/agent_move', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-    })
-    .then(response => response.json())
+  playTurn(null)
     .then(data => {
       console.log('Response from backend:', data);
-      updateGameBoard();
-
-      if (data.game_over) {
-        fetchAndDisplayGameOutcome();
-      } else {
-        if (data.agent_moved) {
-          // If OthelloAI made a move
-          if (data.user_has_moves) {
-            // If user has valid moves
-            validMovesVisible = true;
-            document.getElementById('message-box').style.visibility = 'hidden';
-          } else {
-            console.log("User has no valid moves, AI's turn again.");
-            displayMessage("You have no valid moves. OthelloAI's turn.");
-
-            // Schedule AI to move again after a delay
-            setTimeout(handleAgentMove, 2000);
-          }
-        } else {
-          // If OthelloAI had no valid moves
-          if (!data.user_has_moves) {
-            // If user also has no valid moves
-            console.log("Neither AI nor user has valid moves. Game over.");
-
-            fetchAndDisplayGameOutcome();
-          } else {
-            console.log("Agent had no valid move, user's turn again.");
-            displayMessage("OthelloAI has no valid moves. Your turn.");
-
-            // Show valid moves for user
-            validMovesVisible = true;
-            updateGameBoard();
-          }
-        }
-      }
+      showAgentMove(data, data.moves[0]);
     })
     .catch(agentError => {
       console.error('Agent Error:', agentError);
     });
-  // Delay for AI's response
-  }, 2000);
 }
 
 function resetGame() {
@@ -4,24 +4,268 @@
 
 from flask import (
     Blueprint, render_template, request, 
-    jsonify, session, redirect, url_for
+    jsonify, session, redirect, url_for, make_response, g, current_app
 )
 
 import os 
 
+import time
 import pickle
+import secrets
 import logging 
 import random
-import numpy as np
 logging.basicConfig(level=logging.DEBUG)
 
 from src.game import Game
 from src.board import SquareType
-from src.player import Player, PlayerType
-from src.state_evaluation import StateEvaluator, HeuristicType
+from src.player import Player, PlayerType, DIFFICULTY_LEVELS, AI_DEPTH
+from src.assets import current_evaluator
+from src.analysis import PositionAnalyser
+from src.position import decode_position, game_from_position, format_move
+from src.search_stats import collect_stats, current_stats
+from src.engine_service import EngineUnavailable
+from src.scheduler import run_steps
+from src.bitboard import from_board, canonical
+from src.single_flight import search_key, to_canonical, from_canonical
+from .profiling import phase, record_phase
+from .metrics import (
+    record_search, record_cache, record_payload, record_degradation
+)
+from .engines import get_engines, get_engine_client, get_searches
+from .admission import (
+    Overloaded, get_admission, get_scheduler, degraded_depth, upstream_wait, 
+    overloaded_response
+)
  
 views = Blueprint("views", __name__)
 
+# Deepest search allowed for analysis
+MAX_ANALYSIS_DEPTH = 4
+
+DEFAULT_DIFFICULTY = 'hard'
+
+# Analyser of the current evaluator, replaced with its cache when a new
+# evaluator is deployed, see src/assets.py
+_analyser = None
+
+
+def get_analyser():
+    global _analyser
+
+    state_eval = current_evaluator()
+    analyser = _analyser
+    if analyser is None or analyser.state_eval is not state_eval:
+        analyser = _analyser = PositionAnalyser(state_eval)
+    return analyser
+
+
+def save_game(game):
+    """
+    Store the game in the session, bumping its version so clients holding an 
+    older state see it has changed.
+    """
+
+    with phase('serialize'):
+        serialized_game = pickle.dumps(game)
+    session['game_instance'] = serialized_game
+    record_payload(len(serialized_game))
+    session['game_version'] = session.get('game_version', 0) + 1
+
+
+def load_game(serialized_game):
+    with phase('decode'):
+        return pickle.loads(serialized_game)
+
+
+def game_etag():
+    """
+    Entity tag of the session's game state, unique to this game and version.
+    """
+
+    return f"{session.get('game_id')}-{session.get('game_version', 0)}"
+
+
+def apply_move(game, move):
+    """
+    Make a move for the active player and hand the turn over.
+
+    Returns:
+        dict: The move's color, square and the squares it flipped.
+    """
+
+    color = game.active.disc_color
+
+    game.next_move = move
+    flipped = game.make_move()
+    game.change_turn()
+    game.update_valid_moves()
+    game.update_scores()
+    game.check_finished()
+
+    return {'color': color.name, 'square': move, 'flipped': flipped}
+
+
+def search_weight(depth):
+    """
+    Scheduling weight of a search to a depth. Shallower searches get a larger
+    share of the search threads, so they finish first.
+    """
+
+    return 2.0 ** (AI_DEPTH - depth)
+
+
+def run_search(steps, depth):
+    """
+    Run a search on the search threads, or in this thread if the request is
+    being profiled, as cProfile only sees the thread it was enabled in.
+
+    Returns:
+        The search's result.
+    """
+
+    if g.get('profiler') is not None:
+        return run_steps(steps)
+    return get_scheduler().run(steps, search_weight(depth))
+
+
+def search_move(game, player, tables):
+    """
+    Search OthelloAI's move on the engine service if there is one, otherwise,
+    or if the service can't answer in time, in this process.
+
+    Args:
+        game (Game): The game, with OthelloAI to move.
+        player (Player): OthelloAI.
+        tables (dict): Search state for an in-process search, see 
+            Player.minimax_move_steps().
+
+    Returns:
+        Tuple[int, int] or None: The move, or None if there are no moves.
+    """
+
+    client = get_engine_client()
+    if client is not None and g.get('profiler') is None:
+        try:
+            move, nodes = client.best_move(game, player)
+        except EngineUnavailable as error:
+            logging.warning(f"Engine service unavailable, searching in process: {error}")
+        else:
+            stats = current_stats()
+            if stats is not None:
+                stats.searches += 1
+                stats.nodes += nodes
+                stats.depth = max(stats.depth, player.depth)
+            return move
+
+    return run_search(player.minimax_move_steps(game, **tables), player.depth)
+
+
+def search_agent_move(game, engine=None):
+    """
+    Search OthelloAI's move, degraded under load, see admission.py.
+
+    Returns:
+        Tuple[Tuple[int, int] or None, str]: The move, and the degradation 
+            level.
+
+    Raises:
+        Overloaded: If the server is too busy to search.
+    """
+
+    player = game.active
+
+    with get_admission().admit(upstream_wait()) as level:
+        start = time.perf_counter()
+        with phase('search'), collect_stats() as stats:
+            # Another worker may have already searched at full strength
+            move = None
+            if level != 'full':
+                move = player.get_cached_move(game)
+
+            if move is None and level == 'cached':
+                move = player.get_greedy_move(game)
+
+            if move is None:
+                tables = {}
+                if engine is not None:
+                    engine.prepare(game)
+                    tables = {'transpositions': engine.transpositions,
+                              'history': engine.history}
+
+                # Players are shared between games, so aren't changed
+                searcher = player.replace(depth=degraded_depth(player.depth, level))
+                move = search_move(game, searcher, tables)
+
+        record_phase('evaluation', stats.evaluation_seconds)
+        record_search(stats, time.perf_counter() - start)
+        record_degradation(level)
+
+    return move, level
+
+
+def play_agent_move(game, engine=None):
+    """
+    Let OthelloAI make a move if it has one, then hand the turn back. Under 
+    load the search is degraded, see admission.py. Concurrent requests for 
+    the same search, up to symmetry, share one search.
+
+    Args:
+        game (Game): The game, with OthelloAI or the user to move.
+        engine (SessionEngine, optional): The game's search state kept from
+            OthelloAI's earlier moves, see engines.py.
+
+    Returns:
+        Tuple[dict or None, str]: The move made, as returned by apply_move(), 
+            or None if OthelloAI had no valid moves, and the degradation level.
+
+    Raises:
+        Overloaded: If the server is too busy to search.
+    """
+
+    if game.active.player_type == PlayerType.USER:
+        game.change_turn()
+
+    # Check AI has valid moves
+    game.update_valid_moves()
+
+    if not game.is_valid_moves():
+        game.change_turn()
+        game.update_valid_moves()
+        game.update_scores()
+        game.check_finished()
+        return None, 'full'
+
+    player = game.active
+    black, white = from_board(game.board.state)
+    key, symmetry = search_key(black, white, player.disc_color == SquareType.BLACK,
+                               player.search_settings())
+
+    def search():
+        move, level = search_agent_move(game, engine)
+        return to_canonical(move, symmetry), level
+
+    (move, level), shared = get_searches().do(key, search)
+    record_cache('search', int(shared), int(not shared))
+
+    game.prev_move = game.next_move
+    game.next_move = from_canonical(move, symmetry)
+
+    return apply_move(game, game.next_move), level
+
+
+def session_engine():
+    """
+    Get the engine of the session's game, or None if there is no game.
+    """
+
+    game_id = session.get('game_id')
+    return get_engines().get(game_id) if game_id else None
+
+
+def outcome_message(game):
+    game.determine_winner()
+    return f"Game over. {game.game_result}. Score: Black {game.black_score} - White {game.white_score}"
+
 
 @views.route("/")
 def home():
@@ -34,24 +278,30 @@ def play_game():
         color = request.form.get('color')
         session['user_color'] = color
 
-        # OthelloAI evaluation function weights
-        state_eval = StateEvaluator(weights={
-            HeuristicType.DISC_DIFF: 25/60,
-            HeuristicType.MOBILITY: 5/60,
-            HeuristicType.CORNERS: 30/60
-        })
+        difficulty = request.form.get('difficulty', DEFAULT_DIFFICULTY)
+        if difficulty not in DIFFICULTY_LEVELS:
+            difficulty = DEFAULT_DIFFICULTY
+        session['difficulty'] = difficulty
+
+        state_eval = current_evaluator()
+        # Settings of the chosen level, searching no deeper than AI_DEPTH
+        level = dict(DIFFICULTY_LEVELS[difficulty])
+        level['depth'] = min(level['depth'], AI_DEPTH)
     
         if color == 'BLACK':
             user_player = Player(PlayerType.USER, SquareType.BLACK)
-            ai_player = Player(PlayerType.MINIMAX, SquareType.WHITE, state_eval, 3)
+            ai_player = Player(PlayerType.MINIMAX, SquareType.WHITE, state_eval, **level)
             game = Game(user_player, ai_player)
         else:
             user_player = Player(PlayerType.USER, SquareType.WHITE)
-            ai_player = Player(PlayerType.MINIMAX, SquareType.BLACK, state_eval, 3)
+            ai_player = Player(PlayerType.MINIMAX, SquareType.BLACK, state_eval, **level)
             game = Game(ai_player, user_player)
         
-        serialized_game = pickle.dumps(game)
-        session['game_instance'] = serialized_game
+        if session.get('game_id'):
+            get_engines().discard(session['game_id'])
+        session['game_id'] = secrets.token_hex(8)
+        session['game_version'] = 0
+        save_game(game)
         session['game_started'] = True
         
         return redirect(url_for('views.play_game'))
@@ -61,7 +311,7 @@ def play_game():
         serialized_game = session.get('game_instance')
         
         if serialized_game:
-            game = pickle.loads(serialized_game)
+            game = load_game(serialized_game)
         else:
             # Default game instance
             game = Game(PlayerType.USER, PlayerType.RANDOM)
@@ -83,17 +333,12 @@ def user_move():
     
     if serialized_game:
         logging.debug(f"Received move: row={row}, col={col}")
-        game = pickle.loads(serialized_game)
+        game = load_game(serialized_game)
 
-        game.next_move = (row, col)
-        game.make_move()
-        game.change_turn()
-        game.update_valid_moves()
-        game.update_scores()
-        game.check_finished()
+        apply_move(game, (row, col))
 
         # Update serialized game instance
-        session['game_instance'] = pickle.dumps(game)
+        save_game(game)
 
         response = {
             'message': 'User move received',
@@ -110,56 +355,115 @@ def agent_move():
     serialized_game = session.get('game_instance')
     
     if serialized_game:
-        game = pickle.loads(serialized_game)
-
-        if game.active.player_type == PlayerType.USER:
-            game.change_turn()
-
-        # Check AI has valid moves
-        game.update_valid_moves()
-        valid_moves = game.is_valid_moves()
+        game = load_game(serialized_game)
 
-        if valid_moves:
-            game.get_player_move()
-            game.make_move()
-            agent_moved = True
-        else:
-            agent_moved = False
-
-        game.change_turn()
-        game.update_valid_moves()
-        game.update_scores()
-        game.check_finished()
+        agent_move, level = play_agent_move(game, session_engine())
+        agent_moved = agent_move is not None
 
         # Check User has valid moves
         user_has_moves = game.is_valid_moves()
 
-        session['game_instance'] = pickle.dumps(game)
+        save_game(game)
 
         response = {
             'message': 'Agent move received' if agent_moved else 'No valid move for agent',
             'game_over': game.is_finished,
             'agent_moved': agent_moved,
-            'user_has_moves': user_has_moves
+            'user_has_moves': user_has_moves,
+            'degradation': level
         }
         return jsonify(response)
     else:
         return jsonify({'message': 'Game instance not found'})
     
 
+@views.route('/turn', methods=['POST'])
+def turn():
+    """
+    Play a whole turn in one request; the user's move, if given, followed by
+    OthelloAI's reply. Only the squares changed by each move are returned.
+    """
+
+    data = request.get_json(silent=True) or {}
+    serialized_game = session.get('game_instance')
+
+    if not serialized_game:
+        return jsonify({'message': 'Game instance not found'}), 404
+
+    game = load_game(serialized_game)
+    moves = []
+
+    if data.get('row') is not None and data.get('col') is not None:
+        try:
+            move = (int(data['row']), int(data['col']))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid move'}), 400
+
+        if game.is_finished or game.active.player_type != PlayerType.USER \
+                or move not in game.get_valid_moves():
+            return jsonify({'message': 'Invalid move'}), 400
+
+        logging.debug(f"Received move: row={move[0]}, col={move[1]}")
+        moves.append(apply_move(game, move))
+
+    # Without a move OthelloAI plays, unless it's the user's turn to move
+    elif game.active.player_type == PlayerType.USER and game.get_valid_moves():
+        return jsonify({'message': "It's your turn to move"}), 400
+
+    agent_moved = False
+    level = 'full'
+    if not game.is_finished:
+        agent_move, level = play_agent_move(game, session_engine())
+        agent_moved = agent_move is not None
+        if agent_moved:
+            moves.append(agent_move)
+
+    user_has_moves = game.is_valid_moves()
+    save_game(game)
+
+    response = {
+        'moves': moves,
+        'valid_moves': game.board.find(SquareType.VALID),
+        'black_score': int(game.black_score),
+        'white_score': int(game.white_score),
+        'game_over': game.is_finished,
+        'outcome': outcome_message(game) if game.is_finished else None,
+        'agent_moved': agent_moved,
+        'user_has_moves': user_has_moves,
+        'version': session['game_version'],
+        'degradation': level
+    }
+    return jsonify(response)
+    
+
+@views.app_errorhandler(Overloaded)
+def overloaded(error):
+    # Nothing was saved, so the client can retry the same request
+    record_degradation('shed')
+    return overloaded_response(error)
+
+
 @views.route('/get_game_state', methods=['GET'])
 def get_game_state():
     serialized_game = session.get('game_instance')
     
     if serialized_game:
-        game = pickle.loads(serialized_game)
+        # Nothing has changed since the client's last request
+        etag = game_etag()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        game = load_game(serialized_game)
 
         # Convert game state to a list of lists JSON serialisation
-        game_state = [[cell.name for cell in row] for row in game.board.state]
+        game_state = [[cell.name for cell in row] for row in game.board.squares()]
 
-        response = {'game_state': game_state}
+        response = jsonify({'game_state': game_state})
+        response.set_etag(etag)
         
-        return jsonify(response)
+        return response
     
     else:
         return jsonify({'message': 'Game instance not found'})
@@ -182,11 +486,8 @@ def get_game_outcome():
     serialized_game = session.get('game_instance')
 
     if serialized_game:
-        game = pickle.loads(serialized_game)
-        game.determine_winner()
-
-        outcome_message = f"Game over. {game.game_result}. Score: Black {game.black_score} - White {game.white_score}"
-        return jsonify({"outcome_message": outcome_message})
+        game = load_game(serialized_game)
+        return jsonify({"outcome_message": outcome_message(game)})
     
     else:
         return jsonify({"outcome_message": "Game instance not found"})
@@ -195,8 +496,233 @@ def get_game_outcome():
 @views.route('/reset_game', methods=['POST'])
 def reset_game():
     
+    if session.get('game_id'):
+        get_engines().discard(session['game_id'])
+
     session.pop('user_color', None)
+    session.pop('difficulty', None)
     session.pop('game_instance', None)
     session.pop('game_started', None)
+    session.pop('game_id', None)
+    session.pop('game_version', None)
+
+    return jsonify({'message': 'Game reset'})
+
+
+def analysis_depth(data):
+    """
+    Read the requested analysis depth, clamped to the allowed range.
+
+    Raises:
+        ValueError: If the depth isn't an integer.
+    """
+
+    try:
+        depth = int(data.get('depth', AI_DEPTH))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid depth {data.get('depth')!r}.")
+    return max(1, min(depth, MAX_ANALYSIS_DEPTH))
+
+
+def run_analysis(search, depth):
+    """
+    Run an analysis search on the search threads, admitted like OthelloAI's
+    searches and searching less deeply under load.
+
+    Args:
+        search (Callable[[int], Generator]): Makes the search for a depth.
+        depth (int): The requested depth.
 
-    return jsonify({'message': 'Game reset'})
\ No newline at end of file
+    Returns:
+        Tuple[object, int, str]: The search's result, the depth searched and
+            the degradation level.
+
+    Raises:
+        Overloaded: If the server is too busy to search.
+    """
+
+    with get_admission().admit(upstream_wait()) as level:
+        # An analysis can't be answered without searching
+        if level == 'cached':
+            raise Overloaded(get_admission().retry_after)
+
+        depth = degraded_depth(depth, level)
+        with phase('search'):
+            result = run_search(search(depth), depth)
+        record_degradation(level)
+
+    return result, depth, level
+
+
+def serialize_moves(moves_with_values):
+    return [{'row': row, 'col': col, 'score': value}
+            for (row, col), value in moves_with_values]
+
+
+@views.route('/analyse_position', methods=['POST'])
+def analyse_position():
+    """
+    Score all legal moves of a position, given as a compact position string,
+    or of the current game if no position is given.
+    """
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        depth = analysis_depth(data)
+
+        if 'position' in data:
+            black, white, black_to_move = decode_position(data['position'])
+            game = game_from_position(
+                black, white, black_to_move,
+                Player(PlayerType.USER, SquareType.BLACK),
+                Player(PlayerType.USER, SquareType.WHITE)
+            )
+        else:
+            serialized_game = session.get('game_instance')
+            if not serialized_game:
+                return jsonify({'message': 'Game instance not found'})
+            game = load_game(serialized_game)
+
+    except (TypeError, ValueError) as error:
+        return jsonify({'message': str(error)}), 400
+
+    analyser = get_analyser()
+    hits, misses = analyser.hits, analyser.misses
+    moves_with_values, depth, level = run_analysis(
+        lambda depth: analyser.analyse_steps(game, depth), depth)
+    record_cache('analysis', analyser.hits - hits, analyser.misses - misses)
+
+    response = {
+        'depth': depth,
+        'color': game.active.disc_color.name,
+        'moves': serialize_moves(moves_with_values),
+        'best_move': moves_with_values[0][0] if moves_with_values else None,
+        'degradation': level
+    }
+    return jsonify(response)
+
+
+@views.route('/analyse_game', methods=['POST'])
+def analyse_game():
+    """
+    Analyse every position of a finished game, given as its list of moves.
+    """
+
+    data = request.get_json(silent=True) or {}
+
+    try:
+        depth = analysis_depth(data)
+        moves = [(int(row), int(col)) for row, col in data['moves']]
+        analyser = get_analyser()
+        hits, misses = analyser.hits, analyser.misses
+        analysis, depth, level = run_analysis(
+            lambda depth: analyser.analyse_game_steps(moves, depth), depth)
+
+    except (KeyError, TypeError, ValueError) as error:
+        return jsonify({'message': f"Invalid game record: {error}"}), 400
+
+    record_cache('analysis', analyser.hits - hits, analyser.misses - misses)
+
+    positions = [
+        {
+            'color': entry['color'],
+            'move': entry['move'],
+            'score': entry['value'],
+            'best_move': entry['best_move'],
+            'best_score': entry['best_value'],
+            'moves': serialize_moves(entry['moves'])
+        }
+        for entry in analysis
+    ]
+    return jsonify({'depth': depth, 'positions': positions, 'degradation': level})
+
+@views.route('/best_move', methods=['GET'])
+def best_move():
+    """
+    Search the best move of a position, given as a compact position string in
+    the position parameter, to the depth parameter's depth. Nothing depends
+    on the session and the search has no noise or budget, so the result is
+    the same for every request with the same parameters, and responses can be
+    cached upstream; the entity tag identifies the position, depth and
+    evaluator.
+    """
+
+    try:
+        depth = analysis_depth(request.args)
+        position_string = request.args.get('position', '')
+        black, white, black_to_move = decode_position(position_string)
+    except (TypeError, ValueError) as error:
+        return jsonify({'message': str(error)}), 400
+
+    state_eval = current_evaluator()
+    etag = f"{position_string}-{depth}-{state_eval.fingerprint():08x}"
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(search_best_move(black, white, black_to_move, depth,
+                                            state_eval))
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['BEST_MOVE_MAX_AGE']
+    return response
+
+
+def search_best_move(black, white, black_to_move, depth, state_eval):
+    """
+    Search a position's best move and its score, as Player.get_minimax_move()
+    does. The canonical form of the position is searched and the move mapped
+    back, so symmetric positions get symmetric answers, however ties between
+    moves are broken, and concurrent requests for them share one search.
+
+    Returns:
+        dict: The response's fields.
+
+    Raises:
+        Overloaded: If the server is too busy to search at full depth; a 
+            shallower result would be cached upstream as the answer.
+    """
+
+    canonical_black, canonical_white, symmetry = canonical(black, white)
+    color, other = ((SquareType.BLACK, SquareType.WHITE) if black_to_move
+                    else (SquareType.WHITE, SquareType.BLACK))
+    player = Player(PlayerType.MINIMAX, color, state_eval, depth)
+    opponent = Player(PlayerType.USER, other)
+    players = (player, opponent) if black_to_move else (opponent, player)
+    game = game_from_position(canonical_black, canonical_white, black_to_move,
+                              *players)
+
+    def search():
+        with get_admission().admit(upstream_wait()) as level:
+            if level != 'full':
+                raise Overloaded(get_admission().retry_after)
+
+            start = time.perf_counter()
+            with collect_stats() as stats, phase('search'):
+                stats.searches += 1
+                stats.depth = depth
+                evaluated_moves = run_search(
+                    player.minimax_evaluate_moves_steps(game), depth)
+            record_phase('evaluation', stats.evaluation_seconds)
+            record_search(stats, time.perf_counter() - start)
+            record_degradation(level)
+
+        if not evaluated_moves:
+            return None, None
+        return player.choose_move(evaluated_moves)
+
+    key = ('best_move', canonical_black, canonical_white, black_to_move, depth,
+           state_eval.fingerprint())
+    (move, score), shared = get_searches().do(key, search)
+    record_cache('search', int(shared), int(not shared))
+
+    move = from_canonical(move, symmetry)
+    return {
+        'depth': depth,
+        'color': color.name,
+        'move': list(move) if move else None,
+        'notation': format_move(move) if move else None,
+        'score': score,
+        'game_over': game.is_finished
+    }